@@ -6,7 +6,10 @@ from django.contrib import admin
 # blog/admin.py
 
 from django.contrib import admin
-from .models import Category, Tag, Post, Comment
+from django.utils import timezone
+from .models import Category, Tag, Post, Comment, Job
+from .moderation import approve_comments, reject_comments
+from .pagecache import fragment_stats
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'published_date', 'category')
@@ -14,12 +17,45 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('title', 'content')
     prepopulated_fields = {} # Полезно для slug-полей (если будут)
 
+    def changelist_view(self, request, extra_context=None):
+        # Статистика кэша фрагментов над списком постов
+        extra_context = {**(extra_context or {}), 'fragment_stats': fragment_stats()}
+        return super().changelist_view(request, extra_context=extra_context)
+
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('author', 'post', 'created_date', 'approved_comment')
     list_filter = ('approved_comment', 'created_date')
     search_fields = ('author', 'text')
+    list_select_related = ('post',)
+    # Без COUNT(*) всей таблицы при фильтрации; разбор очереди - /admin/moderation/
+    show_full_result_count = False
+    actions = ['approve_selected', 'reject_selected']
+
+    @admin.action(description='Одобрить выбранные комментарии', permissions=['change'])
+    def approve_selected(self, request, queryset):
+        self.message_user(request, f'Одобрено комментариев: {approve_comments(queryset)}')
+
+    @admin.action(description='Удалить выбранные комментарии (спам)', permissions=['delete'])
+    def reject_selected(self, request, queryset):
+        self.message_user(request, f'Удалено комментариев: {reject_comments(queryset)}')
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at', 'locked_by')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('attempts', 'started_at', 'finished_at', 'locked_by', 'last_error')
+    ordering = ('-id',)
+    actions = ['retry_jobs']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, run_at=timezone.now(), attempts=0, last_error='',
+        )
+        self.message_user(request, f'Поставлено в очередь задач: {count}')
 
 admin.site.register(Category)
 admin.site.register(Tag)
 admin.site.register(Post, PostAdmin)
-admin.site.register(Comment, CommentAdmin)
\ No newline at end of file
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Job, JobAdmin)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        # Регистрируем сигналы реестра категорий и тегов, поискового индекса, кэша страниц, лент, счетчиков и копий изображений,
+        # а также проверки настроек кэша
+        from . import counters, feeds, images, instrumentation, pagecache, search, taxonomy  # noqa: F401
+
+        post_migrate.connect(taxonomy.seed_defaults_after_migrate, sender=self)
@@ -0,0 +1,143 @@
+# blog/async_views.py
+"""Асинхронные версии страниц только для чтения (для запуска под ASGI).
+
+Данные читаются через асинхронный ORM и полностью загружаются до отрисовки,
+поэтому шаблон не обращается к БД и рендерится прямо в цикле событий.
+Подключаются вместо синхронных в blog/urls.py при BLOG_ASYNC_VIEWS.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.shortcuts import render
+
+from . import views
+from .forms import CommentForm
+from .models import Post, Category
+from .pagecache import cache_public_page, conditional_page
+from .pagination import CursorPaginator
+from .search import SearchResults
+from .taxonomy import registry as taxonomy
+
+
+async def prepare_request(request):
+    """Загружает пользователя и сессию заранее: их читают контекстные
+    процессоры auth и messages во время отрисовки"""
+    request.user = await request.auser()
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        await session.akeys()
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'{queryset.model._meta.object_name} не найден')
+
+
+@cache_public_page('feed')
+async def post_list(request):
+    posts_list = Post.objects.published().for_listing().order_by('-published_date')
+    page_obj = await CursorPaginator(posts_list, 5).aget_page(request.GET.get('cursor'))
+    taxonomy_version, categories, tags = await taxonomy.asnapshot()
+    await prepare_request(request)
+    return render(request, 'blog/post_list.html', {
+        'page_obj': page_obj,
+        'categories': categories,
+        'tags': tags,
+        'taxonomy_version': taxonomy_version,
+    })
+
+
+@conditional_page('post:{slug}', last_modified=views.post_modified)
+@cache_public_page('post:{slug}')
+async def post_detail(request, slug):
+    if request.method == 'POST':
+        # Отправка комментария остается синхронной
+        return await sync_to_async(views.post_detail)(request, slug=slug)
+    post = await aget_object_or_404(Post.objects.for_detail(), slug=slug)
+    comments = [
+        comment async for comment in
+        post.comments.filter(approved_comment=True).order_by('created_date')
+    ]
+    await prepare_request(request)
+    return render(request, 'blog/post_detail.html', {
+        'post': post,
+        'comments': comments,
+        'form': CommentForm(),
+    })
+
+
+@conditional_page('category:{slug}', last_modified=views.category_modified)
+@cache_public_page('category:{slug}')
+async def category_posts(request, slug):
+    category = await aget_object_or_404(Category.objects.all(), slug=slug)
+    posts = Post.objects.published().for_listing().filter(category=category)
+    page_obj = await CursorPaginator(posts, 10).aget_page(request.GET.get('cursor'))
+    await prepare_request(request)
+    return render(request, 'blog/category_posts.html', {
+        'category': category,
+        'page_obj': page_obj,
+    })
+
+
+@conditional_page('author:{username}', last_modified=views.author_modified)
+@cache_public_page('author:{username}')
+async def user_profile(request, username):
+    user = await aget_object_or_404(User.objects.select_related('userprofile'), username=username)
+    posts = Post.objects.published().for_listing().filter(author=user)
+    page_obj = await CursorPaginator(posts, 10).aget_page(request.GET.get('cursor'))
+    await prepare_request(request)
+    return render(request, 'blog/user_profile.html', {
+        'profile_user': user,
+        'page_obj': page_obj,
+    })
+
+
+def search_page(query, number):
+    # SearchResults работает через сырой SQL бэкенда поиска, у которого нет
+    # асинхронного API: страницу собираем целиком в синхронном потоке
+    page_obj = Paginator(SearchResults(query), 10).get_page(number)
+    page_obj.object_list = list(page_obj.object_list)
+    return page_obj
+
+
+def user_filter(query):
+    return (
+        Q(username__icontains=query) |
+        Q(first_name__icontains=query) |
+        Q(last_name__icontains=query)
+    )
+
+
+async def search(request):
+    query = request.GET.get('q', '')
+    results = {}
+
+    if query:
+        page_obj = await sync_to_async(search_page)(query, request.GET.get('page'))
+        users = views.with_profiles(User.objects.filter(user_filter(query)))
+        results = {
+            'page_obj': page_obj,
+            'users': [user async for user in users],
+            'query': query,
+        }
+
+    await prepare_request(request)
+    return render(request, 'blog/search_results.html', results)
+
+
+async def user_search(request):
+    query = request.GET.get('q', '')
+    users = User.objects.all()
+    if query:
+        users = users.filter(user_filter(query))
+    users = [user async for user in views.with_profiles(users)]
+
+    await prepare_request(request)
+    return render(request, 'blog/user_search.html', {
+        'users': users,
+        'query': query,
+    })
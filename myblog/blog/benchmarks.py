@@ -0,0 +1,407 @@
+# blog/benchmarks.py
+"""Общие части нагрузочных замеров: тестовые данные и прогон запросов.
+
+Запросы выполняются внутри процесса через django.test.Client (синхронный
+стек, как под WSGI) или AsyncClient (асинхронный стек, как под ASGI), без
+сетевого сервера: замеряется только Django и БД.
+
+Команды замеров работают внутри benchmark_database(): данные засеваются во
+временную БД, настроенная БД и общий кэш не меняются.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, connections, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .counters import recount
+from .feeds import sitemap_page_number
+from .models import Category, Comment, Post, Tag, UserProfile
+from .pagecache import GLOBAL, bump
+from .search import rebuild_index
+from .slugs import SlugPool, base_slug
+from .taxonomy import create_default_categories_and_tags
+
+PREFIX = 'bench'
+
+WORDS = [
+    'django', 'python', 'кэш', 'индекс', 'запрос', 'шаблон', 'очередь',
+    'производительность', 'блог', 'пагинация', 'поиск', 'асинхронный',
+]
+FIRST_NAMES = ['Анна', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Alice', 'Bob']
+
+
+@contextmanager
+def benchmark_database(name=None):
+    """Временная БД и кэш для замеров; возвращает имя БД.
+
+    Без name БД создается с миграциями через create_test_db и удаляется на
+    выходе. Для SQLite это файл во временном каталоге, а не БД в памяти:
+    его открывают дочерние процессы замера, которым передается name уже
+    созданной БД. Реплики с TEST MIRROR смотрят на ту же БД. Кэш на время
+    замера - в памяти процесса, чтобы страницы с данными замера не попали
+    к посетителям.
+    """
+    default = connections['default']
+    saved = {alias: connections[alias].settings_dict.copy() for alias in connections}
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}), \
+            tempfile.TemporaryDirectory() as directory:
+        try:
+            if name is None:
+                if default.vendor == 'sqlite':
+                    default.settings_dict['TEST'] = {
+                        **default.settings_dict.get('TEST', {}), 'NAME': os.path.join(directory, 'benchmark.sqlite3'),
+                    }
+                default.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            else:
+                default.close()
+                default.settings_dict['NAME'] = name
+            for alias in connections:
+                if connections[alias].settings_dict.get('TEST', {}).get('MIRROR') == 'default':
+                    connections[alias].close()
+                    connections[alias].settings_dict['NAME'] = default.settings_dict['NAME']
+            yield default.settings_dict['NAME']
+        finally:
+            if name is None and default.settings_dict['NAME'] != saved['default']['NAME']:
+                default.creation.destroy_test_db(saved['default']['NAME'], verbosity=0)
+            for alias, settings_dict in saved.items():
+                connections[alias].settings_dict.clear()
+                connections[alias].settings_dict.update(settings_dict)
+                connections[alias].close()
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+@transaction.atomic
+def seed(posts=200, users=10, tags=10, comments_per_post=3, random_seed=1):
+    """Создает пользователей, теги, посты и комментарии через bulk_create.
+
+    Все объекты помечены префиксом bench; повторный вызов дозаполняет только
+    недостающее, поэтому набор данных воспроизводим при одинаковых параметрах.
+    Возвращает число постов с префиксом.
+    """
+    existing = Post.objects.filter(slug__startswith=f'{PREFIX}-').count()
+    if existing >= posts:
+        return existing
+
+    rng = random.Random(random_seed + existing)
+    create_default_categories_and_tags()
+    categories = list(Category.objects.all())
+
+    # Пользователи и профили пачкой: сигнал создания профиля при bulk_create не срабатывает
+    have = set(User.objects.filter(username__startswith=f'{PREFIX}_').values_list('username', flat=True))
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=f'{PREFIX}_{i}', first_name=rng.choice(FIRST_NAMES), password=password)
+        for i in range(users) if f'{PREFIX}_{i}' not in have
+    ])
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, bio=sentence(rng, 10)) for user in
+        User.objects.filter(username__startswith=f'{PREFIX}_', userprofile__isnull=True)
+    ])
+    authors = list(User.objects.filter(username__startswith=f'{PREFIX}_'))
+
+    # Все slug засеянных данных начинаются с префикса: занятые читаем одним запросом
+    tag_slugs = SlugPool(Tag.objects.all())
+    tag_slugs.load(f'{PREFIX}-')
+    have = Tag.objects.filter(slug__startswith=f'{PREFIX}-').count()
+    Tag.objects.bulk_create([
+        Tag(name=f'тег {WORDS[i % len(WORDS)]} {i}',
+            slug=tag_slugs.allocate(f"{PREFIX}-{base_slug(f'teg {i}', 'tag', 42)}"))
+        for i in range(have, tags)
+    ])
+    all_tags = list(Tag.objects.all())
+
+    slugs = SlugPool(Post.objects.all())
+    slugs.load(f'{PREFIX}-')
+    batch = []
+    for i in range(existing, posts):
+        # Заголовки на кириллице: slug проходит через транслитерацию
+        title = f'{sentence(rng, 4).capitalize()} {i}'
+        published = rng.random() < 0.9
+        post = Post(
+            title=title,
+            slug=slugs.allocate(f"{PREFIX}-{base_slug(title, 'post', 42)}"),
+            content='\n\n'.join(sentence(rng, 40) for _ in range(5)),
+            author=rng.choice(authors),
+            category=rng.choice(categories) if categories else None,
+            is_published=published,
+        )
+        post.published_date = post.created_date if published else None
+        batch.append(post)
+    created = Post.objects.bulk_create(batch, batch_size=500)
+
+    PostTag = Post.tags.through
+    PostTag.objects.bulk_create([
+        PostTag(post_id=post.pk, tag_id=tag.pk)
+        for post in created for tag in rng.sample(all_tags, min(len(all_tags), 2))
+    ], batch_size=1000)
+    Comment.objects.bulk_create([
+        Comment(post=post, author=f'читатель{j}', text=sentence(rng, 12), approved_comment=j % 3 != 2)
+        for post in created for j in range(comments_per_post)
+    ], batch_size=1000)
+
+    # bulk_create обходит сигналы: счетчики, поиск и кэши обновляем целиком
+    recount()
+    rebuild_index()
+    bump(GLOBAL)
+    return existing + len(created)
+
+
+def read_urls(limit=20):
+    """Адреса всех страниц для чтения на засеянных данных"""
+    posts = list(
+        Post.objects.published().filter(slug__startswith=f'{PREFIX}-').select_related('author', 'category')
+        .order_by('-published_date')[:limit]
+    )
+    urls = [reverse('post_list'), reverse('search') + '?q=django', reverse('user_search') + '?q=bench']
+    for post in posts:
+        urls.append(reverse('post_detail', kwargs={'slug': post.slug}))
+        urls.append(reverse('user_profile', kwargs={'username': post.author.username}))
+        if post.category_id:
+            urls.append(reverse('category_posts', kwargs={'slug': post.category.slug}))
+    return urls
+
+
+# Имя URL -> (нужен ли вход, строка запроса). Аргументы берутся из засеянных данных
+ROUTES = {
+    'post_list': (False, ''),
+    'post_detail': (False, ''),
+    'category_posts': (False, ''),
+    'register': (False, ''),
+    'login': (False, ''),
+    'logout': (True, ''),
+    'create_post': (True, ''),
+    'my_posts': (True, ''),
+    'search': (False, '?q=django'),
+    'user_search': (False, '?q=bench'),
+    'profile': (True, ''),
+    'edit_profile': (True, ''),
+    'change_password': (True, ''),
+    'user_profile': (False, ''),
+    'latest_feed': (False, ''),
+    'category_feed': (False, ''),
+    'author_feed': (False, ''),
+    'sitemap_index': (False, ''),
+    'sitemap_page': (False, ''),
+}
+
+
+def route_urls():
+    """(имя, адрес, пользователь для входа или None) для каждого маршрута blog/urls.py"""
+    post = (
+        Post.objects.published().filter(slug__startswith=f'{PREFIX}-', category__isnull=False)
+        .select_related('author', 'category').order_by('-published_date').first()
+    )
+    if post is None:
+        raise ValueError('Нет засеянных данных: сначала вызовите seed()')
+    kwargs = {
+        'post_detail': {'slug': post.slug},
+        'category_posts': {'slug': post.category.slug},
+        'user_profile': {'username': post.author.username},
+        'latest_feed': {'feed_format': 'atom'},
+        'category_feed': {'slug': post.category.slug, 'feed_format': 'rss'},
+        'author_feed': {'username': post.author.username, 'feed_format': 'atom'},
+        'sitemap_page': {'page': sitemap_page_number(post.pk)},
+    }
+    return [
+        (name, reverse(name, kwargs=kwargs.get(name)) + query, post.author if needs_login else None)
+        for name, (needs_login, query) in ROUTES.items()
+    ]
+
+
+class QueryTimer:
+    """Обертка execute_wrapper: точное время каждого SQL-запроса
+    (connection.queries округляет время до миллисекунд)"""
+
+    def __init__(self):
+        self.times = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.times.append(time.perf_counter() - started)
+
+
+def measure_route(url, user=None, iterations=50, warmup=3):
+    """Последовательно запрашивает url и считает задержку и SQL на запрос"""
+    client = Client()
+    latencies, query_counts, query_times, statuses = [], [], [], set()
+    errors = 0
+    for number in range(warmup + iterations):
+        # logout разлогинивает клиента: входим заново вне замера
+        if user is not None and '_auth_user_id' not in client.session:
+            client.force_login(user)
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = client.get(url)
+            spent = time.perf_counter() - started
+        if number < warmup:
+            continue
+        latencies.append(spent)
+        statuses.add(response.status_code)
+        errors += response.status_code >= 400
+        query_counts.append(len(timer.times))
+        query_times.append(sum(timer.times))
+    stats = summarize(latencies, sum(latencies), errors)
+    stats.update({
+        'url': url,
+        'status': sorted(statuses),
+        'queries': round(statistics.median(query_counts), 1),
+        'queries_max': max(query_counts),
+        'sql_ms': round(statistics.fmean(query_times) * 1000, 2),
+    })
+    return stats
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors):
+    """Итог прогона: запросы в секунду и перцентили задержки в миллисекундах"""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_sync(urls, concurrency, total):
+    """total запросов в concurrency потоков через синхронный стек"""
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def worker():
+        client = Client()
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            started = time.perf_counter()
+            response = client.get(urls[number % len(urls)])
+            spent = time.perf_counter() - started
+            with lock:
+                latencies.append(spent)
+                if response.status_code >= 400:
+                    errors.append(number)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+def run_async(urls, concurrency, total):
+    """total запросов в concurrency сопрограмм через асинхронный стек"""
+    counter = iter(range(total))
+    latencies = []
+    errors = []
+
+    async def worker():
+        client = AsyncClient()
+        for number in counter:
+            started = time.perf_counter()
+            response = await client.get(urls[number % len(urls)])
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors.append(number)
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+def profile_counts():
+    """Число засеянных объектов для отчета"""
+    return {
+        'posts': Post.objects.filter(slug__startswith=f'{PREFIX}-').count(),
+        'users': User.objects.filter(username__startswith=f'{PREFIX}_').count(),
+        'tags': Tag.objects.filter(slug__startswith=f'{PREFIX}-').count(),
+        'comments': Comment.objects.filter(post__slug__startswith=f'{PREFIX}-').count(),
+    }
+
+
+# Конкурентная запись в SQLite
+
+# Настройки SQLite по умолчанию (журнал отката, BEGIN DEFERRED) для сравнения
+SQLITE_DEFAULT_OPTIONS = {'init_command': 'PRAGMA journal_mode=DELETE', 'timeout': 5}
+
+
+def copy_sqlite_database(target):
+    """Копия основной БД SQLite для нагрузочного прогона"""
+    connection.ensure_connection()
+    destination = sqlite3.connect(target)
+    try:
+        connection.connection.backup(destination)
+    finally:
+        destination.close()
+
+
+def sqlite_stress_worker(path, options, duration, write_ratio, number):
+    """Процесс нагрузки: вперемешку чтение ленты и комментарии в транзакциях.
+
+    Запись повторяет обычный сценарий: в транзакции читаем пост, затем
+    вставляем комментарий, и сигналы обновляют счетчики. При BEGIN DEFERRED
+    такая транзакция повышает блокировку чтения до записи, и SQLite сразу
+    отвечает "database is locked", не дожидаясь busy timeout.
+    """
+    default = connections['default']
+    default.close()
+    default.settings_dict.update(NAME=path, OPTIONS=options)
+    rng = random.Random(number)
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:200])
+    stats = {'reads': 0, 'writes': 0, 'locked': 0, 'latencies': []}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic():
+                    post = Post.objects.only('pk').get(pk=rng.choice(post_ids))
+                    Comment.objects.create(post=post, author=f'stress{number}', text=sentence(rng, 8),
+                                           approved_comment=True)
+                stats['writes'] += 1
+            else:
+                list(Post.objects.published().for_listing().order_by('-published_date')[:10])
+                stats['reads'] += 1
+        except OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            stats['locked'] += 1
+        stats['latencies'].append(time.perf_counter() - started)
+    default.close()
+    return stats
@@ -0,0 +1,191 @@
+# blog/counters.py
+"""Денормализованные счетчики.
+
+Post.approved_comment_count, Category/Tag.published_post_count и
+UserProfile.post_count меняются сигналами через F(), без COUNT при показе.
+recount() пересчитывает их одним UPDATE на модель, если счетчики разошлись.
+"""
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Post, Comment, Category, Tag, UserProfile
+from .taxonomy import registry as taxonomy
+
+
+def shifted(field, delta):
+    """F(field) + delta, но не меньше нуля: разошедшийся до нуля счетчик
+    не должен нарушать CHECK (>= 0) у PositiveIntegerField"""
+    if delta < 0:
+        return Greatest(F(field) + delta, Value(0))
+    return F(field) + delta
+
+
+def add(queryset, field, delta):
+    if delta:
+        queryset.update(**{field: shifted(field, delta)})
+
+
+def add_published_post(category_id, author_id, tag_ids, delta):
+    """Учитывает появление (delta=1) или исчезновение (delta=-1) опубликованного поста"""
+    if category_id:
+        add(Category.objects.filter(pk=category_id), 'published_post_count', delta)
+    if tag_ids:
+        add(Tag.objects.filter(pk__in=tag_ids), 'published_post_count', delta)
+    add(UserProfile.objects.filter(user_id=author_id), 'post_count', delta)
+    if category_id or tag_ids:
+        # Счетчики выводятся в боковой панели из реестра
+        taxonomy.invalidate()
+
+
+# Опубликованные посты
+
+def post_state(post):
+    return (post.is_published, post.category_id, post.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = (False, None, None) if created else getattr(instance, '_counter_state', None)
+    new = post_state(instance)
+    if old is None:
+        # Прежнее состояние неизвестно (объект собран вручную или загружен через only)
+        recount_for_post(instance)
+    elif old != new:
+        tag_ids = [] if created else list(instance.tags.values_list('pk', flat=True))
+        if old[0]:
+            add_published_post(old[1], old[2], tag_ids, -1)
+        if new[0]:
+            add_published_post(new[1], new[2], tag_ids, 1)
+    instance._counter_state = new
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_tags(sender, instance, **kwargs):
+    instance._counter_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    if instance.is_published:
+        add_published_post(instance.category_id, instance.author_id,
+                           getattr(instance, '_counter_tag_ids', []), -1)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def count_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._counter_cleared = instance.post_set.filter(is_published=True).count()
+        else:
+            instance._counter_cleared = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    delta = 1 if action == 'post_add' else -1
+    if not reverse:
+        if not instance.is_published:
+            return
+        tag_ids = pk_set if action != 'post_clear' else getattr(instance, '_counter_cleared', [])
+        add(Tag.objects.filter(pk__in=tag_ids), 'published_post_count', delta)
+    else:
+        if action == 'post_clear':
+            published = getattr(instance, '_counter_cleared', 0)
+        else:
+            published = Post.objects.filter(pk__in=pk_set, is_published=True).count()
+        add(Tag.objects.filter(pk=instance.pk), 'published_post_count', delta * published)
+    taxonomy.invalidate()
+
+
+# Одобренные комментарии
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = False if created else getattr(instance, '_approved_in_db', None)
+    if old is None:
+        recount(posts=Post.objects.filter(pk=instance.post_id))
+    elif old != instance.approved_comment:
+        # updated_date входит в ключ кэша карточки поста
+        Post.objects.filter(pk=instance.post_id).update(
+            approved_comment_count=shifted('approved_comment_count', 1 if instance.approved_comment else -1),
+            updated_date=timezone.now(),
+        )
+    instance._approved_in_db = instance.approved_comment
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if getattr(instance, '_approved_in_db', instance.approved_comment):
+        Post.objects.filter(pk=instance.post_id).update(
+            approved_comment_count=shifted('approved_comment_count', -1),
+            updated_date=timezone.now(),
+        )
+
+
+# Пересчет
+
+def counter_expressions(apps):
+    """Выражения с точными значениями счетчиков для каждой модели"""
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    PostTag = Post.tags.through
+
+    def subquery_count(queryset, group_by):
+        counted = queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counted), Value(0))
+
+    return {
+        ('blog', 'Post', 'approved_comment_count'): subquery_count(
+            Comment.objects.filter(post=OuterRef('pk'), approved_comment=True), 'post'),
+        ('blog', 'Category', 'published_post_count'): subquery_count(
+            Post.objects.filter(category=OuterRef('pk'), is_published=True), 'category'),
+        ('blog', 'Tag', 'published_post_count'): subquery_count(
+            PostTag.objects.filter(tag=OuterRef('pk'), post__is_published=True), 'tag'),
+        ('blog', 'UserProfile', 'post_count'): subquery_count(
+            Post.objects.filter(author=OuterRef('user'), is_published=True), 'author'),
+    }
+
+
+def recount(apps=global_apps, dry_run=False, **querysets):
+    """Исправляет разошедшиеся счетчики. Возвращает {имя модели: число исправленных строк}.
+
+    Через querysets можно ограничить пересчет: recount(posts=..., categories=...).
+    """
+    names = {'Post': 'posts', 'Category': 'categories', 'Tag': 'tags', 'UserProfile': 'profiles'}
+    fixed = {}
+    for (app_label, model_name, field), expression in counter_expressions(apps).items():
+        queryset = querysets.get(names[model_name])
+        if querysets and queryset is None:
+            continue
+        if queryset is None:
+            queryset = apps.get_model(app_label, model_name)._default_manager.all()
+        drifted = queryset.annotate(actual=expression).filter(~Q(**{field: F('actual')}))
+        fixed[model_name] = drifted.count()
+        if fixed[model_name] and not dry_run:
+            queryset.model._default_manager.filter(pk__in=drifted.values('pk')).update(**{field: expression})
+    if not dry_run and apps is global_apps:
+        taxonomy.invalidate()
+    return fixed
+
+
+def refresh_comment_counts(post_ids):
+    """Точные approved_comment_count постов одним UPDATE после массовой модерации"""
+    expression = counter_expressions(global_apps)[('blog', 'Post', 'approved_comment_count')]
+    # updated_date входит в ключ кэша карточки поста
+    return Post.objects.filter(pk__in=post_ids).update(approved_comment_count=expression, updated_date=timezone.now())
+
+
+def recount_for_post(post):
+    recount(
+        posts=Post.objects.filter(pk=post.pk),
+        categories=Category.objects.filter(Q(pk=post.category_id) | Q(post=post)).distinct(),
+        tags=Tag.objects.filter(post=post),
+        profiles=UserProfile.objects.filter(user_id=post.author_id),
+    )
@@ -0,0 +1,249 @@
+# blog/feeds.py
+"""Ленты RSS/Atom и карта сайта.
+
+Готовый XML хранится в кэше вместе с ETag и Last-Modified. Ключ включает
+поколение своей области (как в blog/pagecache.py): публикация или правка
+поста сбрасывает только общую ленту, ленты его категории и автора и ту
+страницу карты сайта, куда попадает его id. Остальные документы отдаются
+из кэша, а повторные опросы с If-None-Match / If-Modified-Since получают 304.
+"""
+import hashlib
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F, Max, Value
+from django.db.models.functions import Floor
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import http_date
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from .models import Category, Post
+from .pagecache import GLOBAL, bump, get_generations
+
+FEED_CLASSES = {'rss': Rss201rev2Feed, 'atom': Atom1Feed}
+
+SITEMAP_INDEX = 'sitemap'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def feed_items():
+    return getattr(settings, 'BLOG_FEED_ITEMS', 20)
+
+
+def sitemap_size():
+    """Сколько id постов покрывает одна страница карты сайта"""
+    return getattr(settings, 'BLOG_SITEMAP_SIZE', 5000)
+
+
+def sitemap_page_number(pk):
+    return (pk - 1) // sitemap_size() + 1
+
+
+# Кэш готовых документов
+
+def cached_document(request, name, scopes, build):
+    """Ответ с документом из кэша или собранным build().
+
+    build() возвращает (XML-строка, Content-Type, дата последнего изменения).
+    """
+    generations = get_generations([GLOBAL] + list(scopes))
+    # Ссылки в документах абсолютные, поэтому ключ зависит от адреса сайта
+    key = 'blog:doc:' + hashlib.md5(
+        f"{request.scheme}://{request.get_host()}|{name}|{':'.join(generations)}".encode()
+    ).hexdigest()
+    document = cache.get(key)
+    if document is None:
+        content, content_type, last_modified = build()
+        content = content.encode()
+        document = {
+            'content': content,
+            'content_type': content_type,
+            # ETag от содержимого: если пересборка дала тот же XML, опросы по-прежнему получают 304
+            'etag': f'"{hashlib.md5(content).hexdigest()}"',
+            # HTTP-даты с точностью до секунды
+            'last_modified': int(last_modified.timestamp()) if last_modified else None,
+        }
+        cache.set(key, document, getattr(settings, 'BLOG_FEED_CACHE_TIMEOUT', 24 * 3600))
+
+    response = get_conditional_response(
+        request, etag=document['etag'], last_modified=document['last_modified'],
+    )
+    if response is None:
+        response = HttpResponse(document['content'], content_type=document['content_type'])
+    response['ETag'] = document['etag']
+    if document['last_modified'] is not None:
+        response['Last-Modified'] = http_date(document['last_modified'])
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'BLOG_FEED_MAX_AGE', 300))
+    return response
+
+
+# Ленты
+
+def render_feed(request, feed_format, title, link, posts):
+    feed_class = FEED_CLASSES[feed_format]
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=title,
+        language='ru',
+        feed_url=request.build_absolute_uri(),
+    )
+    last_modified = None
+    for post in posts:
+        url = request.build_absolute_uri(post.get_absolute_url())
+        feed.add_item(
+            title=post.title,
+            link=url,
+            description=Truncator(post.content).words(60),
+            author_name=post.author.get_full_name() or post.author.username,
+            pubdate=post.published_date,
+            updateddate=post.updated_date,
+            unique_id=url,
+            categories=[post.category.name] if post.category_id else (),
+        )
+        last_modified = max(last_modified or post.updated_date, post.updated_date)
+    return feed.writeString('utf-8'), feed.content_type, last_modified
+
+
+def latest_posts(**filters):
+    return (
+        Post.objects.published().for_listing().filter(**filters)
+        .order_by('-published_date', '-id')[:feed_items()]
+    )
+
+
+def check_format(feed_format):
+    if feed_format not in FEED_CLASSES:
+        raise Http404('Неизвестный формат ленты')
+
+
+def latest_feed(request, feed_format):
+    check_format(feed_format)
+    return cached_document(request, f'feed:{feed_format}', ['syndication:feed'], lambda: render_feed(
+        request, feed_format, 'Новые посты', reverse('post_list'), latest_posts(),
+    ))
+
+
+def category_feed(request, slug, feed_format):
+    check_format(feed_format)
+
+    def build():
+        category = get_object_or_404(Category, slug=slug)
+        return render_feed(
+            request, feed_format, f'Посты в категории «{category.name}»',
+            reverse('category_posts', kwargs={'slug': slug}), latest_posts(category=category),
+        )
+    return cached_document(request, f'category:{slug}:{feed_format}', [f'syndication:category:{slug}'], build)
+
+
+def author_feed(request, username, feed_format):
+    check_format(feed_format)
+
+    def build():
+        author = get_object_or_404(User, username=username)
+        return render_feed(
+            request, feed_format, f'Посты автора {author.get_full_name() or author.username}',
+            reverse('user_profile', kwargs={'username': username}), latest_posts(author=author),
+        )
+    return cached_document(request, f'author:{username}:{feed_format}', [f'syndication:author:{username}'], build)
+
+
+# Карта сайта
+
+def render_urlset(request, posts):
+    stream = StringIO()
+    xml = SimplerXMLGenerator(stream, 'utf-8')
+    xml.startDocument()
+    xml.startElement('urlset', {'xmlns': SITEMAP_NS})
+    last_modified = None
+    for post in posts:
+        xml.startElement('url', {})
+        xml.addQuickElement('loc', request.build_absolute_uri(post.get_absolute_url()))
+        xml.addQuickElement('lastmod', post.updated_date.isoformat())
+        xml.endElement('url')
+        last_modified = max(last_modified or post.updated_date, post.updated_date)
+    xml.endElement('urlset')
+    return stream.getvalue(), 'application/xml; charset=utf-8', last_modified
+
+
+def sitemap_page(request, page):
+    size = sitemap_size()
+
+    def build():
+        # Страница - диапазон id: новые посты не сдвигают старые страницы
+        posts = (
+            Post.objects.published().filter(pk__gt=(page - 1) * size, pk__lte=page * size)
+            .only('slug', 'updated_date').order_by('pk')
+        )
+        content, content_type, last_modified = render_urlset(request, posts)
+        if last_modified is None:
+            raise Http404('Пустая страница карты сайта')
+        return content, content_type, last_modified
+    return cached_document(request, f'sitemap:{page}', [f'{SITEMAP_INDEX}:{page}'], build)
+
+
+def sitemap_index(request):
+    def build():
+        pages = (
+            Post.objects.published()
+            .annotate(page=Floor((F('pk') - 1) / Value(sitemap_size())) + 1)
+            .values('page').annotate(last_modified=Max('updated_date')).order_by('page')
+        )
+        stream = StringIO()
+        xml = SimplerXMLGenerator(stream, 'utf-8')
+        xml.startDocument()
+        xml.startElement('sitemapindex', {'xmlns': SITEMAP_NS})
+        last_modified = None
+        for row in pages:
+            xml.startElement('sitemap', {})
+            xml.addQuickElement('loc', request.build_absolute_uri(
+                reverse('sitemap_page', kwargs={'page': int(row['page'])})
+            ))
+            xml.addQuickElement('lastmod', row['last_modified'].isoformat())
+            xml.endElement('sitemap')
+            last_modified = max(last_modified or row['last_modified'], row['last_modified'])
+        xml.endElement('sitemapindex')
+        return stream.getvalue(), 'application/xml; charset=utf-8', last_modified
+    return cached_document(request, SITEMAP_INDEX, [SITEMAP_INDEX], build)
+
+
+# Инвалидация
+
+def feed_scopes(post, old=None):
+    """Области лент и карты сайта, в которые попадает (или попадал) пост"""
+    published = post.is_published or bool(old and old['is_published'])
+    if not published:
+        return set()
+    category_ids = {post.category_id, old and old['category_id']} - {None}
+    author_ids = {post.author_id, old and old['author_id']} - {None}
+    scopes = {'syndication:feed', SITEMAP_INDEX, f'{SITEMAP_INDEX}:{sitemap_page_number(post.pk)}'}
+    scopes.update(
+        f'syndication:category:{slug}' for slug in
+        Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True)
+    )
+    scopes.update(
+        f'syndication:author:{username}' for username in
+        User.objects.filter(pk__in=author_ids).values_list('username', flat=True)
+    )
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post_feeds(sender, instance, raw=False, **kwargs):
+    # Прежнее состояние поста запоминает blog/pagecache.py
+    if not raw:
+        bump(*feed_scopes(instance, getattr(instance, '_pagecache_old', None)))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_feeds(sender, instance, **kwargs):
+    bump(*feed_scopes(instance))
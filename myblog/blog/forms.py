@@ -6,6 +6,7 @@ from django.contrib.auth.models import User
 
 from django import forms
 from .models import Comment, Post, Category, Tag, UserProfile
+from .taxonomy import registry as taxonomy
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
@@ -123,10 +124,20 @@ class PostForm(forms.ModelForm):
         
         self.fields['category'].empty_label = "Выберите категорию"
         
-        if not Category.objects.exists():
+        # Варианты для отрисовки берем из реестра, без запросов к БД
+        categories = taxonomy.categories()
+        tags = taxonomy.tags()
+        category_field = self.fields['category']
+        category_field.choices = [('', category_field.empty_label)] + [
+            (category.pk, category_field.label_from_instance(category)) for category in categories
+        ]
+        tags_field = self.fields['tags']
+        tags_field.choices = [(tag.pk, tags_field.label_from_instance(tag)) for tag in tags]
+        
+        if not categories:
             self.fields['category'].help_text = 'Категории еще не созданы.'
         
-        if not Tag.objects.exists():
+        if not tags:
             self.fields['tags'].help_text = 'Теги еще не созданы.'
 
 class CustomUserCreationForm(UserCreationForm):
@@ -0,0 +1,162 @@
+# blog/images.py
+"""Уменьшенные копии загруженных изображений.
+
+Для Post.image и UserProfile.avatar при загрузке создаются JPEG и WebP
+фиксированной ширины рядом с оригиналом: post_images/pug.jpg ->
+post_images/pug-640w.jpg и post_images/pug-640w.webp. Список готовых ширин
+хранится в модели (image_widths, avatar_widths), по нему тег
+{% responsive_image %} строит srcset без обращений к хранилищу.
+Копии создает фоновая задача (blog/jobs.py); пока ее нет, выводится оригинал.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import task
+from .models import Post, UserProfile
+from .pagecache import bump, post_scopes
+
+logger = logging.getLogger(__name__)
+
+# Модель -> (поле изображения, поле со списком ширин, ширины по умолчанию)
+IMAGE_FIELDS = {
+    Post: ('image', 'image_widths', (320, 640, 960, 1280)),
+    UserProfile: ('avatar', 'avatar_widths', (64, 150, 300)),
+}
+
+FORMATS = {
+    # расширение: (формат Pillow, параметры сохранения)
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def widths_for(model):
+    field_name = IMAGE_FIELDS[model][0]
+    configured = getattr(settings, 'BLOG_IMAGE_WIDTHS', {})
+    return tuple(configured.get(f'{model._meta.model_name}.{field_name}', IMAGE_FIELDS[model][2]))
+
+
+def variant_name(name, width, ext):
+    root, _ = posixpath.splitext(name)
+    return f'{root}-{width}w.{ext}'
+
+
+def flatten(image):
+    """RGB-копия для JPEG: прозрачность заливаем белым"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(name, widths, storage=None):
+    """Создает копии файла name во всех нужных ширинах и форматах.
+
+    Ширины больше оригинала пропускаются; если оригинал уже самой малой
+    ширины, делается одна копия в исходном размере.
+    Возвращает отсортированный список созданных ширин.
+    Работает только с хранилищем, без БД, поэтому годится для пула процессов.
+    """
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as source:
+        original = Image.open(source)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    fitting = sorted(width for width in set(widths) if width < original.width)
+    if not fitting:
+        fitting = [original.width]
+
+    for width in fitting:
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.Resampling.LANCZOS)
+        for ext, (image_format, params) in FORMATS.items():
+            image = flatten(resized) if image_format == 'JPEG' else resized
+            if image_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+                transparent = image.mode in ('LA', 'PA') or 'transparency' in image.info
+                image = image.convert('RGBA' if transparent else 'RGB')
+            buffer = BytesIO()
+            image.save(buffer, image_format, **params)
+            target = variant_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return fitting
+
+
+def generate_for_instance(instance):
+    """Создает копии для изображения объекта и сохраняет список ширин.
+
+    Возвращает список ширин (пустой, если изображения нет или его не удалось
+    прочитать).
+    """
+    model = type(instance)
+    field_name, widths_field, _ = IMAGE_FIELDS[model]
+    fieldfile = getattr(instance, field_name)
+    widths = []
+    if fieldfile:
+        try:
+            widths = render_variants(fieldfile.name, widths_for(model), fieldfile.storage)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+            logger.warning('Не удалось обработать изображение %s: %s', fieldfile.name, exc)
+    setattr(instance, widths_field, widths)
+    updates = {widths_field: widths}
+    if model is Post:
+        # updated_date входит в ключ кэша карточки поста
+        updates['updated_date'] = timezone.now()
+    model._default_manager.filter(pk=instance.pk).update(**updates)
+    return widths
+
+
+@task('images.generate_variants', timeout=300)
+def generate_variants(model_label, pk):
+    instance = apps.get_model(model_label)._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+    generate_for_instance(instance)
+    if isinstance(instance, Post):
+        bump(*post_scopes(instance))
+    else:
+        bump(f'author:{instance.user.username}')
+
+
+# Сигналы
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=UserProfile)
+def detect_new_image(sender, instance, raw=False, **kwargs):
+    field_name, widths_field, _ = IMAGE_FIELDS[sender]
+    fieldfile = getattr(instance, field_name)
+    # Незакоммиченный файл - свежая загрузка, старые копии к нему не относятся
+    instance._image_uploaded = bool(fieldfile) and not fieldfile._committed and not raw
+    instance._image_widths_reset = (
+        not raw and (instance._image_uploaded or not fieldfile) and bool(getattr(instance, widths_field))
+    )
+    if instance._image_uploaded or not fieldfile:
+        setattr(instance, widths_field, [])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=UserProfile)
+def generate_uploaded_variants(sender, instance, raw=False, **kwargs):
+    widths_field = IMAGE_FIELDS[sender][1]
+    if getattr(instance, '_image_widths_reset', False):
+        # Обычный save() не пишет список ширин (save_excluded_fields)
+        instance._image_widths_reset = False
+        sender._default_manager.filter(pk=instance.pk).update(**{widths_field: []})
+    if getattr(instance, '_image_uploaded', False):
+        instance._image_uploaded = False
+        # Обработка изображения не задерживает запрос с загрузкой
+        generate_variants.enqueue(sender._meta.label, instance.pk)
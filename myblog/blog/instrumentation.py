@@ -0,0 +1,316 @@
+# blog/instrumentation.py
+"""Замеры запросов: SQL, отрисовка шаблонов, время представления.
+
+Включается BLOG_INSTRUMENTATION (settings.py добавляет middleware).
+Для каждого запроса:
+- заголовок Server-Timing (sql, render, view, total) - виден во вкладке
+  Network инструментов разработчика браузера;
+- медленные запросы (дольше BLOG_SLOW_REQUEST_MS) пишутся в лог вместе
+  с самыми долгими SQL;
+- одинаковые с точностью до параметров SQL, повторенные в запросе
+  BLOG_N_PLUS_ONE_THRESHOLD раз и больше, отмечаются как N+1;
+- суммы по представлениям копятся в процессе и не позже чем через
+  BLOG_INSTRUMENTATION_FLUSH секунд (и при выходе процесса) переносятся в
+  кэш BLOG_INSTRUMENTATION_CACHE, откуда их читает команда view_stats.
+  Кэш должен быть общим для процессов (файлы, Redis, Memcached).
+
+Состояние запроса хранится в ContextVar, поэтому замеры работают и для
+асинхронных представлений (sync_to_async переносит контекст в поток).
+"""
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+from django.db import connections
+from django.template.base import Template
+from django.utils.decorators import sync_and_async_middleware
+
+from .pagecache import PROCESS_LOCAL_CACHES
+
+logger = logging.getLogger(__name__)
+
+_profile = ContextVar('blog_request_profile', default=None)
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+STATS_NAMES_KEY = 'blog:viewstats:names'
+STATS_FIELDS = ('requests', 'total_us', 'sql_us', 'queries', 'render_us', 'max_us', 'n_plus_one', 'slow')
+
+
+def slow_request_ms():
+    return getattr(settings, 'BLOG_SLOW_REQUEST_MS', 500)
+
+
+def n_plus_one_threshold():
+    return getattr(settings, 'BLOG_N_PLUS_ONE_THRESHOLD', 5)
+
+
+def stats_cache_alias():
+    return getattr(settings, 'BLOG_INSTRUMENTATION_CACHE', 'default')
+
+
+def stats_cache():
+    return caches[stats_cache_alias()]
+
+
+def stats_cache_is_shared():
+    return settings.CACHES.get(stats_cache_alias(), {}).get('BACKEND') not in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches)
+def check_stats_cache(app_configs, **kwargs):
+    if not getattr(settings, 'BLOG_INSTRUMENTATION', False) or stats_cache_is_shared():
+        return []
+    return [Warning(
+        f'Кэш {stats_cache_alias()} для статистики представлений не общий для процессов: '
+        'manage.py view_stats ее не увидит',
+        hint='Укажите в BLOG_INSTRUMENTATION_CACHE кэш с общим бэкендом (FileBasedCache, Redis, Memcached).',
+        id='blog.W003',
+    )]
+
+
+def normalize_sql(sql):
+    """SQL без различий в длине списков IN: параметры уже вынесены в %s"""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, секунды)
+        self.render = 0.0
+        self.render_sql = 0.0  # SQL, выполненный во время отрисовки (ленивые queryset)
+        self.render_depth = 0
+
+    @property
+    def sql(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_queries(self):
+        """[(sql, сколько раз)] для повторов не реже порога N+1"""
+        counts = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        threshold = n_plus_one_threshold()
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+    def slowest_queries(self, limit=5):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+
+# Перехват SQL и отрисовки
+
+def record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        profile.queries.append((sql, duration))
+        if profile.render_depth:
+            profile.render_sql += duration
+
+
+def wrap_connections(stack):
+    """Подключает record_query ко всем соединениям текущего потока до закрытия stack.
+
+    Обертка на время запроса через execute_wrapper(): обертки соединения -
+    стек, и чужие вложенные execute_wrapper() снимают свои, а не нашу.
+    """
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(record_query))
+    return stack
+
+
+_original_render = Template.render
+
+
+def instrumented_render(self, context):
+    profile = _profile.get()
+    # Вложенные шаблоны (include, extends) входят во время внешнего
+    if profile is None or profile.render_depth:
+        return _original_render(self, context)
+    profile.render_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        profile.render += time.perf_counter() - started
+        profile.render_depth -= 1
+
+
+def install():
+    """Подключает замер отрисовки; повторный вызов ничего не меняет"""
+    Template.render = instrumented_render
+
+
+# Статистика по представлениям
+
+class ViewStats:
+    """Суммы по представлениям в памяти процесса с периодическим сбросом в кэш.
+
+    Сброс - по истечении окна BLOG_INSTRUMENTATION_FLUSH: при очередном
+    запросе или по таймеру, если запросов больше нет, и при выходе процесса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(Counter)
+        self.flushed = time.monotonic()
+        self.timer = None
+
+    def add(self, view, values):
+        interval = getattr(settings, 'BLOG_INSTRUMENTATION_FLUSH', 10)
+        with self.lock:
+            totals = self.pending[view]
+            max_us = values.pop('max_us')
+            totals.update(values)
+            totals['max_us'] = max(totals['max_us'], max_us)
+            remaining = interval - (time.monotonic() - self.flushed)
+            if remaining > 0 and self.timer is None:
+                # Последнее окно перед затишьем не ждет следующего запроса
+                self.timer = threading.Timer(remaining, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if remaining <= 0:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(Counter)
+            self.flushed = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not pending:
+            return
+        cache = stats_cache()
+        names = cache.get(STATS_NAMES_KEY, set())
+        if not set(pending) <= names:
+            cache.set(STATS_NAMES_KEY, names | set(pending), None)
+        for view, totals in pending.items():
+            for field, value in totals.items():
+                key = f'blog:viewstats:{view}:{field}'
+                if field == 'max_us':
+                    # Максимум не складывается: гонка процессов здесь некритична
+                    if value > cache.get(key, 0):
+                        cache.set(key, value, None)
+                    continue
+                try:
+                    cache.incr(key, value)
+                except ValueError:
+                    cache.set(key, value, None)
+
+
+view_stats = ViewStats()
+atexit.register(view_stats.flush)
+
+
+def read_view_stats():
+    """{представление: {поле: значение}} из кэша"""
+    cache = stats_cache()
+    names = sorted(cache.get(STATS_NAMES_KEY, set()))
+    keys = {f'blog:viewstats:{view}:{field}': (view, field) for view in names for field in STATS_FIELDS}
+    found = cache.get_many(list(keys))
+    stats = {view: dict.fromkeys(STATS_FIELDS, 0) for view in names}
+    for key, value in found.items():
+        view, field = keys[key]
+        stats[view][field] = value
+    return stats
+
+
+def reset_view_stats():
+    cache = stats_cache()
+    names = cache.get(STATS_NAMES_KEY, set())
+    cache.delete_many([f'blog:viewstats:{view}:{field}' for view in names for field in STATS_FIELDS])
+    cache.delete(STATS_NAMES_KEY)
+
+
+# Middleware
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+def server_timing(profile, total):
+    sql = profile.sql
+    render = profile.render - profile.render_sql
+    view = max(0.0, total - sql - render)
+    return ', '.join([
+        f'sql;dur={sql * 1000:.1f};desc="{len(profile.queries)} SQL"',
+        f'render;dur={render * 1000:.1f};desc="templates"',
+        f'view;dur={view * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+def finish(request, response, profile):
+    total = time.perf_counter() - profile.started
+    name = view_name(request)
+    repeated = profile.repeated_queries()
+    slow = total * 1000 >= slow_request_ms()
+
+    if getattr(settings, 'BLOG_SERVER_TIMING', True):
+        response['Server-Timing'] = server_timing(profile, total)
+    for sql, count in repeated:
+        logger.warning('N+1 в %s (%s): запрос повторен %d раз: %s', name, request.path, count, sql)
+    if slow:
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.0f мс, SQL: %d за %.0f мс\n%s',
+            request.method, request.path, name, total * 1000, len(profile.queries), profile.sql * 1000,
+            '\n'.join(f'  {duration * 1000:.1f} мс  {sql}' for sql, duration in profile.slowest_queries()),
+        )
+    view_stats.add(name, {
+        'requests': 1,
+        'total_us': int(total * 1e6),
+        'sql_us': int(profile.sql * 1e6),
+        'queries': len(profile.queries),
+        'render_us': int((profile.render - profile.render_sql) * 1e6),
+        'max_us': int(total * 1e6),
+        'n_plus_one': int(bool(repeated)),
+        'slow': int(slow),
+    })
+    return response
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    install()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            profile = RequestProfile()
+            token = _profile.set(profile)
+            # Соединения у каждого потока свои: ORM асинхронных представлений
+            # работает в потоке sync_to_async(thread_sensitive=True), там и оборачиваем
+            stack = await sync_to_async(wrap_connections)(ExitStack())
+            try:
+                response = await get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+                _profile.reset(token)
+            return finish(request, response, profile)
+    else:
+        def middleware(request):
+            profile = RequestProfile()
+            token = _profile.set(profile)
+            try:
+                with wrap_connections(ExitStack()):
+                    response = get_response(request)
+            finally:
+                _profile.reset(token)
+            return finish(request, response, profile)
+    return middleware
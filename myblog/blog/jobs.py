@@ -0,0 +1,276 @@
+# blog/jobs.py
+"""Очередь фоновых задач в таблице blog_job.
+
+Задача - обычная функция, зарегистрированная декоратором @task.
+Вызов task.enqueue(...) пишет строку в blog_job в текущей транзакции,
+поэтому задача появится в очереди только вместе с данными, которые ее
+породили. Команда run_worker забирает задачи условным UPDATE (работает на
+любой БД без блокировок строк), выполняет их в пуле потоков или процессов,
+повторяет упавшие с нарастающей задержкой и снимает зависшие по таймауту.
+
+В тестах и при разработке без воркера можно включить BLOG_JOBS_EAGER:
+задачи будут выполняться сразу при постановке.
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .routers import unit_of_work
+
+REGISTRY = {}
+
+# Запас сверх таймаута, после которого задача без воркера считается брошенной
+STALE_GRACE = 60
+
+
+def is_eager():
+    return getattr(settings, 'BLOG_JOBS_EAGER', False)
+
+
+def retry_delay(attempt):
+    """Задержка перед повтором: 10, 20, 40... секунд"""
+    return timedelta(seconds=getattr(settings, 'BLOG_JOBS_RETRY_DELAY', 10) * 2 ** (attempt - 1))
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, timeout):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        """Ставит задачу в очередь. Аргументы должны сериализоваться в JSON."""
+        if is_eager():
+            self.func(*args, **kwargs)
+            return None
+        return Job.objects.create(
+            name=self.name, args=list(args), kwargs=kwargs,
+            max_attempts=self.max_attempts, timeout=self.timeout,
+        )
+
+
+def task(name=None, max_attempts=3, timeout=60):
+    """Регистрирует функцию как фоновую задачу"""
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__qualname__}', max_attempts, timeout)
+        REGISTRY[registered.name] = registered
+        return registered
+    return decorator
+
+
+def execute(name, args, kwargs):
+    """Выполняет задачу в потоке или дочернем процессе пула.
+
+    Возвращает текст ошибки или None. Соединения с БД закрываются, чтобы
+    потоки пула не держали их между задачами. Каждая задача - своя единица
+    работы роутера: запись в прошлой задаче потока не закрепляет чтения
+    следующей за основной БД.
+    """
+    try:
+        with unit_of_work():
+            REGISTRY[name].func(*args, **kwargs)
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return None
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач. Чужие задачи не трогает."""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+        .order_by('run_at', 'id').values_list('pk', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for pk in candidates:
+        if len(claimed) == limit:
+            break
+        # Условный UPDATE: задачу получит только один воркер
+        if Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_by=worker, started_at=now, attempts=F('attempts') + 1,
+        ):
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def finish(job, error=None, retry=True):
+    """Отмечает попытку завершенной: успех, повтор позже или окончательная ошибка"""
+    now = timezone.now()
+    if error is None:
+        updates = {'status': Job.DONE, 'last_error': ''}
+    elif retry and job.attempts < job.max_attempts:
+        updates = {'status': Job.PENDING, 'run_at': now + retry_delay(job.attempts), 'last_error': error}
+    else:
+        updates = {'status': Job.FAILED, 'last_error': error}
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        finished_at=now, locked_by='', **updates
+    )
+    return updates['status']
+
+
+def release(job):
+    """Возвращает задачу в очередь без траты попытки (воркер останавливается)"""
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        status=Job.PENDING, locked_by='', attempts=F('attempts') - 1,
+    )
+
+
+def requeue_stale():
+    """Завершает задачи воркеров, которые пропали, не отчитавшись"""
+    now = timezone.now()
+    count = 0
+    for job in Job.objects.filter(status=Job.RUNNING):
+        if job.started_at and job.started_at + timedelta(seconds=job.timeout + STALE_GRACE) < now:
+            finish(job, f'Воркер {job.locked_by} не завершил задачу')
+            count += 1
+    return count
+
+
+class Worker:
+    """Цикл выборки и выполнения задач.
+
+    Таймаут задачи отсчитывается с момента, когда пул начал ее выполнять,
+    а не с постановки в пул.
+
+    executor='thread' - пул потоков: подходит для задач, которые ждут ввода-вывода.
+    Поток с превышенным таймаутом остановить нельзя: задача отмечается
+    неудачной без повтора (иначе повтор шел бы одновременно с ней), а поток
+    занимает место в пуле, пока не доработает.
+    executor='process' - пул процессов (spawn): подходит для тяжелых вычислений
+    и задач, которые нужно уметь прерывать. При таймауте процессы пула
+    останавливаются, задача повторяется как обычная ошибка, остальные
+    возвращаются в очередь.
+    """
+
+    stale_check_interval = 60
+
+    def __init__(self, executor='thread', concurrency=2, poll_interval=1.0, name=None, log=None):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f'Неизвестный executor: {executor}')
+        self.executor = executor
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.log = log or (lambda message: None)
+        self.stopping = False
+        # Дочерние процессы, запущенные не пулом: их kill_pool не трогает
+        self.other_children = set()
+
+    def make_pool(self):
+        if self.executor == 'process':
+            # Процессы пул запускает по мере надобности, так что все новые дочерние - его
+            self.other_children = set(multiprocessing.active_children())
+            return ProcessPoolExecutor(
+                self.concurrency, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix='blog-job')
+
+    def kill_pool(self, pool, running):
+        for job, _ in running.values():
+            release(job)
+        running.clear()
+        for process in multiprocessing.active_children():
+            if process not in self.other_children:
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        return self.make_pool()
+
+    def run(self, burst=False, max_jobs=None):
+        """Выполняет задачи до остановки. burst - выйти, когда очередь опустеет.
+
+        Возвращает число завершенных задач.
+        """
+        pool = self.make_pool()
+        # future -> [задача, крайний срок по time.monotonic или None, пока задача ждет в пуле]
+        running = {}
+        # Потоки задач с превышенным таймаутом: задача уже завершена, поток еще занят
+        overrun = {}
+        processed = 0
+        next_stale_check = 0
+        try:
+            # После запроса остановки новые задачи не берутся, начатые доделываются
+            while not self.stopping or running:
+                if time.monotonic() >= next_stale_check:
+                    stale = requeue_stale()
+                    if stale:
+                        self.log(f'Брошенных задач возвращено: {stale}')
+                    next_stale_check = time.monotonic() + self.stale_check_interval
+
+                free = self.concurrency - len(running) - len(overrun)
+                if max_jobs is not None:
+                    free = min(free, max_jobs - processed - len(running))
+                if free > 0 and not self.stopping:
+                    for job in claim(self.name, free):
+                        future = pool.submit(execute, job.name, job.args, job.kwargs)
+                        running[future] = [job, None]
+                        self.log(f'▶ {job}')
+
+                if not running and not overrun:
+                    if self.stopping or burst or (max_jobs is not None and processed >= max_jobs):
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                now = time.monotonic()
+                for future, entry in running.items():
+                    # Отсчет таймаута - с начала выполнения (с точностью до poll_interval)
+                    if entry[1] is None and (future.running() or future.done()):
+                        entry[1] = now + entry[0].timeout
+                deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+                timeout = max(0, min([self.poll_interval] + [deadline - now for deadline in deadlines]))
+                done, _ = wait(list(running) + list(overrun), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in overrun:
+                        self.log(f'Поток задачи {overrun.pop(future)} доработал после таймаута')
+                        continue
+                    job, _ = running.pop(future)
+                    try:
+                        error = future.result()
+                    except Exception:
+                        # Например, BrokenProcessPool: процесс пула умер
+                        error = traceback.format_exc()
+                    self.log(f'{"✔" if error is None else "✘"} {job}: {finish(job, error)}')
+                    processed += 1
+
+                now = time.monotonic()
+                expired = [
+                    future for future, (_, deadline) in running.items()
+                    if deadline is not None and deadline <= now
+                ]
+                for future in expired:
+                    job, _ = running.pop(future)
+                    error = f'Превышено время выполнения ({job.timeout} с)'
+                    if self.executor == 'thread':
+                        overrun[future] = job
+                        status = finish(job, error + ': поток не остановить, повтора не будет', retry=False)
+                    else:
+                        status = finish(job, error)
+                    self.log(f'⏱ {job}: {status}')
+                    processed += 1
+                if expired and self.executor == 'process':
+                    pool = self.kill_pool(pool, running)
+        finally:
+            # При аварийном выходе недоделанные задачи возвращаются в очередь
+            for job, _ in running.values():
+                release(job)
+            pool.shutdown(wait=False, cancel_futures=True)
+        return processed
@@ -0,0 +1,99 @@
+# blog/management/commands/benchmark.py
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from blog import benchmarks
+
+class Command(BaseCommand):
+    help = ('Засевает синтетические данные во временную БД и замеряет каждую страницу blog/urls.py: '
+            'p50/p95/p99, запросов в секунду, число и время SQL-запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Сколько пользователей засеять')
+        parser.add_argument('--posts', type=int, default=1000, help='Сколько постов засеять')
+        parser.add_argument('--tags', type=int, default=20, help='Сколько тегов засеять')
+        parser.add_argument('--comments', type=int, default=5, help='Комментариев на пост')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора данных')
+        parser.add_argument('--iterations', type=int, default=50, help='Запросов на каждую страницу')
+        parser.add_argument('--warmup', type=int, default=3, help='Запросов прогрева (не учитываются)')
+        parser.add_argument('--only', help='Замерить только эти имена URL (через запятую)')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Не отключать кэш страниц (по умолчанию меряем отрисовку)')
+        parser.add_argument('--output', help='Записать результаты в JSON-файл')
+        parser.add_argument('--compare', help='JSON предыдущего замера для сравнения')
+
+    def handle(self, *args, **options):
+        # Настроенная БД не меняется: данные живут до конца замера
+        with benchmarks.benchmark_database():
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        benchmarks.seed(posts=options['posts'], users=options['users'], tags=options['tags'],
+                        comments_per_post=options['comments'], random_seed=options['seed'])
+        dataset = benchmarks.profile_counts()
+        self.stdout.write(f'Данные: {dataset}')
+
+        only = set(filter(None, (options['only'] or '').split(',')))
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if not options['page_cache']:
+            overrides['BLOG_PAGE_CACHE'] = False
+
+        views = {}
+        with override_settings(**overrides):
+            for name, url, user in benchmarks.route_urls():
+                if only and name not in only:
+                    continue
+                views[name] = benchmarks.measure_route(url, user, options['iterations'], options['warmup'])
+
+        report = {
+            'meta': {
+                'revision': self.git_revision(),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'page_cache': options['page_cache'],
+                'iterations': options['iterations'],
+                'debug': settings.DEBUG,
+            },
+            'dataset': dataset,
+            'views': views,
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                previous = json.load(source)
+        self.print_table(views, previous)
+
+        if options['output']:
+            # sort_keys и отступы: файлы двух ревизий удобно сравнивать через diff
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+                output.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def print_table(self, views, previous=None):
+        old_views = (previous or {}).get('views', {})
+        self.stdout.write(f"\n{'страница':<16} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} "
+                          f"{'SQL':>5} {'SQL мс':>7}" + ('   p50 было    SQL было' if previous else ''))
+        for name, stats in views.items():
+            row = (f"{name:<16} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} "
+                   f"{stats['rps']:>8} {stats['queries']:>5} {stats['sql_ms']:>7}")
+            old = old_views.get(name)
+            if old:
+                change = (stats['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+                row += f"   {old['p50_ms']:>8} ({change:+.0f}%) {old['queries']:>5}"
+            style = self.style.ERROR if stats['errors'] else (lambda text: text)
+            self.stdout.write(style(row))
+
+    def git_revision(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ''
@@ -0,0 +1,87 @@
+# blog/management/commands/compare_wsgi_asgi.py
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from blog import benchmarks
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность страниц для чтения: синхронные '
+            'представления (WSGI) против асинхронных (ASGI) при растущей конкурентности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16,32',
+                            help='Уровни конкурентности через запятую')
+        parser.add_argument('--requests', type=int, default=300,
+                            help='Число запросов на каждый уровень')
+        parser.add_argument('--posts', type=int, default=200,
+                            help='Сколько постов засеять перед замером')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Не отключать кэш страниц (по умолчанию меряем отрисовку)')
+        parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+        # Внутренний режим: замер в отдельном процессе с нужным набором представлений
+        parser.add_argument('--run', choices=['wsgi', 'asgi'], help='Служебный параметр')
+        parser.add_argument('--database', help='Служебный параметр: временная БД замера')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+        # Настроенная БД не меняется: данные засеваются во временную
+        with benchmarks.benchmark_database(options['database']) as database:
+            if options['run']:
+                return self.measure(options['run'], levels, options)
+            return self.compare(levels, database, options)
+
+    def compare(self, levels, database, options):
+        total = benchmarks.seed(posts=options['posts'])
+        self.stdout.write(f'Данные: {benchmarks.profile_counts()} (постов с префиксом: {total})')
+
+        results = {}
+        for mode in ('wsgi', 'asgi'):
+            # Каждый режим в своем процессе: набор представлений выбирается при импорте URLConf
+            env = {**os.environ, 'BLOG_ASYNC_VIEWS': '1' if mode == 'asgi' else '0'}
+            argv = [sys.executable, '-m', 'django', 'compare_wsgi_asgi', '--run', mode,
+                    '--concurrency', options['concurrency'], '--requests', str(options['requests']),
+                    '--database', database]
+            if options['page_cache']:
+                argv.append('--page-cache')
+            child = subprocess.run(argv, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+            if child.returncode:
+                raise CommandError(f'Замер {mode} завершился с ошибкой:\n{child.stderr}')
+            results[mode] = json.loads(child.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"\n{'конк.':>6} | {'WSGI req/s':>10} {'p50':>8} {'p95':>8} {'p99':>8} "
+                          f"| {'ASGI req/s':>10} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for level in levels:
+            row = f'{level:>6} |'
+            for mode in ('wsgi', 'asgi'):
+                stats = results[mode][str(level)]
+                row += (f" {stats['rps']:>10} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+                        f"{stats['p99_ms']:>8} |")
+            self.stdout.write(row.rstrip('|'))
+        errors = sum(stats['errors'] for mode in results.values() for stats in mode.values())
+        if errors:
+            self.stdout.write(self.style.ERROR(f'Ответов с ошибкой: {errors}'))
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump({'concurrency': levels, 'requests': options['requests'], 'results': results},
+                          output, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['json']}"))
+
+    def measure(self, mode, levels, options):
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if not options['page_cache']:
+            overrides['BLOG_PAGE_CACHE'] = False
+        run = benchmarks.run_async if mode == 'asgi' else benchmarks.run_sync
+        results = {}
+        with override_settings(**overrides):
+            urls = benchmarks.read_urls()
+            # Прогрев: реестр категорий, шаблоны, соединения
+            run(urls, 1, len(urls))
+            for level in levels:
+                results[level] = run(urls, level, options['requests'])
+        self.stdout.write(json.dumps(results))
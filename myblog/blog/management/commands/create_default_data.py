@@ -1,27 +1,15 @@
 # blog/management/commands/create_default_data.py
 from django.core.management.base import BaseCommand
-from blog.models import Category, Tag
-import uuid
-from django.template.defaultfilters import slugify
+from blog.taxonomy import create_default_categories_and_tags
 
 class Command(BaseCommand):
     help = 'Создает категории и теги по умолчанию'
 
     def handle(self, *args, **options):
-        categories = ['Программирование', 'Дизайн', 'Маркетинг', 'Путешествия', 'Кулинария']
+        categories, tags = create_default_categories_and_tags()
         for cat_name in categories:
-            category, created = Category.objects.get_or_create(name=cat_name)
-            if created:
-                category.slug = slugify(cat_name) + '-' + uuid.uuid4().hex[:6]
-                category.save()
-                self.stdout.write(self.style.SUCCESS(f'Создана категория: {cat_name}'))
-        
-        tags = ['django', 'python', 'web', 'development', 'design', 'cooking', 'travel']
+            self.stdout.write(self.style.SUCCESS(f'Создана категория: {cat_name}'))
         for tag_name in tags:
-            tag, created = Tag.objects.get_or_create(name=tag_name)
-            if created:
-                tag.slug = slugify(tag_name) + '-' + uuid.uuid4().hex[:6]
-                tag.save()
-                self.stdout.write(self.style.SUCCESS(f'Создан тег: {tag_name}'))
+            self.stdout.write(self.style.SUCCESS(f'Создан тег: {tag_name}'))
         
-        self.stdout.write(self.style.SUCCESS('Категории и теги по умолчанию созданы!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Категории и теги по умолчанию созданы!'))
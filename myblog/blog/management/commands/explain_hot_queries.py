@@ -0,0 +1,51 @@
+# blog/management/commands/explain_hot_queries.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from blog.models import Category, Comment, Post
+
+FEED_ORDER = ('-published_date', '-id')
+PAGE_SIZE = 5
+
+class Command(BaseCommand):
+    help = 'Печатает план выполнения основных запросов каждого представления блога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Псевдоним базы данных')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Выполнить запросы и показать фактическое время (только PostgreSQL)')
+
+    def hot_queries(self, using):
+        posts = Post.objects.using(using)
+        sample = posts.published().order_by(*FEED_ORDER).first()
+        category = sample.category if sample and sample.category else Category(pk=0)
+        author = sample.author if sample else User(pk=0)
+        slug = sample.slug if sample else ''
+
+        return [
+            ('post_list', posts.published().for_listing().order_by(*FEED_ORDER)[:PAGE_SIZE + 1]),
+            ('post_detail', posts.for_detail().filter(slug=slug)),
+            ('post_detail: комментарии', Comment.objects.using(using).filter(
+                post_id=sample.pk if sample else 0, approved_comment=True).order_by('created_date')),
+            ('category_posts', posts.published().for_listing().filter(
+                category=category).order_by(*FEED_ORDER)[:PAGE_SIZE * 2 + 1]),
+            ('user_profile', posts.published().for_listing().filter(
+                author=author).order_by(*FEED_ORDER)[:PAGE_SIZE * 2 + 1]),
+            ('my_posts', posts.for_listing().filter(author=author).order_by('-created_date')),
+        ]
+
+    def handle(self, *args, **options):
+        using = options['database']
+        vendor = connections[using].vendor
+        explain_options = {}
+        if options['analyze']:
+            if vendor == 'postgresql':
+                explain_options = {'analyze': True, 'buffers': True}
+            else:
+                self.stdout.write(self.style.WARNING('--analyze поддерживается только в PostgreSQL'))
+
+        self.stdout.write(f'База: {using} ({vendor})')
+        for name, queryset in self.hot_queries(using):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {name}'))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,56 @@
+# blog/management/commands/export_blog.py
+import gzip
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from blog.transfer import InvalidRecord, export_posts, to_datetime
+
+class Command(BaseCommand):
+    help = 'Выгружает посты с тегами и комментариями в JSON Lines (gzip) для резервной копии или import_posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл выгрузки; сжимается gzip, если имя оканчивается на .gz')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Сколько постов читать одним запросом')
+        parser.add_argument('--since',
+                            help='Выгрузить только посты, измененные после этой даты (ISO 8601)')
+        parser.add_argument('--state-file',
+                            help='Файл с отметкой прошлой выгрузки: выгружаются только изменения '
+                                 'после нее, после успеха отметка обновляется')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        state_file = options['state_file']
+        since = options['since']
+        if since is None and state_file and os.path.exists(state_file):
+            with open(state_file, encoding='utf-8') as state:
+                since = json.load(state).get('watermark')
+        try:
+            since = to_datetime(since)
+        except InvalidRecord as exc:
+            raise CommandError(str(exc))
+
+        # Отметку берем до чтения: изменения во время выгрузки попадут в следующую
+        watermark = timezone.now()
+        started = time.monotonic()
+        count = 0
+        # Пишем во временный файл: прерванная выгрузка не затрет прошлую копию
+        temporary = f'{output}.tmp'
+        opener = gzip.open if output.endswith('.gz') else open
+        with opener(temporary, 'wt', encoding='utf-8') as stream:
+            for record in export_posts(since=since, chunk_size=options['chunk_size']):
+                stream.write(json.dumps(record, ensure_ascii=False))
+                stream.write('\n')
+                count += 1
+                if count % 10000 == 0:
+                    self.stdout.write(f'Выгружено {count}, {count / (time.monotonic() - started):.0f} постов/с')
+        os.replace(temporary, output)
+
+        if state_file:
+            with open(state_file, 'w', encoding='utf-8') as state:
+                json.dump({'watermark': watermark.isoformat()}, state)
+        changed = f' (изменения после {since.isoformat()})' if since else ''
+        self.stdout.write(self.style.SUCCESS(f'Выгружено постов: {count}{changed} -> {output}'))
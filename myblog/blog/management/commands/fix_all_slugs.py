@@ -1,56 +1,99 @@
 # blog/management/commands/fix_all_slugs.py
+from pathlib import Path
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from blog.models import Post
-from django.template.defaultfilters import slugify
+from blog.pagecache import GLOBAL, bump
+from blog.search import reindex_posts
+from blog.slugs import SlugPool, base_slug
+
+# Пустые или состоящие из пробелов значения
+BLANK = r'^\s*$'
 
 class Command(BaseCommand):
     help = 'Исправляет ВСЕ посты с пустыми или некорректными slug'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько постов исправлять в одной транзакции')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет исправлено, ничего не сохраняя')
+        parser.add_argument('--progress-file',
+                            help='Файл с id последнего обработанного поста для продолжения после остановки')
+        parser.add_argument('--summary', action='store_true',
+                            help='Не печатать строку на каждый пост, только итог')
+
     def handle(self, *args, **options):
-        posts = Post.objects.all()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        summary_only = options['summary']
+        progress_file = Path(options['progress_file']) if options['progress_file'] else None
+
+        last_pk = 0
+        if progress_file and progress_file.exists():
+            last_pk = int(progress_file.read_text().strip() or 0)
+            self.stdout.write(f'Продолжаем после поста ID {last_pk}')
+
+        # Занятые slug читаются по мере надобности, по запросу на основу;
+        # выделенные за прогон запоминаются (важно для --dry-run)
+        slugs = SlugPool(Post.objects.all())
+
+        broken = Post.objects.filter(Q(slug__regex=BLANK) | Q(title__regex=BLANK)).only(
+            'id', 'title', 'slug', 'updated_date'
+        )
         fixed_count = 0
-        
-        for post in posts:
-            original_slug = post.slug
-            needs_fix = False
-            
-            # Проверяем заголовок
-            if not post.title or post.title.strip() == "":
-                post.title = f"Пост {post.id}"
-                needs_fix = True
-                self.stdout.write(f'📝 Исправлен заголовок поста {post.id}')
-            
-            # Проверяем slug - если пустой, None или содержит только пробелы
-            if not post.slug or str(post.slug).strip() == "":
-                needs_fix = True
-                self.stdout.write(f'🚨 Найден пост с пустым slug: ID {post.id}, заголовок: "{post.title}"')
-            
-            if needs_fix:
-                # Генерируем новый slug
-                base_slug = slugify(post.title)
-                if not base_slug:
-                    base_slug = f"post-{post.id}"
-                
-                unique_slug = base_slug
-                counter = 1
-                
-                # Проверяем уникальность
-                while Post.objects.filter(slug=unique_slug).exclude(pk=post.pk).exists():
-                    unique_slug = f"{base_slug}-{counter}"
-                    counter += 1
-                
-                post.slug = unique_slug
-                post.save()
+        while True:
+            # Пачки по первичному ключу: между пачками не держим открытый курсор
+            batch = list(broken.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            retitled = []
+            for post in batch:
+                original_slug = post.slug
+                if not post.title or post.title.strip() == "":
+                    post.title = f"Пост {post.id}"
+                    retitled.append(post.pk)
+                    if not summary_only:
+                        self.stdout.write(f'📝 Исправлен заголовок поста {post.id}')
+                if not post.slug or str(post.slug).strip() == "":
+                    post.slug = slugs.allocate(base_slug(post.title, f'post-{post.id}'))
                 fixed_count += 1
-                self.stdout.write(self.style.SUCCESS(f'✅ Исправлен пост: ID {post.id}, "{post.title}" -> "{post.slug}" (было: "{original_slug}")'))
-            else:
-                self.stdout.write(f'✓ Пост ID {post.id} в порядке: "{post.title}" -> "{post.slug}"')
-        
-        self.stdout.write(self.style.SUCCESS(f'\n🎉 Исправлено постов: {fixed_count} из {posts.count()}'))
-        
+                if not summary_only:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✅ Исправлен пост: ID {post.id}, "{post.title}" -> "{post.slug}" (было: "{original_slug}")'
+                    ))
+
+            last_pk = batch[-1].pk
+            if dry_run:
+                continue
+            with transaction.atomic():
+                # bulk_update не трогает auto_now, а от updated_date зависит кэш карточек
+                now = timezone.now()
+                for post in batch:
+                    post.updated_date = now
+                Post.objects.bulk_update(batch, ['title', 'slug', 'updated_date'], batch_size=batch_size)
+                if retitled:
+                    reindex_posts(Post.objects.filter(pk__in=retitled))
+            # bulk_update не вызывает сигналы: ссылки на посты есть в лентах, RSS
+            # и карточках, а их ключи кэша включают общее поколение
+            bump(GLOBAL)
+            if progress_file:
+                progress_file.write_text(str(last_pk))
+            self.stdout.write(f'Пачка сохранена, последний ID {last_pk}, исправлено всего: {fixed_count}')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'\nПробный запуск: будет исправлено постов: {fixed_count}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'\n🎉 Исправлено постов: {fixed_count}'))
+        # Проход завершен: следующий запуск должен начать с начала
+        if progress_file:
+            progress_file.unlink(missing_ok=True)
+
         # Проверим остались ли посты с пустыми slug
-        problematic_posts = Post.objects.filter(slug__isnull=True) | Post.objects.filter(slug='')
-        if problematic_posts.exists():
-            self.stdout.write(self.style.ERROR(f'❌ Осталось проблемных постов: {problematic_posts.count()}'))
-            for post in problematic_posts:
-                self.stdout.write(self.style.ERROR(f'   ID {post.id}: "{post.title}" -> slug: "{post.slug}"'))
\ No newline at end of file
+        remaining = Post.objects.filter(slug__regex=BLANK).count()
+        if remaining:
+            self.stdout.write(self.style.ERROR(f'❌ Осталось проблемных постов: {remaining}'))
@@ -0,0 +1,80 @@
+# blog/management/commands/generate_image_variants.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog.images import IMAGE_FIELDS, render_variants, widths_for
+from blog.pagecache import GLOBAL, bump
+
+
+def render_job(model_label, field_name, pk, name, widths):
+    """Выполняется в дочернем процессе: только файлы, без БД"""
+    storage = apps.get_model(model_label)._meta.get_field(field_name).storage
+    try:
+        return pk, render_variants(name, widths, storage), None
+    except Exception as exc:
+        return pk, [], f'{name}: {exc}'
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные JPEG и WebP копии для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Число процессов для обработки изображений')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Сколько объектов читать и сохранять за раз')
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать копии и для объектов, у которых они уже есть')
+
+    def handle(self, *args, **options):
+        total = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for model, (field_name, widths_field, _) in IMAGE_FIELDS.items():
+                done, errors = self.process_model(pool, model, field_name, widths_field, options)
+                total += done
+                failed += errors
+        if total:
+            # Карточки и профили во всех закэшированных страницах устарели
+            bump(GLOBAL)
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {total}, с ошибками: {failed}'))
+
+    def process_model(self, pool, model, field_name, widths_field, options):
+        queryset = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        if not options['force']:
+            queryset = queryset.filter(**{widths_field: []})
+        queryset = queryset.only('pk', field_name, widths_field).order_by('pk')
+        widths = widths_for(model)
+        has_updated_date = any(field.name == 'updated_date' for field in model._meta.concrete_fields)
+        update_fields = [widths_field] + (['updated_date'] if has_updated_date else [])
+
+        done = errors = 0
+        last_pk = 0
+        while True:
+            # Пачки по первичному ключу, как в fix_all_slugs
+            batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            by_pk = {obj.pk: obj for obj in batch}
+            jobs = [
+                pool.submit(render_job, model._meta.label, field_name, obj.pk,
+                            getattr(obj, field_name).name, widths)
+                for obj in batch
+            ]
+            now = timezone.now()
+            for job in jobs:
+                pk, generated, error = job.result()
+                if error:
+                    errors += 1
+                    self.stderr.write(f'❌ {model._meta.label} {pk}: {error}')
+                setattr(by_pk[pk], widths_field, generated)
+                if has_updated_date:
+                    by_pk[pk].updated_date = now
+            model._default_manager.bulk_update(batch, update_fields)
+            done += len(batch)
+            self.stdout.write(f'{model._meta.label}: обработано {done}')
+        return done, errors
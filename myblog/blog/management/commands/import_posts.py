@@ -0,0 +1,89 @@
+# blog/management/commands/import_posts.py
+import gzip
+import os
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from blog.transfer import InvalidRecord, PostImporter, read_jsonl, read_markdown_dir
+
+class Command(BaseCommand):
+    help = 'Импортирует посты из файла JSON Lines или каталога Markdown-файлов с front matter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Файл .jsonl или .jsonl.gz ("-" - стандартный ввод) или каталог с .md')
+        parser.add_argument('--format', choices=['jsonl', 'markdown'],
+                            help='Формат источника (по умолчанию определяется по пути)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько постов вставлять одним bulk_create')
+        parser.add_argument('--default-author',
+                            help='Пользователь для записей без автора или с неизвестным автором')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Создавать неизвестных авторов, категории и теги')
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='Пропускать записи, чей slug уже занят (повторный импорт)')
+        parser.add_argument('--publish', action='store_true',
+                            help='Публиковать записи, в которых не указан is_published')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только проверить записи, ничего не сохраняя')
+        parser.add_argument('--progress-every', type=int, default=10000,
+                            help='Печатать прогресс каждые N записей')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        file_format = options['format'] or ('markdown' if os.path.isdir(source) else 'jsonl')
+        try:
+            importer = PostImporter(
+                batch_size=options['batch_size'],
+                default_author=options['default_author'],
+                create_missing=options['create_missing'],
+                skip_existing=options['skip_existing'],
+                publish=options['publish'],
+                dry_run=options['dry_run'],
+            )
+        except InvalidRecord as exc:
+            raise CommandError(str(exc))
+
+        started = time.monotonic()
+        seen = 0
+        stream = None
+        if file_format == 'markdown':
+            records = read_markdown_dir(source)
+        else:
+            if source == '-':
+                stream = sys.stdin
+            else:
+                # Выгрузка export_blog сжата gzip
+                opener = gzip.open if source.endswith('.gz') else open
+                stream = opener(source, 'rt', encoding='utf-8')
+            records = read_jsonl(stream)
+        try:
+            for position, record in records:
+                importer.add(position, record)
+                seen += 1
+                if seen % options['progress_every'] == 0:
+                    self.report(importer, seen, started)
+            importer.finish()
+        finally:
+            if stream is not None and stream is not sys.stdin:
+                stream.close()
+
+        self.report(importer, seen, started)
+        for message in importer.errors:
+            self.stderr.write(f'❌ {message}')
+        if importer.failed > len(importer.errors):
+            self.stderr.write(f'... и еще ошибок: {importer.failed - len(importer.errors)}')
+        verb = 'будет импортировано' if options['dry_run'] else 'импортировано'
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {verb} {importer.imported}, пропущено {importer.skipped}, с ошибками {importer.failed}'
+        ))
+
+    def report(self, importer, seen, started):
+        elapsed = time.monotonic() - started
+        # ru_maxrss в Linux - килобайты
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        self.stdout.write(
+            f'Прочитано {seen}, импортировано {importer.imported}, '
+            f'{seen / elapsed if elapsed else 0:.0f} записей/с, память {memory} МБ'
+        )
@@ -0,0 +1,18 @@
+# blog/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from blog.search import get_backend, rebuild_index
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько постов индексировать за один проход')
+        parser.add_argument('--database', default='default',
+                            help='Псевдоним базы данных')
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['database'])
+        self.stdout.write(f'Бэкенд поиска: {backend.__class__.__name__}')
+        total = rebuild_index(batch_size=options['batch_size'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано постов: {total}'))
@@ -0,0 +1,20 @@
+# blog/management/commands/recount.py
+from django.core.management.base import BaseCommand
+from blog.counters import recount
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов, комментариев, категорий и тегов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, сколько счетчиков разошлось, ничего не сохраняя')
+
+    def handle(self, *args, **options):
+        fixed = recount(dry_run=options['dry_run'])
+        for model_name, count in fixed.items():
+            style = self.style.WARNING if count else self.style.SUCCESS
+            self.stdout.write(style(f'{model_name}: расхождений {count}'))
+        if options['dry_run']:
+            self.stdout.write('Пробный запуск: ничего не сохранено')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено строк: {sum(fixed.values())}'))
@@ -0,0 +1,39 @@
+# blog/management/commands/run_worker.py
+import signal
+
+from django.core.management.base import BaseCommand
+from blog.jobs import Worker
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди blog_job'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                            help='Пул потоков (ввод-вывод) или процессов (тяжелые вычисления)')
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Сколько задач выполнять одновременно')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Пауза в секундах между опросами пустой очереди')
+        parser.add_argument('--burst', action='store_true',
+                            help='Завершиться, когда очередь опустеет')
+        parser.add_argument('--max-jobs', type=int,
+                            help='Завершиться после указанного числа задач')
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            executor=options['executor'],
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            log=self.stdout.write,
+        )
+
+        def stop(signum, frame):
+            self.stdout.write(self.style.WARNING('Остановка: дожидаемся начатых задач...'))
+            worker.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f'Воркер {worker.name}: {options["executor"]} x{options["concurrency"]}')
+        processed = worker.run(burst=options['burst'], max_jobs=options['max_jobs'])
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
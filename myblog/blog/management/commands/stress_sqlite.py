@@ -0,0 +1,65 @@
+# blog/management/commands/stress_sqlite.py
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from blog import benchmarks
+
+class Command(BaseCommand):
+    help = ('Нагружает временную БД SQLite с синтетическими данными параллельными процессами '
+            '(чтение ленты и комментарии) и считает ошибки "database is locked" '
+            'при текущих настройках и настройках по умолчанию')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8,
+                            help='Число процессов, как воркеров gunicorn')
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Длительность прогона каждого режима, секунд')
+        parser.add_argument('--write-ratio', type=float, default=0.3,
+                            help='Доля операций записи')
+        parser.add_argument('--only-tuned', action='store_true',
+                            help='Не прогонять настройки SQLite по умолчанию')
+        parser.add_argument('--posts', type=int, default=200, help='Сколько постов засеять')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда проверяет только SQLite')
+
+        modes = [('настроенный', settings.DATABASES['default'].get('OPTIONS', {}))]
+        if not options['only_tuned']:
+            modes.insert(0, ('по умолчанию', benchmarks.SQLITE_DEFAULT_OPTIONS))
+
+        # Настроенная БД не меняется: данные засеваются во временную, с нее снимаются копии
+        with benchmarks.benchmark_database(), tempfile.TemporaryDirectory() as directory:
+            benchmarks.seed(posts=options['posts'])
+            for label, sqlite_options in modes:
+                # Каждый режим - на свежей копии: режим журнала хранится в файле БД
+                path = os.path.join(directory, f'{len(label)}.sqlite3')
+                benchmarks.copy_sqlite_database(path)
+                with ProcessPoolExecutor(
+                    options['processes'], mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                ) as pool:
+                    results = list(pool.map(
+                        benchmarks.sqlite_stress_worker,
+                        *zip(*[(path, sqlite_options, options['duration'], options['write_ratio'], number)
+                               for number in range(options['processes'])]),
+                    ))
+                self.report(label, results, options['duration'])
+
+    def report(self, label, results, duration):
+        latencies = [latency for result in results for latency in result['latencies']]
+        writes = sum(result['writes'] for result in results)
+        reads = sum(result['reads'] for result in results)
+        locked = sum(result['locked'] for result in results)
+        summary = benchmarks.summarize(latencies, duration, locked)
+        style = self.style.ERROR if locked else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{label}: записей {writes} ({writes / duration:.0f}/с), чтений {reads}, '
+            f'"database is locked": {locked}, p50 {summary["p50_ms"]} мс, p99 {summary["p99_ms"]} мс'
+        ))
@@ -0,0 +1,30 @@
+# blog/management/commands/sync_replicas.py
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from blog.routers import replica_aliases
+
+class Command(BaseCommand):
+    help = 'Копирует основную БД SQLite в файлы реплик (имитация репликации для локальной проверки)'
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда нужна только для реплик SQLite: остальные БД реплицируются сами')
+        replicas = replica_aliases()
+        if not replicas:
+            raise CommandError('Реплики не настроены: задайте BLOG_DB_REPLICAS')
+        primary.ensure_connection()
+        for alias in replicas:
+            connection = connections[alias]
+            if connection.vendor != 'sqlite':
+                raise CommandError(f'{alias}: не SQLite')
+            connection.close()
+            # Онлайн-копия через backup API: основная БД не блокируется на все время копирования
+            target = sqlite3.connect(connection.settings_dict['NAME'])
+            try:
+                primary.connection.backup(target, pages=1024)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias} обновлена'))
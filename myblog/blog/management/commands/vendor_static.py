@@ -0,0 +1,32 @@
+# blog/management/commands/vendor_static.py
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from blog.staticfiles import VENDOR_ASSETS, sri_hash, vendor_path
+
+class Command(BaseCommand):
+    help = 'Скачивает сторонние библиотеки (Bootstrap) в static/vendor и сверяет их SRI-хэши'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Скачать заново, даже если файл уже есть')
+
+    def handle(self, *args, **options):
+        for name, url, integrity in VENDOR_ASSETS:
+            path = vendor_path(name)
+            if path.is_file() and not options['force']:
+                if sri_hash(path.read_bytes()) != integrity:
+                    raise CommandError(f'{name}: содержимое не совпадает с {integrity}, скачайте заново с --force')
+                self.stdout.write(f'{name}: уже есть')
+                continue
+            try:
+                with urlopen(url, timeout=30) as response:
+                    content = response.read()
+            except URLError as e:
+                raise CommandError(f'{name}: не удалось скачать {url}: {e.reason}')
+            # Файл с CDN подменен или поврежден - в репозиторий он не попадет
+            if sri_hash(content) != integrity:
+                raise CommandError(f'{name}: хэш {sri_hash(content)} не совпадает с ожидаемым {integrity}')
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+            self.stdout.write(self.style.SUCCESS(f'{name}: {len(content)} байт'))
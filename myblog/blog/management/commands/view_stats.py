@@ -0,0 +1,40 @@
+# blog/management/commands/view_stats.py
+from django.core.management.base import BaseCommand, CommandError
+from blog.instrumentation import read_view_stats, reset_view_stats, stats_cache_alias, stats_cache_is_shared
+
+class Command(BaseCommand):
+    help = 'Выводит накопленную статистику по представлениям (нужен BLOG_INSTRUMENTATION и общий кэш)'
+
+    SORT_FIELDS = {'total': 'total_us', 'requests': 'requests', 'sql': 'sql_us', 'queries': 'queries', 'max': 'max_us'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=list(self.SORT_FIELDS), default='total',
+                            help='Поле сортировки (по убыванию)')
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить статистику после вывода')
+
+    def handle(self, *args, **options):
+        if not stats_cache_is_shared():
+            # Статистика лежит в памяти процессов сервера, отсюда ее не прочитать
+            raise CommandError(f'Кэш {stats_cache_alias()} не общий для процессов: '
+                               'задайте общий бэкенд в BLOG_INSTRUMENTATION_CACHE или DJANGO_CACHE_BACKEND')
+        stats = read_view_stats()
+        if not stats:
+            self.stdout.write('Статистики нет: включите BLOG_INSTRUMENTATION')
+            return
+        field = self.SORT_FIELDS[options['sort']]
+        self.stdout.write(
+            f"{'Представление':<32} {'запросов':>8} {'ср. мс':>8} {'макс. мс':>9} {'SQL/запр':>9} "
+            f"{'SQL мс':>8} {'шабл. мс':>9} {'N+1':>5} {'медл.':>6}"
+        )
+        for view, row in sorted(stats.items(), key=lambda item: item[1][field], reverse=True):
+            requests = row['requests'] or 1
+            self.stdout.write(
+                f"{view:<32} {row['requests']:>8} {row['total_us'] / requests / 1000:>8.1f} "
+                f"{row['max_us'] / 1000:>9.1f} {row['queries'] / requests:>9.1f} "
+                f"{row['sql_us'] / requests / 1000:>8.1f} {row['render_us'] / requests / 1000:>9.1f} "
+                f"{row['n_plus_one']:>5} {row['slow']:>6}"
+            )
+        if options['reset']:
+            reset_view_stats()
+            self.stdout.write(self.style.SUCCESS('Статистика обнулена'))
@@ -0,0 +1,163 @@
+# blog/media.py
+"""Отдача загруженных файлов (MEDIA_ROOT) в production.
+
+serve_media заменяет django.conf.urls.static.static(), который работает
+только при DEBUG:
+- файл передается потоком через FileResponse; WSGI-сервер с
+  wsgi.file_wrapper (gunicorn) отправляет его через sendfile();
+- поддерживаются Range (перемотка видео, докачка) и условные запросы
+  If-None-Match / If-Modified-Since;
+- имена в BLOG_MEDIA_IMMUTABLE_PREFIXES не меняют содержимое (хранилище
+  не перезаписывает файлы, новая загрузка получает новое имя), поэтому
+  кэшируются на год с immutable.
+
+Если перед приложением стоит nginx или Apache, BLOG_MEDIA_SENDFILE
+передает отдачу ему: приложение проверяет путь и ставит заголовки кэша,
+а сам файл отправляет сервер.
+- 'x-accel-redirect' (nginx): заголовок с адресом BLOG_MEDIA_ACCEL_PREFIX + путь;
+  нужен internal location с alias на MEDIA_ROOT;
+- 'x-sendfile' (Apache mod_xsendfile, lighttpd): заголовок с путем к файлу.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class MediaResponse(FileResponse):
+    # Крупнее блока по умолчанию (4 КБ): меньше итераций на больших файлах
+    block_size = 64 * 1024
+
+
+class FileRange:
+    """Часть открытого файла для FileResponse: read() не выходит за границу"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) для одного диапазона bytes=.
+
+    None - заголовка нет или он не поддерживается (несколько диапазонов):
+    отдается весь файл. ValueError - диапазон за пределами файла (416).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: последние 500 байт
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError(header)
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def cache_control(path):
+    prefixes = tuple(getattr(settings, 'BLOG_MEDIA_IMMUTABLE_PREFIXES', ('post_images/', 'avatars/')))
+    if path.startswith(prefixes):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f"public, max-age={getattr(settings, 'BLOG_MEDIA_MAX_AGE', 3600)}"
+
+
+def sendfile_response(path, full_path):
+    """Пустой ответ с заголовком для фронт-сервера; None - передача не настроена"""
+    mode = getattr(settings, 'BLOG_MEDIA_SENDFILE', None)
+    if not mode:
+        return None
+    response = HttpResponse()
+    # Content-Type фронт-сервер берет из ответа приложения
+    response['Content-Type'] = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'BLOG_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix + quote(path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ValueError(f'Неизвестный BLOG_MEDIA_SENDFILE: {mode}')
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = sendfile_response(path, full_path)
+    if response is None:
+        byte_range = None
+        # If-Range с устаревшим ETag: файл изменился, диапазон не имеет смысла
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                # Ошибка не должна закэшироваться на год вместо файла
+                response['Cache-Control'] = 'no-store'
+        if response is None:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            file = open(full_path, 'rb')
+            if byte_range is None:
+                response = MediaResponse(file, content_type=content_type)
+            else:
+                start, end = byte_range
+                response = MediaResponse(FileRange(file, start, end - start + 1), content_type=content_type, status=206)
+                response['Content-Length'] = end - start + 1
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if response.status_code in (200, 206, 304):
+        for header, value in headers.items():
+            response[header] = value
+    return response
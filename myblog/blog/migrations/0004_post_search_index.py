@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from blog.search import get_backend
+
+    get_backend(schema_editor.connection.alias).install(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from blog.search import get_backend
+
+    get_backend(schema_editor.connection.alias).uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_alter_category_slug_alter_post_category_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
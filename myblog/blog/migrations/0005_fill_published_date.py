@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def fill_published_date(apps, schema_editor):
+    # Опубликованные посты без даты публикации ломают пагинацию по ключу
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.filter(is_published=True, published_date__isnull=True).update(
+        published_date=F('created_date')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_published_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
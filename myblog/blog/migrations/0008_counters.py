@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    # Начальные значения считаются тем же кодом, что и в команде recount
+    from blog.counters import recount
+    recount(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_updated_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='published_post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='approved_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='published_post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
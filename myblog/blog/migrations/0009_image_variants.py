@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
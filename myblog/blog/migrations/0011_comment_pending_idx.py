@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('approved_comment', False)), fields=['created_date', 'id'], name='comment_pending_idx'),
+        ),
+    ]
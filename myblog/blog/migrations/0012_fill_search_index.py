@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def fill_search_index(apps, schema_editor):
+    # 0004 создала пустой индекс: посты, написанные до нее, поиск не находил
+    from blog.search import rebuild_index
+
+    rebuild_index(using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_comment_pending_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -1,52 +1,68 @@
 # blog/models.py
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
-from django.template.defaultfilters import slugify
+from .slugs import UniqueSlugMixin
 
-# blog/models.py (обновите методы save для Category и Tag)
-class Category(models.Model):
+class CounterFieldsMixin:
+    """Не перезаписывает при обычном save() поля из save_excluded_fields.
+
+    Это поля, которые меняются только точечными UPDATE: счетчики - через F()
+    в blog/counters.py, списки готовых копий изображений - фоновой задачей
+    blog/images.py. Сохранение объекта, загруженного раньше, не должно
+    затирать их устаревшим значением.
+    """
+
+    save_excluded_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.save_excluded_fields
+            ]
+        return super().save(*args, **kwargs)
+
+class Category(UniqueSlugMixin, CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
+    published_post_count = models.PositiveIntegerField(default=0, editable=False)
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            unique_slug = base_slug
-            counter = 1
-            
-            while Category.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{counter}"
-                counter += 1
-            
-            self.slug = unique_slug
-        super().save(*args, **kwargs)
+    save_excluded_fields = ('published_post_count',)
+
+    slug_source_field = 'name'
+    slug_fallback = 'category'
 
     def __str__(self):
         return self.name
 
-class Tag(models.Model):
+class Tag(UniqueSlugMixin, CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
+    published_post_count = models.PositiveIntegerField(default=0, editable=False)
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            unique_slug = base_slug
-            counter = 1
-            
-            while Tag.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{counter}"
-                counter += 1
-            
-            self.slug = unique_slug
-        super().save(*args, **kwargs)
+    save_excluded_fields = ('published_post_count',)
+
+    slug_source_field = 'name'
+    slug_fallback = 'tag'
 
     def __str__(self):
         return self.name
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(is_published=True)
+
+    def for_listing(self):
+        # Карточки постов выводят автора и категорию
+        return self.select_related('author', 'category')
+
+    def for_detail(self):
+        return self.select_related('author', 'category').prefetch_related('tags')
+
+class Post(UniqueSlugMixin, CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     content = models.TextField()
@@ -57,19 +73,49 @@ class Post(models.Model):
     tags = models.ManyToManyField(Tag, blank=True)
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
     is_published = models.BooleanField(default=False)
+    # Меняется при каждом сохранении, входит в ключи кэша фрагментов
+    updated_date = models.DateTimeField(auto_now=True)
+    approved_comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Ширины готовых копий изображения (blog/images.py)
+    image_widths = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    slug_source_field = 'title'
+    slug_fallback = 'post'
+    save_excluded_fields = ('approved_comment_count', 'image_widths')
+
+    class Meta:
+        # Индексы повторяют запросы лент: фильтр по is_published и сортировка
+        # по (published_date, id), как в CursorPaginator
+        indexes = [
+            models.Index(
+                fields=['-published_date', '-id'], name='post_feed_idx',
+                condition=Q(is_published=True),
+            ),
+            models.Index(
+                fields=['category', '-published_date', '-id'], name='post_category_feed_idx',
+                condition=Q(is_published=True),
+            ),
+            models.Index(
+                fields=['author', '-published_date', '-id'], name='post_author_feed_idx',
+                condition=Q(is_published=True),
+            ),
+            models.Index(fields=['author', '-created_date'], name='post_author_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Состояние в базе нужно счетчикам категорий, тегов и авторов
+        if {'is_published', 'category_id', 'author_id'} <= set(field_names):
+            instance._counter_state = (instance.is_published, instance.category_id, instance.author_id)
+        return instance
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            unique_slug = base_slug
-            counter = 1
-            
-            # Проверяем уникальность slug
-            while Post.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{counter}"
-                counter += 1
-            
-            self.slug = unique_slug
+        # Пагинация по ключу опирается на published_date у опубликованных постов
+        if self.is_published and not self.published_date:
+            self.published_date = timezone.now()
         super().save(*args, **kwargs)
 
     def publish(self):
@@ -90,24 +136,91 @@ class Comment(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     approved_comment = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Частичный индекс: фильтр approved_comment=True совпадает с условием индекса
+            models.Index(
+                fields=['post', 'created_date'], name='comment_post_approved_idx',
+                condition=Q(approved_comment=True),
+            ),
+            # Очередь модерации (blog/moderation.py): неодобренные по порядку поступления
+            models.Index(
+                fields=['created_date', 'id'], name='comment_pending_idx',
+                condition=Q(approved_comment=False),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Состояние в базе нужно счетчику одобренных комментариев поста
+        if 'approved_comment' in field_names:
+            instance._approved_in_db = instance.approved_comment
+        return instance
+
     def approve(self):
+        if self.approved_comment:
+            return
         self.approved_comment = True
-        self.save()
+        self.save(update_fields=['approved_comment'])
 
     def __str__(self):
         return self.text
 
-class UserProfile(models.Model):
+class UserProfile(CounterFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=30, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     website = models.URLField(blank=True)
+    avatar_widths = models.JSONField(default=list, blank=True, editable=False)
+    # Число опубликованных постов пользователя
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+
+    save_excluded_fields = ('post_count', 'avatar_widths')
     
     def __str__(self):
         return f'{self.user.username} Profile'
 
+class Job(models.Model):
+    """Фоновая задача из очереди blog/jobs.py"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    timeout = models.PositiveIntegerField(default=60, help_text='Секунд на одну попытку')
+    run_at = models.DateTimeField(default=timezone.now)
+    created_date = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Выборка воркера: готовые к запуску задачи по времени
+            models.Index(fields=['run_at', 'id'], name='job_pending_idx',
+                         condition=Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
 # Сигналы для автоматического создания профиля
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -118,7 +231,10 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    # Вход в систему обновляет только last_login - профиль сохранять незачем
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
     if hasattr(instance, 'userprofile'):
         instance.userprofile.save()
 
@@ -0,0 +1,104 @@
+# blog/moderation.py
+"""Массовая модерация комментариев.
+
+approve_comments и reject_comments меняют сразу весь набор одним UPDATE
+(DELETE на каждые DELETE_CHUNK комментариев) без save() и delete() на
+каждый комментарий. Сигналы при этом не срабатывают, поэтому счетчики одобренных комментариев и кэш страниц
+обновляются здесь же - один раз на пачку, только для затронутых постов.
+
+Очередь модерации (/admin/moderation/) листает неодобренные комментарии
+по ключу (created_date, id) - по частичному индексу comment_pending_idx,
+без OFFSET и без COUNT всей таблицы.
+"""
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.db import connections, router, transaction
+from django.shortcuts import redirect, render
+
+from .counters import refresh_comment_counts
+from .models import Comment
+from .pagecache import bump, posts_scopes
+from .pagination import CursorPaginator
+
+# id в одном DELETE: SQLite ограничивает число параметров запроса
+DELETE_CHUNK = 500
+
+
+def comments_changed(post_ids):
+    """Пересчитывает счетчики постов и сбрасывает их страницы"""
+    if post_ids:
+        refresh_comment_counts(post_ids)
+        bump(*posts_scopes(post_ids))
+
+
+def approve_comments(queryset):
+    """Одобряет комментарии набора; возвращает число одобренных"""
+    using = router.db_for_write(Comment)
+    with transaction.atomic(using=using):
+        pending = queryset.using(using).filter(approved_comment=False).order_by()
+        post_ids = set(pending.values_list('post_id', flat=True).distinct())
+        count = pending.update(approved_comment=True)
+        comments_changed(post_ids)
+    return count
+
+
+def delete_rows(model, pks, using):
+    """DELETE строк по первичному ключу в обход сборщика связей и сигналов"""
+    ops = connections[using].ops
+    table, column = ops.quote_name(model._meta.db_table), ops.quote_name(model._meta.pk.column)
+    count = 0
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(pks), DELETE_CHUNK):
+            chunk = pks[start:start + DELETE_CHUNK]
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            count += cursor.rowcount
+    return count
+
+
+def reject_comments(queryset):
+    """Удаляет комментарии набора; возвращает число удаленных"""
+    using = router.db_for_write(Comment)
+    with transaction.atomic(using=using):
+        rows = list(queryset.using(using).order_by().values_list('pk', 'post_id', 'approved_comment'))
+        # Страницы и счетчики меняются только у постов с одобренными комментариями
+        post_ids = {post_id for _, post_id, approved in rows if approved}
+        # queryset.delete() здесь не подходит: у Comment есть обработчики
+        # post_delete (счетчики, кэш страниц), и Django удалял бы комментарии по
+        # одному с сигналом на каждый. На Comment никто не ссылается, так что
+        # удалять связанное не нужно - хватает DELETE по id, а счетчики и кэш
+        # один раз обновляет comments_changed
+        count = delete_rows(Comment, [pk for pk, _, _ in rows], using)
+        comments_changed(post_ids)
+    return count
+
+
+def moderation_queue():
+    return Comment.objects.filter(approved_comment=False).select_related('post').only(
+        'author', 'text', 'created_date', 'approved_comment', 'post__title', 'post__slug',
+    )
+
+
+# Страница админки (подключена в myblog/urls.py через admin.site.admin_view)
+
+def admin_moderation(request):
+    from django.contrib import admin
+    if not request.user.has_perm('blog.change_comment'):
+        raise PermissionDenied
+
+    if request.method == 'POST':
+        selected = Comment.objects.filter(pk__in=request.POST.getlist('comment'))
+        if 'approve' in request.POST:
+            messages.success(request, f'Одобрено комментариев: {approve_comments(selected)}')
+        elif 'reject' in request.POST and request.user.has_perm('blog.delete_comment'):
+            messages.success(request, f'Удалено комментариев: {reject_comments(selected)}')
+        # Обработанные комментарии уходят из очереди: та же позиция показывает следующие
+        return redirect(request.get_full_path())
+
+    paginator = CursorPaginator(moderation_queue(), 100, key=('created_date', 'id'), descending=False)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'admin/blog/moderation.html', {
+        **admin.site.each_context(request),
+        'title': 'Очередь модерации',
+        'page': page,
+        'can_reject': request.user.has_perm('blog.delete_comment'),
+    })
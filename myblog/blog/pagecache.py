@@ -0,0 +1,452 @@
+# blog/pagecache.py
+"""Кэш целых страниц для анонимных читателей.
+
+Ключ страницы включает "поколения" областей, от которых она зависит
+(лента, конкретный пост, категория, автор, общая область). Сигналы при
+изменении данных выставляют новое поколение только нужным областям, и
+старые записи просто перестают находиться, пока не истечет их срок.
+
+Формы с {% csrf_token %} кэшируются с заглушкой вместо токена; при отдаче
+из кэша подставляется токен текущего запроса.
+
+Те же поколения дают ETag и Last-Modified для условных запросов
+(conditional_page): поколение хранит время своего создания.
+
+Поколения лежат в кэше default, поэтому он должен быть общим для всех
+процессов (CACHES в settings.py, проверка blog.W002).
+"""
+import hashlib
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import cache
+from django.core.checks import Tags, Warning, register
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from .models import Post, Comment, Category, Tag, UserProfile
+
+GLOBAL = 'global'
+FEED = 'feed'
+
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b'__blog_csrf_token__'
+
+
+# Кэш, который не виден другим процессам: сброс поколения в одном воркере
+# не дойдет до остальных, и они будут отдавать устаревшие страницы
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f'Кэш default ({backend}) не общий для процессов: кэш страниц и справочники '
+        'категорий и тегов в других воркерах не узнают об изменениях',
+        hint='Задайте DJANGO_CACHE_BACKEND с общим бэкендом (FileBasedCache, Redis, Memcached).',
+        id='blog.W002',
+    )]
+
+
+def is_enabled():
+    return getattr(settings, 'BLOG_PAGE_CACHE', True)
+
+
+def page_timeout():
+    return getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 600)
+
+
+def generation_key(scope):
+    return f'blog:gen:{scope}'
+
+
+def new_generation():
+    return f'{int(time.time())}.{uuid.uuid4().hex}'
+
+
+def generation_time(generation):
+    """Время создания поколения (0 для поколений старого формата)"""
+    stamp, _, _ = generation.partition('.')
+    return int(stamp) if stamp.isdigit() else 0
+
+
+def get_generations(scopes):
+    keys = [generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Делает устаревшими все страницы, зависящие от перечисленных областей"""
+    scopes = {scope for scope in scopes if scope}
+    if scopes:
+        cache.set_many({generation_key(scope): new_generation() for scope in scopes}, None)
+
+
+async def aget_generations(scopes):
+    keys = [generation_key(scope) for scope in scopes]
+    found = await cache.aget_many(keys)
+    missing = {key: new_generation() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def make_page_key(request, generations):
+    digest = hashlib.md5(f"{request.get_full_path()}|{':'.join(generations)}".encode()).hexdigest()
+    return f'blog:page:{digest}'
+
+
+def page_key(request, scopes):
+    return make_page_key(request, get_generations([GLOBAL] + list(scopes)))
+
+
+async def apage_key(request, scopes):
+    return make_page_key(request, await aget_generations([GLOBAL] + list(scopes)))
+
+
+def has_pending_messages(request):
+    if CookieStorage.cookie_name in request.COOKIES:
+        return True
+    session = getattr(request, 'session', None)
+    return bool(session is not None and session.session_key and SessionStorage.session_key in session)
+
+
+def is_cacheable_request(request):
+    return (
+        is_enabled()
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not has_pending_messages(request)
+    )
+
+
+async def ais_cacheable_request(request):
+    if not is_enabled() or request.method not in ('GET', 'HEAD'):
+        return False
+    if (await request.auser()).is_authenticated:
+        return False
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    session = getattr(request, 'session', None)
+    return not (session is not None and session.session_key
+                and await session.ahas_key(SessionStorage.session_key))
+
+
+def should_store(response):
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def freeze(response):
+    content = CSRF_INPUT_RE.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content)
+    return {
+        'status': response.status_code,
+        'content_type': response['Content-Type'],
+        'content': content,
+    }
+
+
+def thaw(request, frozen):
+    content = frozen['content']
+    if CSRF_PLACEHOLDER in content:
+        # get_token отметит, что ответу нужна CSRF-cookie
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=frozen['content_type'], status=frozen['status'])
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def cache_public_page(*scopes):
+    """Кэширует ответ представления для анонимных GET-запросов.
+
+    scopes - шаблоны областей с подстановкой аргументов представления,
+    например 'post:{slug}'. Подходит и для async-представлений.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not await ais_cacheable_request(request):
+                    return await view(request, *args, **kwargs)
+                key = await apage_key(request, [scope.format(**kwargs) for scope in scopes])
+                frozen = await cache.aget(key)
+                if frozen is not None:
+                    return thaw(request, frozen)
+                response = await view(request, *args, **kwargs)
+                if should_store(response):
+                    await cache.aset(key, freeze(response), page_timeout())
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+            key = page_key(request, [scope.format(**kwargs) for scope in scopes])
+            frozen = cache.get(key)
+            if frozen is not None:
+                return thaw(request, frozen)
+            response = view(request, *args, **kwargs)
+            if should_store(response):
+                cache.set(key, freeze(response), page_timeout())
+            return response
+        return wrapper
+    return decorator
+
+
+# Условные запросы
+
+def page_validators(request, scopes, last_modified_func, kwargs):
+    """(ETag, Last-Modified) страницы или (None, None), если проверять нечего.
+
+    last_modified_func - дешевый агрегатный запрос к БД. Его результат
+    меняется только вместе с поколениями областей страницы, поэтому он
+    кэшируется под этими поколениями и повторные запросы обходятся без БД.
+    К нему добавляются времена поколений: они меняются и при удалении постов,
+    правке профиля, переименовании категорий. Результат запоминается в
+    запросе: condition вызывает функции ETag и Last-Modified по отдельности.
+    """
+    if hasattr(request, '_blog_validators'):
+        return request._blog_validators
+    validators = (None, None)
+    # Одноразовые сообщения выводятся один раз: такую страницу не подтверждаем
+    if not has_pending_messages(request):
+        scopes = [GLOBAL] + [scope.format(**kwargs) for scope in scopes]
+        generations = get_generations(scopes)
+        key = 'blog:modified:' + hashlib.md5(f"{'|'.join(scopes)}|{':'.join(generations)}".encode()).hexdigest()
+        modified = cache.get(key)
+        if modified is None:
+            modified = last_modified_func(**kwargs)
+            # 0 - ресурса нет, тоже запоминаем
+            modified = int(modified.timestamp()) if modified else 0
+            cache.set(key, modified, page_timeout())
+        if modified:
+            stamp = max([modified] + [generation_time(g) for g in generations])
+            # Страница зависит от пользователя: меню, кнопки автора, CSRF-токен
+            user = request.user.pk if request.user.is_authenticated else 0
+            etag = hashlib.md5(f"{request.get_full_path()}|{user}|{':'.join(generations)}|{stamp}".encode()).hexdigest()
+            validators = (f'"{etag}"', datetime.fromtimestamp(stamp, dt_timezone.utc))
+    request._blog_validators = validators
+    return validators
+
+
+def conditional_page(*scopes, last_modified):
+    """Отвечает 304 на повторный запрос неизменившейся страницы, не вызывая
+    представление. scopes - те же шаблоны областей, что у cache_public_page,
+    last_modified(**kwargs представления) возвращает datetime или None."""
+    def decorator(view):
+        def etag_func(request, *args, **kwargs):
+            return page_validators(request, scopes, last_modified, kwargs)[0]
+
+        def last_modified_func(request, *args, **kwargs):
+            return page_validators(request, scopes, last_modified, kwargs)[1]
+
+        conditional_view = condition(etag_func, last_modified_func)(view)
+        if not iscoroutinefunction(view):
+            return conditional_view
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # condition вызывает функции синхронно: считаем заранее вне цикла событий
+            await sync_to_async(page_validators)(request, scopes, last_modified, kwargs)
+            return await conditional_view(request, *args, **kwargs)
+        return async_wrapper
+    return decorator
+
+
+# Счетчики попаданий кэша фрагментов (выводятся в админке).
+# Отрисовка только копит их в памяти процесса; в кэш они уходят одним
+# incr на фрагмент и исход в конце запроса, а не на каждую карточку
+
+FRAGMENT_NAMES_KEY = 'blog:fragstats:names'
+
+_fragment_lock = threading.Lock()
+_fragment_pending = Counter()
+
+
+def fragment_timeout():
+    return getattr(settings, 'BLOG_FRAGMENT_CACHE_TIMEOUT', 3600)
+
+
+def record_fragment(name, hit):
+    with _fragment_lock:
+        _fragment_pending[name, hit] += 1
+
+
+@receiver(request_finished, dispatch_uid='blog.pagecache.fragment_stats')
+def flush_fragment_stats(**kwargs):
+    global _fragment_pending
+    with _fragment_lock:
+        pending, _fragment_pending = _fragment_pending, Counter()
+    if not pending:
+        return
+    names = cache.get(FRAGMENT_NAMES_KEY, set())
+    flushed = {name for name, _ in pending}
+    if not flushed <= names:
+        cache.set(FRAGMENT_NAMES_KEY, names | flushed, None)
+    for (name, hit), count in pending.items():
+        key = f"blog:fragstats:{name}:{'hit' if hit else 'miss'}"
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+def fragment_stats():
+    """Список (имя фрагмента, попадания, промахи, доля попаданий в %)"""
+    flush_fragment_stats()
+    stats = []
+    for name in sorted(cache.get(FRAGMENT_NAMES_KEY, set())):
+        hits = cache.get(f'blog:fragstats:{name}:hit', 0)
+        misses = cache.get(f'blog:fragstats:{name}:miss', 0)
+        total = hits + misses
+        stats.append((name, hits, misses, round(100 * hits / total) if total else 0))
+    return stats
+
+
+# Инвалидация
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, **kwargs):
+    instance._pagecache_old = None
+    if instance.pk and not raw:
+        instance._pagecache_old = (
+            Post.objects.filter(pk=instance.pk)
+            .values('slug', 'category_id', 'author_id', 'is_published')
+            .first()
+        )
+
+
+def post_scopes(post, old=None):
+    scopes = {f'post:{post.slug}'}
+    category_ids = {post.category_id}
+    author_ids = {post.author_id}
+    published = post.is_published
+    if old:
+        scopes.add(f"post:{old['slug']}")
+        category_ids.add(old['category_id'])
+        author_ids.add(old['author_id'])
+        published = published or old['is_published']
+    category_ids.discard(None)
+    if published:
+        scopes.add(FEED)
+        scopes.update(
+            f'category:{slug}' for slug in
+            Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True)
+        )
+        scopes.update(
+            f'author:{username}' for username in
+            User.objects.filter(pk__in=author_ids).values_list('username', flat=True)
+        )
+    return scopes
+
+
+def posts_scopes(post_ids):
+    """Области страниц сразу для многих постов: один запрос вместо post_scopes на каждый"""
+    scopes = set()
+    rows = Post.objects.filter(pk__in=post_ids).values_list(
+        'slug', 'is_published', 'category__slug', 'author__username',
+    )
+    for slug, published, category_slug, username in rows:
+        scopes.add(f'post:{slug}')
+        if published:
+            scopes.update((FEED, f'author:{username}'))
+            if category_slug:
+                scopes.add(f'category:{category_slug}')
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(*post_scopes(instance, getattr(instance, '_pagecache_old', None)))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    bump(*post_scopes(instance))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_post_tags(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        bump(GLOBAL)
+    else:
+        bump(f'post:{instance.slug}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, created=False, raw=False, **kwargs):
+    # Новый комментарий на модерации страницу не меняет
+    if raw or (created and not instance.approved_comment):
+        return
+    post = Post.objects.filter(pk=instance.post_id).only('slug', 'category', 'author', 'is_published').first()
+    if post is not None:
+        # Число комментариев выводится и в карточках лент
+        bump(*post_scopes(post))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_taxonomy_pages(sender, raw=False, **kwargs):
+    # Категории и теги выводятся почти на всех страницах
+    if not raw:
+        bump(GLOBAL)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._pagecache_old_username = None
+    if instance.pk and not raw and (update_fields is None or 'username' in update_fields):
+        instance._pagecache_old_username = (
+            User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # Вход в систему сохраняет только last_login
+    if created or raw or (update_fields is not None and not set(update_fields) - {'last_login'}):
+        return
+    old_username = getattr(instance, '_pagecache_old_username', None)
+    if old_username and old_username != instance.username:
+        # Имя автора выводится в карточках постов на всех страницах
+        bump(GLOBAL)
+    bump(f'author:{instance.username}')
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_page(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump(f'author:{instance.user.username}')
@@ -0,0 +1,181 @@
+# blog/pagination.py
+"""Пагинация по ключу (keyset) вместо OFFSET.
+
+Страница выбирается условием WHERE (дата, id) < (последняя дата, последний id),
+поэтому сотая страница стоит столько же, сколько первая, и не нужен COUNT(*).
+Курсоры непрозрачные: клиент получает base64-строку и передает ее в ?cursor=.
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+APPROXIMATE_COUNT_TIMEOUT = 300
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder округляет до миллисекунд, курсору нужна точная дата
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return ''
+        return self.paginator.encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return ''
+        return self.paginator.encode_cursor(PREVIOUS, self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return self.paginator.encode_cursor(LAST)
+
+    @property
+    def approximate_count(self):
+        return self.paginator.approximate_count
+
+
+class CursorPaginator:
+    """Пагинатор по упорядоченной паре полей key, по умолчанию (published_date, id).
+
+    Поля ключа не должны содержать NULL; последнее поле должно быть уникальным.
+    """
+
+    def __init__(self, queryset, per_page, key=('published_date', 'id'), descending=True):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.key = tuple(key)
+        self.descending = descending
+
+    def _order(self, reverse=False):
+        descending = self.descending != reverse
+        return [f'-{field}' if descending else field for field in self.key]
+
+    def _after(self, values, reverse=False):
+        """Условие "строго после values" в порядке выдачи (или до него при reverse)"""
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q()
+        for position, field in enumerate(self.key):
+            equal = {name: value for name, value in zip(self.key[:position], values)}
+            condition |= Q(**equal, **{f'{field}__{lookup}': values[position]})
+        return condition
+
+    def encode_cursor(self, direction, obj=None):
+        values = [] if obj is None else [getattr(obj, field) for field in self.key]
+        payload = json.dumps([direction] + values, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, *raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if direction == LAST and not raw:
+            return direction, None
+        if direction not in (NEXT, PREVIOUS) or len(raw) != len(self.key):
+            raise InvalidCursor(cursor)
+        opts = self.queryset.model._meta
+        try:
+            values = [opts.get_field(field).to_python(value) for field, value in zip(self.key, raw)]
+        except Exception:
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _page_query(self, cursor):
+        """Направление, значения курсора и запрос строк страницы (на одну больше)"""
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = NEXT, None
+        # Назад и последняя страница: читаем в обратном порядке и разворачиваем
+        reverse = direction != NEXT
+        queryset = self.queryset.order_by(*self._order(reverse=reverse))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse=reverse))
+        return direction, values, queryset[:self.per_page + 1]
+
+    def _make_page(self, direction, values, rows):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            return CursorPage(self, rows, more, values is not None)
+        return CursorPage(self, rows[::-1], direction == PREVIOUS, more)
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору; неверный курсор дает первую страницу"""
+        direction, values, queryset = self._page_query(cursor)
+        return self._make_page(direction, values, list(queryset))
+
+    async def aget_page(self, cursor=None):
+        """Асинхронный get_page. Заодно считает approximate_count, чтобы
+        шаблон не обращался к БД при отрисовке."""
+        direction, values, queryset = self._page_query(cursor)
+        rows = [obj async for obj in queryset]
+        await self.aapproximate_count()
+        return self._make_page(direction, values, rows)
+
+    def _count_key(self):
+        sql = str(self.queryset.query)
+        return 'blog:count:' + hashlib.md5(sql.encode()).hexdigest()
+
+    @cached_property
+    def approximate_count(self):
+        """Общее число объектов, закэшированное на несколько минут"""
+        key = self._count_key()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, APPROXIMATE_COUNT_TIMEOUT)
+        return count
+
+    async def aapproximate_count(self):
+        if 'approximate_count' not in self.__dict__:
+            key = self._count_key()
+            count = await cache.aget(key)
+            if count is None:
+                count = await self.queryset.acount()
+                await cache.aset(key, count, APPROXIMATE_COUNT_TIMEOUT)
+            self.__dict__['approximate_count'] = count
+        return self.approximate_count
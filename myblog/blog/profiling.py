@@ -0,0 +1,258 @@
+# blog/profiling.py
+"""Профилирование отдельных запросов по требованию сотрудника.
+
+Запрос с ?_profile=cprofile (или заголовком X-Profile: cprofile) от
+пользователя с is_staff выполняется под cProfile, результат сохраняется
+в .prof (python -m pstats, snakeviz). Режим sample - выборочный профилировщик:
+отдельный поток раз в BLOG_PROFILE_INTERVAL секунд снимает стек потока
+запроса; результат - свернутые стеки (.collapsed) для flamegraph.pl и
+speedscope. Накладные расходы выборки почти не искажают время запроса.
+
+Профили лежат в BLOG_PROFILE_DIR, хранятся последние BLOG_PROFILE_KEEP,
+список - в админке по адресу /admin/profiles/.
+"""
+import cProfile
+import io
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+MODES = {'cprofile': '.prof', 'sample': '.collapsed'}
+PARAMETER = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+
+NAME_RE = re.compile(r'^[\w.-]+$')
+UNSAFE_RE = re.compile(r'[^\w.-]')
+
+
+def profile_dir():
+    return Path(getattr(settings, 'BLOG_PROFILE_DIR', Path(settings.BASE_DIR) / 'var' / 'profiles'))
+
+
+def requested_mode(request):
+    """Режим из параметра или заголовка; права проверяет middleware"""
+    mode = request.GET.get(PARAMETER) or request.META.get(HEADER)
+    return mode if mode in MODES else None
+
+
+# Выборочный профилировщик
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    # Короткий путь: внутри site-packages или проекта
+    for prefix in ('site-packages/', f'{settings.BASE_DIR}/'):
+        if prefix in filename:
+            filename = filename.split(prefix, 1)[1]
+            break
+    # ";" разделяет кадры в свернутом формате
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class Sampler:
+    """Снимает стек одного потока с заданным интервалом"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='blog-profile-sampler', daemon=True)
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    def __init__(self, mode):
+        self.mode = mode
+        self.profile = None
+        self.sampler = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.sampler = Sampler(threading.get_ident(), getattr(settings, 'BLOG_PROFILE_INTERVAL', 0.001))
+            self.sampler.start()
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self.sampler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    def save(self, request, response, user):
+        """Сохраняет профиль и описание к нему; возвращает имя профиля"""
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unresolved'
+        created = timezone.now()
+        # Имя начинается со времени: по нему же упорядочено кольцо профилей
+        name = f"{created:%Y%m%d-%H%M%S-%f}-{UNSAFE_RE.sub('_', view)}-{uuid.uuid4().hex[:6]}"
+        data_file = directory / f'{name}{MODES[self.mode]}'
+        if self.profile is not None:
+            self.profile.dump_stats(data_file)
+        else:
+            data_file.write_text(self.sampler.collapsed(), encoding='utf-8')
+        meta = {
+            'name': name,
+            'file': data_file.name,
+            'mode': self.mode,
+            'view': view,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(self.duration * 1000, 1),
+            'user': user.get_username(),
+            'created': created.isoformat(),
+        }
+        (directory / f'{name}.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+        prune(directory)
+        return name
+
+
+def prune(directory):
+    """Оставляет последние BLOG_PROFILE_KEEP профилей"""
+    keep = getattr(settings, 'BLOG_PROFILE_KEEP', 50)
+    metas = sorted(directory.glob('*.json'))
+    for meta in metas[:max(0, len(metas) - keep)]:
+        for path in directory.glob(f'{meta.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Описания сохраненных профилей, новые первыми"""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for meta in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            profiles.append(json.loads(meta.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """Стоит после AuthenticationMiddleware: профилировать можно только сотрудникам.
+
+    Для асинхронных запросов в профиль попадает и работа цикла событий над
+    параллельными запросами этого процесса.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            mode = requested_mode(request)
+            user = await request.auser() if mode else None
+            if mode is None or not user.is_staff:
+                return await get_response(request)
+            profiler = RequestProfiler(mode)
+            profiler.start()
+            try:
+                response = await get_response(request)
+            finally:
+                profiler.stop()
+            response['X-Profile-Id'] = profiler.save(request, response, user)
+            return response
+    else:
+        def middleware(request):
+            mode = requested_mode(request)
+            if mode is None or not request.user.is_staff:
+                return get_response(request)
+            profiler = RequestProfiler(mode)
+            profiler.start()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.stop()
+            response['X-Profile-Id'] = profiler.save(request, response, request.user)
+            return response
+    return middleware
+
+
+# Страницы админки (подключены в myblog/urls.py через admin.site.admin_view)
+
+def profile_path(name, suffix):
+    if not NAME_RE.match(name):
+        raise Http404
+    path = profile_dir() / f'{name}{suffix}'
+    if not path.is_file():
+        raise Http404
+    return path
+
+
+def admin_profiles(request):
+    from django.contrib import admin
+    return render(request, 'admin/blog/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': list_profiles(),
+        'directory': profile_dir(),
+        'keep': getattr(settings, 'BLOG_PROFILE_KEEP', 50),
+    })
+
+
+def admin_profile_detail(request, name):
+    from django.contrib import admin
+    meta = json.loads(profile_path(name, '.json').read_text(encoding='utf-8'))
+    data_file = profile_path(name, MODES[meta['mode']])
+    if meta['mode'] == 'cprofile':
+        output = io.StringIO()
+        stats = pstats.Stats(str(data_file), stream=output)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(40)
+        summary = output.getvalue()
+    else:
+        # Самые частые функции на вершине стека
+        leaves = Counter()
+        for line in data_file.read_text(encoding='utf-8').splitlines():
+            stack, _, count = line.rpartition(' ')
+            leaves[stack.rsplit(';', 1)[-1]] += int(count)
+        total = sum(leaves.values()) or 1
+        summary = '\n'.join(f'{count * 100 / total:5.1f}%  {count:6}  {leaf}' for leaf, count in leaves.most_common(40))
+    return render(request, 'admin/blog/profile_detail.html', {
+        **admin.site.each_context(request),
+        'title': f"Профиль {meta['view']}",
+        'profile': meta,
+        'summary': summary,
+    })
+
+
+def admin_profile_download(request, name):
+    meta = json.loads(profile_path(name, '.json').read_text(encoding='utf-8'))
+    return FileResponse(profile_path(name, MODES[meta['mode']]).open('rb'), as_attachment=True)
@@ -0,0 +1,115 @@
+# blog/routers.py
+"""Чтение с реплик, запись в основную БД.
+
+PrimaryReplicaRouter отправляет запросы на чтение на случайную реплику
+из BLOG_DB_REPLICAS (по умолчанию - все псевдонимы DATABASES, кроме
+default), а запись и миграции - в default. Без реплик все идет в default.
+
+Реплика может отставать, поэтому после записи чтения "прилипают" к
+основной БД:
+- в той же единице работы (unit_of_work) - до ее конца: это запрос
+  (middleware), задача воркера (jobs.execute); длинная команда может
+  оборачивать в unit_of_work каждый независимый шаг, иначе после первой
+  записи она до конца читает из default;
+- у того же посетителя - на BLOG_DB_PIN_SECONDS секунд: middleware ставит
+  cookie, пока она жива, все его запросы читают из default.
+
+Локально реплику можно изобразить вторым файлом SQLite
+(BLOG_DB_REPLICAS=/tmp/replica.sqlite3, см. settings.py), который
+обновляет команда sync_replicas, или двумя контейнерами Postgres с
+потоковой репликацией, описанными в DATABASES вручную.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'blog_primary'
+
+# Читать из основной БД: посетитель недавно писал (cookie) или запись уже была в этом контексте
+_pinned = ContextVar('blog_db_pinned', default=False)
+_written = ContextVar('blog_db_written', default=False)
+
+
+def replica_aliases():
+    aliases = getattr(settings, 'BLOG_DB_REPLICAS', None)
+    if aliases is None:
+        aliases = [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+    return list(aliases)
+
+
+def pin_seconds():
+    return getattr(settings, 'BLOG_DB_PIN_SECONDS', 5)
+
+
+def use_primary():
+    return _pinned.get() or _written.get()
+
+
+def written():
+    """Была ли запись в текущей единице работы"""
+    return _written.get()
+
+
+@contextmanager
+def unit_of_work(pinned=False):
+    """Отдельный учет записи для блока: внутри чтения идут на реплики, пока
+    не было записи (или pinned), на выходе восстанавливается внешнее состояние"""
+    pinned_token, written_token = _pinned.set(pinned), _written.set(False)
+    try:
+        yield
+    finally:
+        _pinned.reset(pinned_token)
+        _written.reset(written_token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _written.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики получают репликацией
+        if db in replica_aliases():
+            return False
+        return None
+
+
+@sync_and_async_middleware
+def read_your_writes_middleware(get_response):
+    """Закрепляет чтения за основной БД после записи (см. описание модуля).
+
+    Стоит первым после SecurityMiddleware, чтобы запись сессии при ответе
+    тоже учитывалась.
+    """
+    def finish(response):
+        if written():
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with unit_of_work(PIN_COOKIE in request.COOKIES):
+                return finish(await get_response(request))
+    else:
+        def middleware(request):
+            with unit_of_work(PIN_COOKIE in request.COOKIES):
+                return finish(get_response(request))
+    return middleware
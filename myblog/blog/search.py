@@ -0,0 +1,456 @@
+# blog/search.py
+"""Полнотекстовый поиск по постам.
+
+Индекс хранится в отдельной таблице той же базы: в SQLite это виртуальная
+таблица FTS5, в PostgreSQL - таблица с колонкой tsvector и GIN-индексом.
+Для остальных СУБД есть простой бэкенд на icontains. Бэкенд можно заменить
+через настройку BLOG_SEARCH_BACKEND (путь к классу).
+
+Сигналы не обновляют индекс сами, а ставят задачу search.reindex_posts
+в очередь blog.jobs после фиксации транзакции.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .jobs import task
+from .models import Post, Category, Tag
+
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Разбивает пользовательский запрос на слова без операторов FTS"""
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+def highlight(snippet):
+    """Экранирует фрагмент текста и заменяет маркеры на <mark>"""
+    if not snippet:
+        return ''
+    html = escape(snippet)
+    html = html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+def document_for(post):
+    """Поля поискового документа поста"""
+    return {
+        'title': post.title or '',
+        'content': post.content or '',
+        'tags': ' '.join(tag.name for tag in post.tags.all()),
+        'category': post.category.name if post.category else '',
+        'author': post.author.username,
+    }
+
+
+class BaseSearchBackend:
+    """Общий интерфейс поисковых бэкендов"""
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def install(self, schema_editor):
+        """Создает структуры индекса (вызывается из миграции)"""
+
+    def uninstall(self, schema_editor):
+        """Удаляет структуры индекса"""
+
+    def index_posts(self, posts):
+        raise NotImplementedError
+
+    def remove_posts(self, post_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def search(self, query, offset, limit):
+        """Возвращает список пар (id поста, фрагмент с подсветкой) по убыванию релевантности"""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    table = 'blog_post_fts'
+    # Веса колонок для bm25: title, content, tags, category, author
+    weights = (10.0, 1.0, 4.0, 3.0, 3.0)
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "title, content, tags, category, author, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def match_expression(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Каждое слово ищем как префикс, все слова обязательны
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def index_posts(self, posts):
+        rows = [
+            (post.pk, doc['title'], doc['content'], doc['tags'], doc['category'], doc['author'])
+            for post, doc in ((post, document_for(post)) for post in posts)
+        ]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, content, tags, category, author) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_posts(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in post_ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def count(self, query):
+        match = self.match_expression(query)
+        if match is None:
+            return 0
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table} WHERE {self.table} MATCH %s', [match])
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({self.table}, -1, %s, %s, %s, 24) '
+                f'FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}) LIMIT %s OFFSET %s',
+                [HIGHLIGHT_START, HIGHLIGHT_END, '…', match, limit, offset],
+            )
+            return cursor.fetchall()
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    table = 'blog_post_search'
+
+    @property
+    def config(self):
+        return getattr(settings, 'BLOG_SEARCH_CONFIG', 'simple')
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            f'post_id bigint PRIMARY KEY REFERENCES {Post._meta.db_table} (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {self.table}_document_gin ON {self.table} USING GIN (document)'
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def tsquery(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def index_posts(self, posts):
+        rows = []
+        for post in posts:
+            doc = document_for(post)
+            rows.append((post.pk, doc['title'], doc['tags'], doc['category'], doc['author'], doc['content']))
+        if not rows:
+            return
+        config = self.config
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (post_id, document) VALUES (%s, '
+                f"setweight(to_tsvector('{config}', %s), 'A') || "
+                f"setweight(to_tsvector('{config}', %s), 'B') || "
+                f"setweight(to_tsvector('{config}', %s || ' ' || %s), 'C') || "
+                f"setweight(to_tsvector('{config}', %s), 'D')) "
+                'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove_posts(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE post_id = ANY(%s)', [post_ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+    def count(self, query):
+        tsquery = self.tsquery(query)
+        if tsquery is None:
+            return 0
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE document @@ to_tsquery('{self.config}', %s)",
+                [tsquery],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        tsquery = self.tsquery(query)
+        if tsquery is None:
+            return []
+        config = self.config
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT s.post_id, ts_headline('{config}', p.content, q, %s) "
+                f"FROM {self.table} s JOIN {Post._meta.db_table} p ON p.id = s.post_id, "
+                f"to_tsquery('{config}', %s) q "
+                'WHERE s.document @@ q ORDER BY ts_rank_cd(s.document, q) DESC, s.post_id DESC '
+                'LIMIT %s OFFSET %s',
+                [f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=35, MinWords=15',
+                 tsquery, limit, offset],
+            )
+            return cursor.fetchall()
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Запасной бэкенд без индекса для прочих СУБД"""
+
+    def queryset(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return Post.objects.none()
+        condition = Q()
+        for token in tokens:
+            condition &= (
+                Q(title__icontains=token) |
+                Q(content__icontains=token) |
+                Q(author__username__icontains=token) |
+                Q(category__name__icontains=token) |
+                Q(tags__name__icontains=token)
+            )
+        return Post.objects.using(self.using).filter(condition, is_published=True).distinct()
+
+    def index_posts(self, posts):
+        pass
+
+    def remove_posts(self, post_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def count(self, query):
+        return self.queryset(query).count()
+
+    def search(self, query, offset, limit):
+        ids = self.queryset(query).order_by('-published_date').values_list('pk', flat=True)
+        return [(pk, '') for pk in ids[offset:offset + limit]]
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_backends = {}
+
+
+def get_backend(using='default'):
+    """Возвращает бэкенд поиска для указанной базы"""
+    if using not in _backends:
+        path = getattr(settings, 'BLOG_SEARCH_BACKEND', None)
+        if path:
+            backend_class = import_string(path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connections[using].vendor, SimpleSearchBackend)
+        _backends[using] = backend_class(using=using)
+    return _backends[using]
+
+
+class SearchResults:
+    """Ленивая выборка результатов поиска для django.core.paginator.Paginator.
+
+    count() и срез выполняют по одному запросу к индексу, после чего посты
+    для текущей страницы загружаются одним запросом и сохраняют порядок
+    релевантности. Фрагмент с подсветкой доступен как post.search_snippet.
+    """
+
+    def __init__(self, query, using='default'):
+        self.query = query
+        self.backend = get_backend(using)
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        offset = item.start or 0
+        limit = (item.stop - offset) if item.stop is not None else self.count() - offset
+        if limit <= 0:
+            return []
+        hits = self.backend.search(self.query, offset, limit)
+        posts = Post.objects.select_related('author', 'category').in_bulk([pk for pk, _ in hits])
+        results = []
+        for pk, snippet in hits:
+            post = posts.get(pk)
+            if post is None or not post.is_published:
+                continue
+            post.search_snippet = highlight(snippet)
+            results.append(post)
+        return results
+
+
+def searchable_posts():
+    return Post.objects.filter(is_published=True).select_related('author', 'category').prefetch_related('tags')
+
+
+def reindex_posts(queryset, using='default'):
+    """Обновляет индекс для постов из queryset (неопубликованные удаляются)"""
+    backend = get_backend(using)
+    published = list(searchable_posts().filter(pk__in=queryset.values('pk')))
+    published_ids = {post.pk for post in published}
+    stale = [pk for pk in queryset.values_list('pk', flat=True) if pk not in published_ids]
+    backend.remove_posts(stale)
+    backend.index_posts(published)
+
+
+def rebuild_index(batch_size=500, using='default'):
+    """Полностью перестраивает индекс. Возвращает число проиндексированных постов"""
+    backend = get_backend(using)
+    backend.clear()
+    total = 0
+    last_pk = 0
+    while True:
+        batch = list(searchable_posts().filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            break
+        backend.index_posts(batch)
+        total += len(batch)
+        last_pk = batch[-1].pk
+    return total
+
+
+# Инкрементальное обновление индекса
+
+@task('search.reindex_posts', timeout=300)
+def reindex_posts_job(post_ids):
+    reindex_posts(Post.objects.filter(pk__in=post_ids))
+
+
+def schedule_reindex(post_ids):
+    """Ставит переиндексацию постов в очередь после фиксации транзакции.
+
+    Сохранение поста не ждет обновления индекса, а откаченные изменения
+    в очередь не попадают.
+    """
+    post_ids = sorted(set(post_ids))
+    if post_ids:
+        transaction.on_commit(lambda: reindex_posts_job.enqueue(post_ids), using=router.db_for_write(Post))
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def remove_deleted_post(sender, instance, **kwargs):
+    # Удаление - одна строка индекса, к тому же после него задаче уже нечего читать
+    get_backend().remove_posts([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После очистки со стороны тега затронутые посты уже не найти
+        instance._search_post_ids = list(instance.post_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        schedule_reindex([instance.pk])
+    elif action == 'post_clear':
+        schedule_reindex(getattr(instance, '_search_post_ids', []))
+    else:
+        schedule_reindex(pk_set)
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Tag)
+def remember_related_posts(sender, instance, **kwargs):
+    instance._search_post_ids = list(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def index_category_posts(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        schedule_reindex(Post.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def index_tag_posts(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        schedule_reindex(Post.objects.filter(tags=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def index_posts_of_deleted_taxonomy(sender, instance, **kwargs):
+    post_ids = getattr(instance, '_search_post_ids', None)
+    if post_ids:
+        schedule_reindex(post_ids)
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    # Через __dict__: у отложенного поля (only()) обращение вызвало бы запрос
+    instance._search_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def index_author_posts(sender, instance, created, raw=False, **kwargs):
+    # В индексе есть только имя автора: вход, смена пароля или профиля его не трогают
+    previous = instance._search_username
+    instance._search_username = instance.username
+    if created or raw or previous is None or previous == instance.username:
+        return
+    schedule_reindex(Post.objects.filter(author=instance).values_list('pk', flat=True))
@@ -0,0 +1,146 @@
+# blog/slugs.py
+"""Генерация уникальных slug для Post, Category и Tag.
+
+Свободный суффикс ищется одним запросом: сам base и диапазон slug с
+префиксом "base-" (его обслуживает уникальный индекс; "post" не читает
+"postgres-..."),
+а гонку между параллельными сохранениями решает уникальный индекс:
+при IntegrityError slug выбирается заново.
+"""
+import re
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.template.defaultfilters import slugify
+
+CYRILLIC = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g', 'ў': 'u',
+}
+TRANSLATION = str.maketrans(CYRILLIC)
+
+# Запас под суффикс "-N" внутри max_length поля slug
+SUFFIX_RESERVE = 8
+
+
+def taken_slugs(queryset, base):
+    """Занятые slug вида base и base-..., одним запросом по уникальному индексу"""
+    # startswith в SQLite - регистронезависимый LIKE, который не использует индекс
+    return set(
+        queryset.filter(Q(slug=base) | Q(slug__gte=base + '-', slug__lt=base + '-\uffff'))
+        .values_list('slug', flat=True)
+    )
+
+
+def transliterate(text):
+    """Переводит кириллицу в латиницу, остальные символы не трогает"""
+    return (text or '').lower().translate(TRANSLATION)
+
+
+def base_slug(text, fallback, max_length=50):
+    """Основа slug: транслитерация + slugify, обрезанная с запасом под суффикс"""
+    slug = slugify(transliterate(text))[:max_length - SUFFIX_RESERVE].strip('-')
+    return slug or fallback
+
+
+def allocate_slug(queryset, base):
+    """Возвращает base или base-N с наименьшим свободным N за один запрос.
+
+    Число в конце заголовка ("Привет мир 2024" -> privet-mir-2024) не
+    считается счетчиком: "Привет мир" после него получит privet-mir.
+    """
+    taken = taken_slugs(queryset, base)
+    if base not in taken:
+        return base
+    suffix_re = re.compile(rf'^{re.escape(base)}-([0-9]+)$')
+    suffixes = {int(match[1]) for match in map(suffix_re.match, taken) if match}
+    counter = 1
+    while counter in suffixes:
+        counter += 1
+    return f'{base}-{counter}'
+
+
+class UniqueSlugMixin:
+    """Заполняет пустой slug при сохранении модели.
+
+    slug_source_field - поле, из которого строится slug,
+    slug_fallback - основа для текстов без латиницы и кириллицы.
+    """
+
+    slug_source_field = 'title'
+    slug_fallback = 'item'
+    slug_max_attempts = 5
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        model = type(self)
+        using = kwargs.get('using') or router.db_for_write(model, instance=self)
+        queryset = model._default_manager.using(using)
+        max_length = model._meta.get_field('slug').max_length
+        base = base_slug(getattr(self, self.slug_source_field), self.slug_fallback, max_length)
+
+        for attempt in range(self.slug_max_attempts):
+            self.slug = allocate_slug(queryset, base)
+            try:
+                with transaction.atomic(using=using):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Slug успели занять между выбором и вставкой - пробуем следующий
+                taken = queryset.filter(slug=self.slug).exists()
+                self.slug = ''
+                if not taken or attempt == self.slug_max_attempts - 1:
+                    raise
+
+
+class SlugPool:
+    """Выделение уникальных slug для пачки объектов в массовых операциях.
+
+    Занятые slug читаются из queryset лениво: один запрос на каждую новую
+    основу (taken_slugs) или один на общий префикс через load, выделенные
+    в пачке запоминаются. Пул живет одну пачку: в памяти только slug с
+    основами этой пачки, а не вся таблица.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.taken = set()
+        self.bases = set()
+        self.prefixes = set()  # префиксы, занятые slug которых уже прочитаны
+
+    def covered(self, slug):
+        return slug in self.bases or any(slug.startswith(prefix) for prefix in self.prefixes)
+
+    def load(self, prefix):
+        """Читает все занятые slug, начинающиеся с prefix"""
+        if not any(prefix.startswith(loaded) for loaded in self.prefixes):
+            self.taken.update(
+                self.queryset.filter(slug__gte=prefix, slug__lt=prefix + '\uffff')
+                .values_list('slug', flat=True)
+            )
+            self.prefixes.add(prefix)
+
+    def __contains__(self, slug):
+        if not self.covered(slug):
+            self.taken |= taken_slugs(self.queryset, slug)
+            self.bases.add(slug)
+            self.prefixes.add(slug + '-')
+        return slug in self.taken
+
+    def reserve(self, slug):
+        self.taken.add(slug)
+
+    def allocate(self, base):
+        """base или base-N с наименьшим свободным N, как allocate_slug"""
+        counter = 0
+        slug = base
+        while slug in self:
+            counter += 1
+            slug = f'{base}-{counter}'
+        self.taken.add(slug)
+        return slug
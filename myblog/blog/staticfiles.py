@@ -0,0 +1,232 @@
+# blog/staticfiles.py
+"""Статика без обратного прокси: хэшированные имена, сжатие заранее, отдача из приложения.
+
+CompressedManifestStaticFilesStorage при collectstatic добавляет к именам
+хэш содержимого (bootstrap.min.css -> bootstrap.min.3f9c....css) и рядом
+кладет сжатые копии .gz и .br (brotli - если установлен пакет brotli).
+
+static_files_middleware отдает файлы из STATIC_ROOT сам. Список файлов
+и manifest читаются с диска один раз и кэшируются до следующего
+collectstatic: запрос делает один stat() manifest, а не каждого файла.
+Клиент получает сжатую копию по Accept-Encoding. Файлы с хэшем в имени
+кэшируются навсегда (immutable), остальные - ненадолго.
+
+Сторонние библиотеки (Bootstrap) лежат в static/vendor; их скачивает и
+сверяет с контрольной суммой команда vendor_static.
+"""
+import base64
+import gzip
+import hashlib
+import mimetypes
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.checks import Tags, Warning, register
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError:  # сжатие brotli необязательно
+    brotli = None
+
+# Сторонние файлы: путь в static/, адрес, SRI-хэш из документации библиотеки
+VENDOR_ASSETS = [
+    (
+        'vendor/bootstrap/5.1.3/bootstrap.min.css',
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+        'sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3',
+    ),
+    (
+        'vendor/bootstrap/5.1.3/bootstrap.bundle.min.js',
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+        'sha384-ka7Sk0Gln4gmtz2MlQnikT1wXgYsOg+OMhuP+IlRH9sENBO0LRn5q+8nbTov4+1p',
+    ),
+]
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico', '.eot', '.ttf', '.otf')
+MIN_COMPRESS_SIZE = 256
+
+# Кодировка в Accept-Encoding -> расширение сжатой копии
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файл не собран collectstatic (разработка, тесты): имя без хэша,
+            # его отдает runserver из STATICFILES_DIRS
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+        # По mtime manifest процессы замечают новую сборку - сдвигаем его
+        # после сжатых копий, иначе индекс мог бы запомниться без них
+        if self.exists(self.manifest_name):
+            os.utime(self.path(self.manifest_name))
+
+    def compress(self, name):
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content)
+        for suffix, compressed in variants.items():
+            # Сжатие, которое почти ничего не дает, не хранить
+            if len(compressed) < len(content) * 0.95:
+                self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def vendor_path(name):
+    return Path(settings.STATICFILES_DIRS[0]) / name
+
+
+def sri_hash(content):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+
+
+@register(Tags.staticfiles)
+def check_vendor_assets(app_configs, **kwargs):
+    missing = [name for name, _, _ in VENDOR_ASSETS if not vendor_path(name).is_file()]
+    if not missing:
+        return []
+    return [Warning(
+        f"Нет файлов сторонних библиотек: {', '.join(missing)}",
+        hint='Выполните manage.py vendor_static и добавьте файлы в репозиторий.',
+        id='blog.W001',
+    )]
+
+
+# Отдача статики
+
+def manifest_version():
+    """mtime manifest в STATIC_ROOT: меняется при каждом collectstatic"""
+    root = getattr(settings, 'STATIC_ROOT', None)
+    if not root:
+        return None
+    try:
+        return os.stat(os.path.join(root, CompressedManifestStaticFilesStorage.manifest_name)).st_mtime_ns
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def static_index(version=None):
+    """{путь после STATIC_URL: {кодировка или '': (файл, размер, mtime)}} по STATIC_ROOT.
+
+    version - manifest_version(): с новой сборкой меняется ключ кэша.
+    """
+    root = getattr(settings, 'STATIC_ROOT', None)
+    index = {}
+    if not root or not os.path.isdir(root):
+        return index
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            url = os.path.relpath(path, root).replace(os.sep, '/')
+            encoding = ''
+            for name, suffix in ENCODINGS.items():
+                if url.endswith(suffix):
+                    url, encoding = url[:-len(suffix)], name
+                    break
+            stat = os.stat(path)
+            index.setdefault(url, {})[encoding] = (path, stat.st_size, int(stat.st_mtime))
+    # Копии без исходного файла не отдаем
+    return {url: variants for url, variants in index.items() if '' in variants}
+
+
+@lru_cache(maxsize=1)
+def immutable_names(version=None):
+    """Имена с хэшем из manifest: их содержимое не меняется никогда"""
+    storage = CompressedManifestStaticFilesStorage()
+    return frozenset(storage.hashed_files.values())
+
+
+def clear_index():
+    """Перечитать STATIC_ROOT и manifest (тесты, смена STATIC_ROOT)"""
+    static_index.cache_clear()
+    immutable_names.cache_clear()
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def serve_static(request, name):
+    version = manifest_version()
+    variants = static_index(version).get(name)
+    if variants is None or request.method not in ('GET', 'HEAD'):
+        return None
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding = next((enc for enc in ENCODINGS if enc in variants and (enc in accepted or '*' in accepted)), '')
+    path, size, mtime = variants[encoding]
+    etag = f'"{size:x}-{mtime:x}{"-" + encoding if encoding else ""}"'
+
+    # Списки ETag, W/ и * в If-None-Match разбирает Django
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(open(path, 'rb'))
+        content_type, _ = mimetypes.guess_type(name)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if name.endswith(('.css', '.js')):
+            response['Content-Type'] += '; charset=utf-8'
+        response['Content-Length'] = size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    if name in immutable_names(version):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=60'
+    if len(variants) > 1:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+@sync_and_async_middleware
+def static_files_middleware(get_response):
+    """Отдает STATIC_ROOT до остальных middleware (сессии, аутентификация не нужны)"""
+    prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+
+    def lookup(request):
+        if getattr(settings, 'BLOG_SERVE_STATIC', True) and request.path.startswith(prefix):
+            return serve_static(request, request.path[len(prefix):])
+        return None
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return lookup(request) or await get_response(request)
+    else:
+        def middleware(request):
+            return lookup(request) or get_response(request)
+    return middleware
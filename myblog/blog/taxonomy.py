@@ -0,0 +1,105 @@
+# blog/taxonomy.py
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category, Tag
+
+DEFAULT_CATEGORIES = ['Программирование', 'Дизайн', 'Маркетинг', 'Путешествия', 'Кулинария']
+DEFAULT_TAGS = ['django', 'python', 'web', 'development', 'design', 'cooking', 'travel']
+
+VERSION_KEY = 'blog:taxonomy:version'
+
+
+def create_default_categories_and_tags(using='default'):
+    """Создает категории и теги по умолчанию если их нет.
+
+    Возвращает пару списков с именами созданных категорий и тегов.
+    """
+    created = ([], [])
+    for model, names, bucket in ((Category, DEFAULT_CATEGORIES, created[0]),
+                                 (Tag, DEFAULT_TAGS, created[1])):
+        existing = set(
+            model.objects.using(using).filter(name__in=names).values_list('name', flat=True)
+        )
+        for name in names:
+            if name in existing:
+                continue
+            model(name=name).save(using=using)
+            bucket.append(name)
+    return created
+
+
+def seed_defaults_after_migrate(sender, using='default', **kwargs):
+    """Обработчик post_migrate: один раз заполняет справочники после миграций"""
+    tables = connections[using].introspection.table_names()
+    if Category._meta.db_table not in tables or Tag._meta.db_table not in tables:
+        return
+    create_default_categories_and_tags(using=using)
+
+
+class TaxonomyRegistry:
+    """Кэш категорий и тегов в памяти процесса.
+
+    Номер версии лежит в кэше default, общем для всех процессов (CACHES в
+    settings.py): любое изменение категории или тега выставляет новую версию,
+    и каждый процесс перечитывает справочники при следующем обращении. Пока
+    версия не меняется, запросов к БД нет.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._categories = ()
+        self._tags = ()
+
+    @property
+    def version(self):
+        return cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+
+    def _ensure_loaded(self):
+        version = self.version
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._categories = tuple(Category.objects.order_by('pk'))
+                self._tags = tuple(Tag.objects.order_by('pk'))
+                self._version = version
+
+    async def asnapshot(self):
+        """(версия, категории, теги) для асинхронных представлений"""
+        version = await cache.aget_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+        if version != self._version:
+            categories = tuple([category async for category in Category.objects.order_by('pk')])
+            tags = tuple([tag async for tag in Tag.objects.order_by('pk')])
+            with self._lock:
+                self._categories, self._tags, self._version = categories, tags, version
+        return version, self._categories, self._tags
+
+    def categories(self):
+        self._ensure_loaded()
+        return self._categories
+
+    def tags(self):
+        self._ensure_loaded()
+        return self._tags
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        self._version = None
+
+
+registry = TaxonomyRegistry()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_taxonomy(sender, **kwargs):
+    registry.invalidate()
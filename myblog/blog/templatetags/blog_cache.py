@@ -0,0 +1,52 @@
+# blog/templatetags/blog_cache.py
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from blog.pagecache import GLOBAL, fragment_timeout, get_generations, record_fragment
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        # Общее поколение меняется при правке категорий, тегов и имен авторов;
+        # читаем его один раз на отрисовку шаблона
+        generation = context.render_context.get(self)
+        if generation is None:
+            generation = context.render_context[self] = get_generations([GLOBAL])[0]
+        vary_on = [generation] + [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.name, vary_on)
+        value = cache.get(key)
+        if value is not None:
+            record_fragment(self.name, hit=True)
+            return value
+        value = self.nodelist.render(context)
+        cache.set(key, value, fragment_timeout())
+        record_fragment(self.name, hit=False)
+        return value
+
+
+@register.tag('cachefragment')
+def do_cachefragment(parser, token):
+    """
+    Кэширует кусок шаблона и считает попадания и промахи.
+
+    Использование::
+
+        {% load blog_cache %}
+        {% cachefragment post_card post.pk post.updated_date %}
+            ...
+        {% endcachefragment %}
+    """
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least 1 argument.")
+    return FragmentCacheNode(nodelist, bits[1], [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,44 @@
+# blog/templatetags/blog_images.py
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from blog.images import variant_name
+
+register = template.Library()
+
+
+def srcset(fieldfile, widths, ext):
+    return ', '.join(
+        f'{fieldfile.storage.url(variant_name(fieldfile.name, width, ext))} {width}w'
+        for width in widths
+    )
+
+
+@register.simple_tag
+def responsive_image(fieldfile, widths, sizes='100vw', **attrs):
+    """
+    <picture> с WebP и JPEG копиями изображения из blog/images.py.
+
+    Использование::
+
+        {% responsive_image post.image post.image_widths sizes="(max-width: 767px) 100vw, 730px" alt=post.title class="card-img-top" %}
+
+    Пока копий нет (widths пуст), выводится обычный <img> с оригиналом.
+    Остальные именованные аргументы становятся атрибутами <img>.
+    """
+    if not fieldfile:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if not widths:
+        return format_html('<img src="{}"{}>', fieldfile.url, flatatt(attrs))
+    widths = sorted(widths)
+    # Для старых браузеров src - самая большая JPEG-копия
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset(fieldfile, widths, 'webp'), sizes,
+        fieldfile.storage.url(variant_name(fieldfile.name, widths[-1], 'jpg')),
+        srcset(fieldfile, widths, 'jpg'), sizes, flatatt(attrs),
+    )
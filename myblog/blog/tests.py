@@ -1,3 +1,1371 @@
-from django.test import TestCase
+import contextvars
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, benchmarks, feeds, pagecache, search, slugs, urls as blog_urls
+from .counters import recount
+from .instrumentation import instrumentation_middleware, read_view_stats, view_stats
+from .jobs import Worker, execute, task
+from .moderation import approve_comments, reject_comments
+from .models import Category, Comment, Job, Post, Tag, UserProfile
+from .pagecache import get_generations
+from .pagination import CursorPaginator
+from .staticfiles import VENDOR_ASSETS, check_vendor_assets, clear_index
+from .taxonomy import TaxonomyRegistry, create_default_categories_and_tags, registry as taxonomy
+from .slugs import base_slug
+from .search import SearchResults, get_backend, tokenize
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, read_your_writes_middleware, unit_of_work
+from .transfer import PostImporter, export_posts, parse_front_matter, read_jsonl, to_datetime
+
+
+class TaxonomyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seeding_is_idempotent(self):
+        # Справочники заполнены после миграций тестовой БД
+        self.assertTrue(Category.objects.filter(name='Дизайн').exists())
+        Category.objects.filter(name='Дизайн').delete()
+        Tag.objects.filter(name='python').delete()
+        self.assertEqual(create_default_categories_and_tags(), (['Дизайн'], ['python']))
+        self.assertEqual(create_default_categories_and_tags(), ([], []))
+
+    def test_invalidation_on_save_and_delete(self):
+        # Второй реестр изображает другой процесс с тем же общим кэшем
+        other = TaxonomyRegistry()
+        names = lambda items: {item.name for item in items}
+        self.assertNotIn('Новая', names(taxonomy.categories()))
+        other.tags()
+        with self.assertNumQueries(0):
+            taxonomy.categories()
+            other.tags()
+
+        category = Category.objects.create(name='Новая')
+        self.assertIn('Новая', names(taxonomy.categories()))
+        self.assertIn('Новая', names(other.categories()))
+        tag = Tag.objects.create(name='новый')
+        self.assertIn('новый', names(other.tags()))
+
+        category.delete()
+        tag.delete()
+        self.assertNotIn('Новая', names(other.categories()))
+        self.assertNotIn('новый', names(taxonomy.tags()))
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class QueryBudgetTests(TestCase):
+    """Ограничение числа SQL-запросов для каждого URL из blog/urls.py.
+
+    Бюджет не зависит от числа постов на странице: если шаблон начнет
+    обращаться к связанным объектам построчно (N+1), тест упадет.
+    """
+
+    # Имя URL -> (аргументы, нужен ли вход, максимум запросов)
+    BUDGETS = {
+        'post_list': ({}, False, 2),
+        'post_detail': ({'slug': 'post-0'}, False, 3),
+        'category_posts': ({'slug': 'cat-0'}, False, 2),
+        'register': ({}, False, 0),
+        'login': ({}, False, 0),
+        'logout': ({}, True, 4),
+        'create_post': ({}, True, 2),
+        'my_posts': ({}, True, 3),
+        'search': ({}, False, 4),
+        'user_search': ({}, False, 1),
+        'profile': ({}, True, 4),
+        'edit_profile': ({}, True, 3),
+        'change_password': ({}, True, 2),
+        'user_profile': ({'username': 'author0'}, False, 2),
+        # Ленты и карта сайта после первого запроса отдаются из кэша
+        'latest_feed': ({'feed_format': 'rss'}, False, 0),
+        'category_feed': ({'slug': 'cat-0', 'feed_format': 'atom'}, False, 0),
+        'author_feed': ({'username': 'author0', 'feed_format': 'rss'}, False, 0),
+        'sitemap_index': ({}, False, 0),
+        'sitemap_page': ({'page': 1}, False, 0),
+    }
+    QUERY_STRINGS = {
+        'search': '?q=post',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'author{i}', password='secret') for i in range(3)]
+        categories = [Category.objects.create(name=f'Cat {i}', slug=f'cat-{i}') for i in range(3)]
+        tags = [Tag.objects.create(name=f'tag{i}', slug=f'tag-{i}') for i in range(4)]
+        for i in range(12):
+            post = Post.objects.create(
+                title=f'Post {i}', slug=f'post-{i}', content='Some post content ' * 20,
+                author=cls.users[i % 3], category=categories[i % 3], is_published=True,
+            )
+            post.tags.set(tags)
+            for j in range(3):
+                Comment.objects.create(post=post, author=f'reader{j}', text='Nice', approved_comment=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertMaxQueries(self, limit, url):
+        # Первый запрос прогревает кэши процесса, меряем установившийся режим
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertLess(response.status_code, 400, url)
+        executed = len(queries)
+        self.assertLessEqual(
+            executed, limit,
+            f'{url}: {executed} запросов при бюджете {limit}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+
+    def test_every_url_has_budget(self):
+        names = {pattern.name for pattern in blog_urls.urlpatterns}
+        self.assertEqual(names - set(self.BUDGETS), set())
+
+    def test_query_budgets(self):
+        for name, (kwargs, needs_login, limit) in self.BUDGETS.items():
+            with self.subTest(url=name):
+                if needs_login:
+                    self.client.force_login(self.users[0])
+                else:
+                    self.client.logout()
+                url = reverse(name, kwargs=kwargs) + self.QUERY_STRINGS.get(name, '')
+                self.assertMaxQueries(limit, url)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='secret')
+        published = timezone.now()
+        # Одинаковые даты проверяют, что id разрешает совпадения ключа
+        for i in range(7):
+            Post.objects.create(
+                title=f'Post {i}', slug=f'post-{i}', content='text', author=author,
+                is_published=True, published_date=published - timedelta(days=i // 2),
+            )
+        cls.expected = list(Post.objects.order_by('-published_date', '-id'))
+
+    def test_walks_forward_and_back(self):
+        paginator = CursorPaginator(Post.objects.all(), 3)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[-2]))
+        self.assertTrue(previous.has_next)
+
+    def test_last_page_and_invalid_cursor(self):
+        paginator = CursorPaginator(Post.objects.all(), 3)
+        last = paginator.get_page(paginator.get_page().last_cursor)
+        self.assertEqual(list(last), self.expected[-3:])
+        self.assertFalse(last.has_next)
+        self.assertEqual(list(paginator.get_page('garbage')), self.expected[:3])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='secret')
+        cls.post = Post.objects.create(title='Cached', slug='cached', content='text',
+                                       author=cls.author, is_published=True)
+        cls.other = Post.objects.create(title='Other', slug='other', content='text',
+                                        author=cls.author, is_published=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        return self.client.get(url)
+
+    def test_anonymous_pages_are_cached(self):
+        url = reverse('post_detail', kwargs={'slug': 'cached'})
+        self.assertNotIn('X-Page-Cache', self.get(url))
+        with self.assertNumQueries(0):
+            response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotContains(response, 'blog_csrf_token')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_approved_comment_purges_only_its_post(self):
+        detail = reverse('post_detail', kwargs={'slug': 'cached'})
+        other = reverse('post_detail', kwargs={'slug': 'other'})
+        self.get(detail)
+        self.get(other)
+        comment = Comment.objects.create(post=self.post, author='reader', text='Hello there')
+        comment.approve()
+        response = self.get(detail)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Hello there')
+        self.assertEqual(self.get(other)['X-Page-Cache'], 'hit')
+
+    def test_logged_in_and_messages_bypass_cache(self):
+        url = reverse('post_list')
+        self.get(url)
+        self.client.cookies['messages'] = 'pending'
+        self.assertNotIn('X-Page-Cache', self.get(url))
+        del self.client.cookies['messages']
+        self.client.force_login(self.author)
+        self.assertNotIn('X-Page-Cache', self.get(url))
+
+    def test_process_local_cache_warning(self):
+        self.assertEqual(pagecache.check_shared_cache(None), [])
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=local):
+            self.assertEqual([w.id for w in pagecache.check_shared_cache(None)], ['blog.W002'])
+            with self.settings(DEBUG=True):
+                self.assertEqual(pagecache.check_shared_cache(None), [])
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('writer', password='secret')
+        self.categories = [Category.objects.create(name=f'Лента {i}', slug=f'feed-{i}') for i in range(2)]
+        self.posts = [
+            Post.objects.create(title=f'Пост {i}', slug=f'feed-post-{i}', content='текст',
+                                author=self.user, category=self.categories[i % 2], is_published=True)
+            for i in range(4)
+        ]
+
+    def test_feeds_render_with_fixed_queries(self):
+        for feed_format in ('rss', 'atom'):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('latest_feed', args=[feed_format]))
+            self.assertEqual(response.content.count(b'feed-post-'), 8)  # link и guid/id
+        response = self.client.get(reverse('category_feed', args=['feed-0', 'rss']))
+        self.assertIn('Пост 2'.encode(), response.content)
+        self.assertNotIn('Пост 1'.encode(), response.content)
+        self.assertEqual(self.client.get(reverse('latest_feed', args=['json'])).status_code, 404)
+
+    def test_conditional_requests_get_304(self):
+        url = reverse('latest_feed', args=['atom'])
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_edit_regenerates_only_affected_partitions(self):
+        urls = [reverse('category_feed', args=[category.slug, 'rss']) for category in self.categories]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        post = self.posts[0]
+        post.title = 'Новый заголовок'
+        post.save()
+        self.assertNotEqual(self.client.get(urls[0])['ETag'], etags[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(urls[1], HTTP_IF_NONE_MATCH=etags[1]).status_code, 304)
+
+    @override_settings(BLOG_SITEMAP_SIZE=2)
+    def test_sitemap_index_pages(self):
+        index = self.client.get(reverse('sitemap_index'))
+        pages = re.findall(rb'<loc>http://testserver/sitemap-(\d+)\.xml</loc>', index.content)
+        self.assertEqual(len(pages), 2)
+        urls = b''.join(self.client.get(reverse('sitemap_page', args=[int(page)])).content for page in pages)
+        for post in self.posts:
+            self.assertIn(f'http://testserver{post.get_absolute_url()}'.encode(), urls)
+        self.assertEqual(self.client.get(reverse('sitemap_page', args=[99])).status_code, 404)
+
+    @override_settings(BLOG_SITEMAP_SIZE=2)
+    def test_sitemap_edit_regenerates_only_its_page(self):
+        edited, other = self.posts[0], self.posts[-1]
+        self.assertNotEqual(feeds.sitemap_page_number(edited.pk), feeds.sitemap_page_number(other.pk))
+        index_url = reverse('sitemap_index')
+        edited_url = reverse('sitemap_page', args=[feeds.sitemap_page_number(edited.pk)])
+        other_url = reverse('sitemap_page', args=[feeds.sitemap_page_number(other.pk)])
+        etags = {url: self.client.get(url)['ETag'] for url in (index_url, edited_url, other_url)}
+        with self.assertNumQueries(0):
+            for url, etag in etags.items():
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304, url)
+
+        edited.title = 'Правка'
+        edited.save()
+        for url in (index_url, edited_url):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200, url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(other_url, HTTP_IF_NONE_MATCH=etags[other_url]).status_code, 304)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('writer', password='secret')
+        self.category = Category.objects.create(name='Условные', slug='cond')
+        self.posts = [
+            Post.objects.create(title=f'Пост {i}', slug=f'cond-{i}', content='текст',
+                                author=self.user, category=self.category, is_published=True)
+            for i in range(2)
+        ]
+
+    def assertNotModified(self, url, response):
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unchanged_pages_return_304_without_queries(self):
+        for url in [self.posts[0].get_absolute_url(), reverse('category_posts', args=['cond']),
+                    reverse('user_profile', args=['writer'])]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    self.assertNotModified(url, response)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304,
+                )
+
+    def test_changes_produce_new_validators(self):
+        post_url = self.posts[0].get_absolute_url()
+        category_url = reverse('category_posts', args=['cond'])
+        post_page, category_page = self.client.get(post_url), self.client.get(category_url)
+
+        Comment.objects.create(post=self.posts[0], author='гость', text='ок', approved_comment=True)
+        self.assertEqual(self.client.get(post_url, HTTP_IF_NONE_MATCH=post_page['ETag']).status_code, 200)
+
+        # Удаление не увеличивает max(updated_date), но меняет поколение категории
+        self.posts[1].delete()
+        response = self.client.get(category_url, HTTP_IF_NONE_MATCH=category_page['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'cond-1')
+
+    def test_validators_depend_on_user(self):
+        url = self.posts[0].get_absolute_url()
+        anonymous = self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertNotModified(url, response)
+
+
+@override_settings(BLOG_DB_REPLICAS=['replica1', 'replica2'])
+class RouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def run_request(self, write, cookies=None):
+        reads = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Post)
+            reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        request = RequestFactory().post('/') if write else RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        response = contextvars.copy_context().run(read_your_writes_middleware(view), request)
+        return reads[0], response
+
+    def test_reads_go_to_replicas_and_writes_to_primary(self):
+        read, response = self.run_request(write=False)
+        self.assertIn(read, ('replica1', 'replica2'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(self.router.allow_migrate('replica1', 'blog'))
+
+    def test_reads_stick_to_primary_after_write(self):
+        read, response = self.run_request(write=True)
+        self.assertEqual(read, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        read, _ = self.run_request(write=False, cookies={PIN_COOKIE: '1'})
+        self.assertEqual(read, 'default')
+
+    def test_unit_of_work_has_its_own_write_pin(self):
+        def run():
+            self.router.db_for_write(Post)
+            with unit_of_work():
+                self.assertIn(self.router.db_for_read(Post), ('replica1', 'replica2'))
+                self.router.db_for_write(Post)
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+            with unit_of_work(pinned=True):
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+
+        contextvars.copy_context().run(run)
+
+    def test_worker_jobs_do_not_inherit_write_pin(self):
+        reads = []
+
+        @task('tests.route')
+        def route(write):
+            if write:
+                self.router.db_for_write(Post)
+            reads.append(self.router.db_for_read(Post))
+
+        # Задачи одного потока пула выполняются в одном контексте
+        context = contextvars.copy_context()
+        context.run(execute, 'tests.route', [True], {})
+        context.run(execute, 'tests.route', [False], {})
+        self.assertEqual(reads[0], 'default')
+        self.assertIn(reads[1], ('replica1', 'replica2'))
+
+
+class SQLiteSettingsTests(TestCase):
+    def test_connection_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('только для SQLite')
+        with connection.cursor() as cursor:
+            values = {}
+            for pragma in ('synchronous', 'temp_store', 'cache_size', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values[pragma] = cursor.fetchone()[0]
+        self.assertEqual(values, {'synchronous': 1, 'temp_store': 2, 'cache_size': -20000, 'busy_timeout': 20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(BLOG_N_PLUS_ONE_THRESHOLD=3, BLOG_INSTRUMENTATION_FLUSH=0)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('writer', password='secret')
+        for i in range(4):
+            Post.objects.create(title=f'Пост {i}', slug=f'instr-{i}', content='текст', author=user, is_published=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_n_plus_one_is_logged_and_counted(self):
+        def listing(request):
+            # Автор без select_related - запрос на каждую строку
+            names = [post.author.username for post in Post.objects.order_by('pk')]
+            return HttpResponse(Template('{{ names|join:", " }}').render(Context({'names': names})))
+
+        with self.assertLogs('blog.instrumentation', 'WARNING') as logs:
+            response = instrumentation_middleware(listing)(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="5 SQL", render;dur=')
+        self.assertIn('повторен 4 раз', logs.output[0])
+        self.assertIn('auth_user', logs.output[0])
+        view_stats.flush()
+        self.assertEqual(read_view_stats()['<unresolved>']['n_plus_one'], 1)
+
+    @override_settings(BLOG_SLOW_REQUEST_MS=0, BLOG_PAGE_CACHE=False)
+    def test_slow_request_logs_top_sql(self):
+        with self.settings(MIDDLEWARE=['blog.instrumentation.instrumentation_middleware', *settings.MIDDLEWARE]):
+            with self.assertLogs('blog.instrumentation', 'WARNING') as logs:
+                response = self.client.get(reverse('post_list'))
+        self.assertTrue(response.has_header('Server-Timing'))
+        self.assertIn('Медленный запрос GET / (post_list)', logs.output[-1])
+        self.assertIn('blog_post', logs.output[-1])
+        self.assertEqual(read_view_stats()['post_list']['requests'], 1)
+
+    def test_query_wrapper_is_scoped_to_the_request(self):
+        timer = benchmarks.QueryTimer()
+
+        def view(request):
+            list(Post.objects.all())
+            return HttpResponse()
+
+        with connection.execute_wrapper(timer):
+            instrumentation_middleware(view)(RequestFactory().get('/'))
+            # Обертка запроса снята, внешняя осталась на месте
+            self.assertEqual(connection.execute_wrappers, [timer])
+        self.assertEqual(connection.execute_wrappers, [])
+        self.assertEqual(len(timer.times), 1)
+
+    @override_settings(BLOG_INSTRUMENTATION_FLUSH=0.05)
+    def test_last_window_is_flushed_without_new_requests(self):
+        view_stats.flush()
+        instrumentation_middleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertEqual(read_view_stats(), {})
+        time.sleep(0.3)
+        self.assertEqual(read_view_stats()['<unresolved>']['requests'], 1)
+
+    def test_view_stats_command_needs_a_shared_cache(self):
+        instrumentation_middleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        output = StringIO()
+        call_command('view_stats', stdout=output)
+        self.assertIn('<unresolved>', output.getvalue())
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaisesMessage(CommandError, 'не общий'):
+                call_command('view_stats')
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        middleware = [m for m in settings.MIDDLEWARE if m != 'blog.profiling.profiling_middleware']
+        override = self.settings(
+            BLOG_PROFILE_DIR=self.directory, BLOG_PROFILE_KEEP=2, BLOG_PAGE_CACHE=False,
+            MIDDLEWARE=[*middleware, 'blog.profiling.profiling_middleware'],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True, is_superuser=True)
+
+    def test_only_staff_can_profile(self):
+        response = self.client.get(reverse('post_list') + '?_profile=cprofile')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profiles_are_saved_in_bounded_ring(self):
+        self.client.force_login(self.staff)
+        names = []
+        for mode in ('cprofile', 'sample', 'cprofile'):
+            response = self.client.get(reverse('post_list'), HTTP_X_PROFILE=mode)
+            names.append(response['X-Profile-Id'])
+        self.assertIn('post_list', names[0])
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(
+            f'{name}{ext}' for name, ext in zip(names[1:], ('.collapsed', '.prof')) for ext in (ext, '.json')
+        ))
+
+        listing = self.client.get(reverse('admin_profiles'))
+        self.assertContains(listing, names[2])
+        self.assertNotContains(listing, names[0])
+        detail = self.client.get(reverse('admin_profile_detail', args=[names[2]]))
+        self.assertContains(detail, 'cumulative')
+        self.assertEqual(self.client.get(reverse('admin_profile_download', args=[names[1]])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin_profile_detail', args=['..'])).status_code, 404)
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'w') as f:
+            f.write('.post { margin: 0; }\n' * 100)
+        override = override_settings(STATICFILES_DIRS=[self.source], STATIC_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        clear_index()
+        self.addCleanup(clear_index)
+
+    def test_hashed_precompressed_file(self):
+        url = Template('{% load static %}{% static "css/site.css" %}').render(Context())
+        self.assertRegex(url, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.root, url[len('/static/'):] + '.gz')))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertNotIn('Set-Cookie', response)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'.post { margin: 0; }\n' * 100)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], HTTP_ACCEPT_ENCODING='gzip').status_code, 304)
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+        # Имя без хэша кэшируется ненадолго
+        self.assertEqual(self.client.get('/static/css/site.css')['Cache-Control'], 'public, max-age=60')
+
+    def test_etag_lists_and_weak_tags(self):
+        url = '/static/css/site.css'
+        etag = self.client.get(url)['ETag']
+        for header in (f'"other", {etag}', f'W/{etag}', '*'):
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_collectstatic_refreshes_index_without_restart(self):
+        self.assertEqual(self.client.get('/static/css/new.css').status_code, 404)
+        with open(os.path.join(self.source, 'css', 'new.css'), 'w') as f:
+            f.write('.new { margin: 0; }\n' * 100)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = Template('{% load static %}{% static "css/new.css" %}').render(Context())
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_bootstrap_is_served_from_vendored_static(self):
+        html = get_template('blog/base.html').template.source
+        self.assertNotIn('cdn.jsdelivr.net', html)
+        for name, _, _ in VENDOR_ASSETS:
+            self.assertIn(f"{{% static '{name}' %}}", html)
+        # В STATICFILES_DIRS теста static/vendor нет
+        self.assertEqual([error.id for error in check_vendor_assets(None)], ['blog.W001'])
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'post_images'))
+        with open(os.path.join(self.root, 'post_images', 'clip.mp4'), 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.url = '/media/post_images/clip.mp4'
+
+    def test_full_range_and_conditional(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(len(b''.join(response.streaming_content)), 1024)
+
+        partial = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(partial.streaming_content), bytes(range(10, 20)))
+        tail = self.client.get(self.url, HTTP_RANGE='bytes=-6')
+        self.assertEqual(b''.join(tail.streaming_content), bytes(range(250, 256)))
+        unsatisfiable = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(unsatisfiable.status_code, 416)
+        self.assertEqual(unsatisfiable['Cache-Control'], 'no-store')
+        self.assertNotIn('ETag', unsatisfiable)
+        # Устаревший If-Range: отдается весь файл
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"old"').status_code, 200)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/post_images/').status_code, 404)
+
+    def test_sendfile_offload(self):
+        with self.settings(BLOG_MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/post_images/clip.mp4')
+        self.assertEqual(response.content, b'')
+        with self.settings(BLOG_MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'post_images', 'clip.mp4'))
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('counter', password='secret')
+        cls.category = Category.objects.create(name='Counted', slug='counted')
+        cls.other_category = Category.objects.create(name='Other', slug='other')
+        cls.tag = Tag.objects.create(name='counted', slug='counted')
+
+    def assertCounts(self, category, tag, profile):
+        self.assertEqual(Category.objects.get(pk=self.category.pk).published_post_count, category)
+        self.assertEqual(Tag.objects.get(pk=self.tag.pk).published_post_count, tag)
+        self.assertEqual(UserProfile.objects.get(user=self.author).post_count, profile)
+
+    def test_publish_move_and_delete(self):
+        post = Post.objects.create(title='Draft', content='text', author=self.author, category=self.category)
+        post.tags.add(self.tag)
+        self.assertCounts(0, 0, 0)
+        post = Post.objects.get(pk=post.pk)
+        post.publish()
+        self.assertCounts(1, 1, 1)
+        post.category = self.other_category
+        post.save()
+        self.assertCounts(0, 1, 1)
+        self.tag.post_set.clear()
+        self.assertCounts(0, 0, 1)
+        post.delete()
+        self.assertCounts(0, 0, 0)
+        self.assertEqual(Category.objects.get(pk=self.other_category.pk).published_post_count, 0)
+
+    def test_comment_approval_and_recount(self):
+        post = Post.objects.create(title='Post', content='text', author=self.author, is_published=True)
+        comment = Comment.objects.create(post=post, author='reader', text='Hi')
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 0)
+        comment.approve()
+        comment.approve()
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 1)
+        # Сохранение устаревшего объекта не затирает счетчик
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author='reader', text='Again', approved_comment=True)
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 2)
+
+        Post.objects.filter(pk=post.pk).update(approved_comment_count=7)
+        self.assertEqual(recount(dry_run=True)['Post'], 1)
+        self.assertEqual(recount()['Post'], 1)
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 2)
+        self.assertEqual(sum(recount().values()), 0)
+
+    def test_drifted_counters_do_not_go_negative(self):
+        post = Post.objects.create(title='Drift', content='text', author=self.author,
+                                   category=self.category, is_published=True)
+        comment = Comment.objects.create(post=post, author='reader', text='Hi', approved_comment=True)
+        # Счетчики разошлись до нуля (ручная правка, сбой): уменьшение не нарушает CHECK >= 0
+        Post.objects.filter(pk=post.pk).update(approved_comment_count=0)
+        Category.objects.filter(pk=self.category.pk).update(published_post_count=0)
+        UserProfile.objects.filter(user=self.author).update(post_count=0)
+        comment.delete()
+        post = Post.objects.get(pk=post.pk)
+        post.is_published = False
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).approved_comment_count, 0)
+        self.assertCounts(0, 0, 0)
+
+
+class ModerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('moderated', password='secret')
+        cls.posts = [
+            Post.objects.create(title=f'Post {n}', content='text', author=cls.author, is_published=True)
+            for n in range(3)
+        ]
+        for post in cls.posts:
+            Comment.objects.bulk_create(Comment(post=post, author='spam', text=f'{n}') for n in range(5))
+
+    def approved_counts(self):
+        return list(Post.objects.order_by('pk').values_list('approved_comment_count', flat=True))
+
+    def test_bulk_approve_and_reject(self):
+        generation = get_generations([f'post:{self.posts[0].slug}'])
+        updated = Post.objects.get(pk=self.posts[0].pk).updated_date
+        # Точка сохранения, выборка постов, UPDATE комментариев, пересчет счетчиков,
+        # области кэша - независимо от размера пачки
+        with self.assertNumQueries(6):
+            self.assertEqual(approve_comments(Comment.objects.filter(post__in=self.posts[:2])), 10)
+        self.assertEqual(self.approved_counts(), [5, 5, 0])
+        self.assertNotEqual(get_generations([f'post:{self.posts[0].slug}']), generation)
+        self.assertGreater(Post.objects.get(pk=self.posts[0].pk).updated_date, updated)
+        self.assertEqual(approve_comments(Comment.objects.all()), 5)
+
+        Comment.objects.filter(post=self.posts[2]).update(approved_comment=False)
+        Post.objects.filter(pk=self.posts[2].pk).update(approved_comment_count=0)
+        # Точка сохранения, выборка id, DELETE, пересчет счетчиков, области кэша
+        with self.assertNumQueries(6):
+            self.assertEqual(reject_comments(Comment.objects.filter(text__in=['0', '1'])), 6)
+        self.assertEqual(self.approved_counts(), [3, 3, 0])
+        self.assertEqual(Comment.objects.count(), 9)
+
+    def test_moderation_queue(self):
+        admin_user = User.objects.create_superuser('moderator', password='secret')
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin_moderation'))
+        self.assertEqual(len(response.context['page']), 15)
+        self.assertContains(response, 'На модерации 15.')
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'COUNT(' in q['sql']])
+        self.assertEqual(response.context['page'][0].text, '0')
+
+        ids = [comment.pk for comment in response.context['page'][:3]]
+        response = self.client.post(reverse('admin_moderation'), {'comment': ids, 'approve': '1'})
+        self.assertRedirects(response, reverse('admin_moderation'))
+        self.assertEqual(self.approved_counts(), [3, 0, 0])
+
+        response = self.client.post(reverse('admin:blog_comment_changelist'), {
+            'action': 'reject_selected', '_selected_action': [c.pk for c in Comment.objects.filter(post=self.posts[0])],
+        })
+        self.assertEqual(self.approved_counts(), [0, 0, 0])
+        self.assertEqual(Comment.objects.count(), 10)
+
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse('admin_moderation')).status_code, 302)
+
+
+@override_settings(BLOG_JOBS_EAGER=True)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.author = User.objects.create_user('photographer', password='secret')
+
+    def upload(self, size, mode='RGB'):
+        buffer = BytesIO()
+        Image.new(mode, size).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_creates_variants_and_srcset(self):
+        post = Post.objects.create(title='Photo', content='text', author=self.author,
+                                   image=self.upload((800, 400), 'RGBA'))
+        # Копии создает фоновая задача, в тесте она выполняется сразу
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.image_widths, [320, 640])
+        storage = post.image.storage
+        for name in ('photo-320w.jpg', 'photo-320w.webp', 'photo-640w.jpg', 'photo-640w.webp'):
+            self.assertTrue(storage.exists(f'post_images/{name}'))
+        with storage.open('post_images/photo-640w.jpg') as variant:
+            self.assertEqual(Image.open(variant).size, (640, 320))
+
+        html = Template('{% load blog_images %}{% responsive_image post.image post.image_widths alt="x" %}').render(
+            Context({'post': post}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('/media/post_images/photo-640w.jpg 640w', html)
+
+        # Повторное сохранение без нового файла копии не пересоздает
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).image_widths, [320, 640])
+
+    def test_small_avatar_keeps_original_width(self):
+        profile = self.author.userprofile
+        profile.avatar = self.upload((40, 40))
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_widths, [40])
+
+
+CALLS = []
+
+
+@task('tests.record', max_attempts=2, timeout=5)
+def record_call(value):
+    CALLS.append(value)
+    if value == 'boom':
+        raise RuntimeError('boom')
+
+
+@task('tests.slow', max_attempts=2, timeout=1)
+def slow_call(value):
+    time.sleep(1.5)
+    CALLS.append(value)
+
+
+class JobQueueTests(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_worker_runs_and_retries(self):
+        record_call.enqueue('ok')
+        failing = record_call.enqueue('boom')
+        self.assertEqual(Worker(poll_interval=0.01).run(burst=True), 2)
+        self.assertEqual(sorted(CALLS), ['boom', 'ok'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 1)
+
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.PENDING, 1))
+        self.assertIn('RuntimeError: boom', failing.last_error)
+
+        # Вторая попытка последняя
+        Job.objects.filter(pk=failing.pk).update(run_at=timezone.now())
+        Worker(poll_interval=0.01).run(burst=True)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.FAILED, 2))
+
+    def test_stale_running_job_is_requeued(self):
+        job = record_call.enqueue('ok')
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, locked_by='gone', attempts=1,
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+        Worker(poll_interval=0.01).run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertIn('gone', job.last_error)
+
+    def test_timed_out_thread_job_is_not_retried(self):
+        slow = slow_call.enqueue('slow')
+        queued = record_call.enqueue('ok')
+        self.assertEqual(Worker(concurrency=1, poll_interval=0.01).run(burst=True), 2)
+
+        slow.refresh_from_db()
+        self.assertEqual((slow.status, slow.attempts), (Job.FAILED, 1))
+        self.assertIn('Превышено время', slow.last_error)
+        # Поток с таймаутом держал единственное место: вторая задача ждала его
+        # и не получила ложный таймаут
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.DONE)
+        self.assertEqual(CALLS, ['slow', 'ok'])
+
+
+ASYNC_READ_VIEWS = {'post_list', 'post_detail', 'category_posts', 'user_profile', 'search', 'user_search'}
+
+# URLConf с асинхронными страницами для чтения, как под ASGI
+urlpatterns = [
+    path(str(pattern.pattern),
+         getattr(async_views, pattern.name) if pattern.name in ASYNC_READ_VIEWS else pattern.callback,
+         name=pattern.name)
+    for pattern in blog_urls.urlpatterns
+]
+
+CSRF_VALUE_RE = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class AsyncViewTests(TestCase):
+    URLS = [
+        ('post_list', {}, ''),
+        ('post_detail', {'slug': 'async-0'}, ''),
+        ('category_posts', {'slug': 'async-cat'}, ''),
+        ('user_profile', {'username': 'async'}, ''),
+        ('search', {}, '?q=async'),
+        ('user_search', {}, '?q=async'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async', password='secret')
+        category = Category.objects.create(name='Async', slug='async-cat')
+        for i in range(12):
+            post = Post.objects.create(title=f'Async {i}', slug=f'async-{i}', content='async content',
+                                       author=cls.user, category=category, is_published=True)
+            Comment.objects.create(post=post, author='reader', text='Nice', approved_comment=True)
+
+    async def fetch_both(self, url):
+        sync_response = await self.async_client.get(url)
+        with override_settings(ROOT_URLCONF=__name__):
+            async_response = await self.async_client.get(url)
+        return sync_response, async_response
+
+    async def assertSameResponses(self):
+        for name, kwargs, query in self.URLS:
+            url = reverse(name, kwargs=kwargs) + query
+            sync_response, async_response = await self.fetch_both(url)
+            self.assertEqual(async_response.status_code, 200, url)
+            self.assertEqual(
+                CSRF_VALUE_RE.sub(b'', async_response.content),
+                CSRF_VALUE_RE.sub(b'', sync_response.content),
+                url,
+            )
+
+    async def test_async_pages_match_sync(self):
+        await self.assertSameResponses()
+
+    async def test_async_pages_for_logged_in_user(self):
+        await self.async_client.aforce_login(self.user)
+        await self.assertSameResponses()
+
+    async def test_async_conditional_get(self):
+        url = reverse('post_detail', kwargs={'slug': 'async-1'})
+        sync_response, async_response = await self.fetch_both(url)
+        self.assertEqual(async_response['ETag'], sync_response['ETag'])
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(url, headers={'if-none-match': async_response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_missing_post_is_404(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(reverse('post_detail', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class BenchmarkTests(TestCase):
+    def test_seed_and_measure_every_route(self):
+        self.assertEqual(benchmarks.seed(posts=6, users=2, tags=3, comments_per_post=2), 6)
+        self.assertEqual(benchmarks.seed(posts=6, users=2, tags=3, comments_per_post=2), 6)
+        self.assertEqual(benchmarks.profile_counts(), {'posts': 6, 'users': 2, 'tags': 3, 'comments': 12})
+        self.assertTrue(Post.objects.filter(slug__startswith='bench-', title__regex='[а-я]').exists())
+
+        routes = benchmarks.route_urls()
+        self.assertEqual({name for name, _, _ in routes}, {p.name for p in blog_urls.urlpatterns})
+        for name, url, user in routes:
+            with self.subTest(url=name):
+                stats = benchmarks.measure_route(url, user, iterations=2, warmup=1)
+                self.assertEqual(stats['errors'], 0)
+                self.assertLessEqual({'p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries', 'sql_ms'}, set(stats))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='pass')
+        self.category = Category.objects.create(name='Фотография')
+
+    def test_import_jsonl_in_batches(self):
+        lines = [
+            '{"title": "Первый пост", "content": "текст", "author": "writer", "category": "фотография",'
+            ' "tags": ["django", "Новый тег"], "is_published": true,'
+            ' "comments": [{"author": "гость", "text": "ок", "approved": true}]}',
+            '{"title": "Первый пост", "content": "дубль", "author": "writer"}',
+            'не json',
+            '{"title": "Без автора", "content": "x", "author": "nobody"}',
+        ]
+        importer = PostImporter(batch_size=1, create_missing=True)
+        with CaptureQueriesContext(connection) as queries:
+            for number, record in read_jsonl(lines):
+                importer.add(number, record)
+            importer.finish()
+        self.assertEqual((importer.imported, importer.failed), (3, 1))
+        first, second = Post.objects.filter(author=self.user).order_by('pk')
+        self.assertEqual(first.slug, 'pervyy-post')
+        self.assertEqual(second.slug, 'pervyy-post-1')
+        self.assertEqual(first.category, self.category)
+        self.assertEqual(set(first.tags.values_list('name', flat=True)), {'django', 'Новый тег'})
+        self.assertEqual(first.approved_comment_count, 1)
+        self.assertTrue(User.objects.filter(username='nobody').exists())
+        self.assertEqual(Category.objects.get(pk=self.category.pk).published_post_count, 1)
+        # Slug проверяются по БД одним запросом по диапазону на основу в каждой пачке
+        slug_queries = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'pervyy-post' in q['sql']]
+        self.assertEqual(len(slug_queries), 2)
+
+    def test_slugs_are_resolved_per_batch_against_the_database(self):
+        Post.objects.create(title='Старый', slug='privet', author=self.user)
+        Post.objects.create(title='Чужой', slug='drugoy', author=self.user)
+        importer = PostImporter(batch_size=10, default_author='writer')
+        for number in range(3):
+            importer.add(number, {'title': 'Привет'})
+        importer.add(3, {'title': 'Явный', 'slug': 'drugoy'})
+        with self.assertNumQueries(2):  # диапазон privet, диапазон drugoy
+            batch = importer.assign_slugs(importer.pending)
+        self.assertEqual([post.slug for post, _, _ in batch], ['privet-1', 'privet-2', 'privet-3', 'drugoy-1'])
+        importer.pending = []
+        importer.add(4, {'title': 'Привет'})
+        importer.finish()
+        self.assertTrue(Post.objects.filter(slug='privet-1').exists())
+
+    def test_markdown_front_matter(self):
+        record = parse_front_matter(
+            '---\ntitle: "Привет: мир"\ntags:\n  - django\n  - python\npublished: yes\n---\n\nТело\n'
+        )
+        self.assertEqual(record, {
+            'title': 'Привет: мир', 'tags': ['django', 'python'], 'published': True, 'content': 'Тело',
+        })
+        importer = PostImporter(default_author='writer', skip_existing=True)
+        importer.add('a.md', dict(record, tags='django, python'))
+        importer.flush()
+        importer.add('b.md', {'title': 'x', 'tags': ['нет такого']})
+        importer.add('c.md', {'title': 'Повтор', 'slug': Post.objects.get().slug})
+        importer.finish()
+        self.assertEqual((importer.imported, importer.skipped, importer.failed), (1, 1, 1))
+        self.assertIn('неизвестный', importer.errors[0])
+
+    def test_export_round_trip(self):
+        post = Post.objects.create(title='Экспорт', content='текст', author=self.user,
+                                   category=self.category, is_published=True)
+        post.tags.add(Tag.objects.get(name='django'))
+        Comment.objects.create(post=post, author='гость', text='да', approved_comment=True)
+        Comment.objects.create(post=post, author='спам', text='нет')
+
+        with self.assertNumQueries(4):  # порция, теги, комментарии, пустая порция
+            records = list(export_posts(chunk_size=10))
+        self.assertEqual([c['text'] for c in records[0]['comments']], ['да'])
+        self.assertEqual(list(export_posts(since=to_datetime(records[0]['updated_date']))), [])
+
+        Post.objects.all().delete()
+        importer = PostImporter()
+        for number, record in enumerate(records):
+            importer.add(number, record)
+        importer.finish()
+        self.assertEqual(list(export_posts()), [dict(records[0], updated_date=Post.objects.get().updated_date.isoformat())])
+
+
+@override_settings(BLOG_JOBS_EAGER=True)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('searcher', password='secret')
+
+    def committed(self):
+        # Индекс обновляется задачей, поставленной после фиксации транзакции
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def publish(self, title, content='текст', **kwargs):
+        with self.committed():
+            return Post.objects.create(title=title, content=content, author=self.author, is_published=True, **kwargs)
+
+    def found(self, query):
+        return [post.pk for post in SearchResults(query)[:10]]
+
+    def test_index_follows_save_unpublish_and_delete(self):
+        post = self.publish('Квантовая механика')
+        self.assertEqual(self.found('квантовая'), [post.pk])
+        post.title = 'Классическая механика'
+        with self.committed():
+            post.save()
+        self.assertEqual(self.found('квантовая'), [])
+        self.assertEqual(self.found('классическая мех'), [post.pk])
+
+        post.is_published = False
+        with self.committed():
+            post.save()
+        self.assertEqual(get_backend().count('классическая'), 0)
+        post.is_published = True
+        with self.committed():
+            post.save()
+        post.delete()
+        self.assertEqual(get_backend().count('классическая'), 0)
+
+    @override_settings(BLOG_JOBS_EAGER=False)
+    def test_save_queues_reindex_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(title='Очередь', content='текст', author=self.author, is_published=True)
+            self.assertFalse(Job.objects.exists())
+        self.assertEqual(self.found('очередь'), [])
+        for callback in callbacks:
+            callback()
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.args), ('search.reindex_posts', [[post.pk]]))
+        self.assertEqual(execute(job.name, job.args, job.kwargs), None)
+        self.assertEqual(self.found('очередь'), [post.pk])
+
+    @override_settings(BLOG_JOBS_EAGER=False)
+    def test_create_post_saves_once_and_defers_indexing(self):
+        tag = Tag.objects.create(name='очередь')
+        self.client.force_login(self.author)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('create_post'), {
+                'title': 'Новый пост', 'content': 'текст', 'tags': [tag.pk], 'is_published': 'on',
+            })
+        post = Post.objects.get()
+        self.assertRedirects(response, post.get_absolute_url(), fetch_redirect_response=False)
+        self.assertIsNotNone(post.published_date)
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(sum(sql.startswith('INSERT INTO "blog_post"') for sql in writes), 1)
+        self.assertFalse([sql for sql in writes if sql.startswith('UPDATE "blog_post"')])
+        self.assertEqual(self.found('новый'), [])
+        self.assertEqual({job.name for job in Job.objects.all()}, {'search.reindex_posts'})
+
+    def test_tag_changes_reindex(self):
+        post = self.publish('Без слова')
+        tag = Tag.objects.create(name='астрономия')
+        with self.committed():
+            post.tags.add(tag)
+        self.assertEqual(self.found('астрономия'), [post.pk])
+        tag.name = 'телескопы'
+        with self.committed():
+            tag.save()
+        self.assertEqual(self.found('телескопы'), [post.pk])
+        with self.committed():
+            tag.post_set.clear()
+        self.assertEqual(self.found('телескопы'), [])
+
+    def test_title_match_ranks_above_body_and_snippet_is_escaped(self):
+        body = self.publish('Заметка', content='<b>жирный</b> рассказ про ежи и не только')
+        title = self.publish('Ежи в лесу', content='рассказ')
+        self.assertEqual(self.found('ежи'), [title.pk, body.pk])
+        snippet = SearchResults('жирный')[:1][0].search_snippet
+        self.assertIn('&lt;b&gt;<mark>жирный</mark>&lt;/b&gt;', snippet)
+
+    def test_fts_operators_are_stripped(self):
+        self.assertEqual(tokenize('title:ежи OR "лес" NEAR(ель) -пень*'),
+                         ['title', 'ежи', 'or', 'лес', 'near', 'ель', 'пень'])
+        self.publish('Лес')
+        for query in ('лес"', 'лес AND', '*', '"', 'title:лес', 'NEAR(лес'):
+            self.assertIsInstance(SearchResults(query).count(), int)
+        self.assertEqual(SearchResults('"').count(), 0)
+        self.assertEqual(SearchResults('лес"').count(), 1)
+
+    def test_rebuild_command(self):
+        self.publish('Перестройка индекса')
+        get_backend().clear()
+        self.assertEqual(self.found('перестройка'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=1, stdout=out)
+        self.assertIn('Проиндексировано постов: 1', out.getvalue())
+        self.assertEqual(len(self.found('перестройка')), 1)
+
+    def test_migration_fills_index_for_existing_posts(self):
+        post = self.publish('Старый пост')
+        get_backend().clear()
+        migration = import_module('blog.migrations.0012_fill_search_index')
+        migration.fill_search_index(None, mock.Mock(connection=connection))
+        self.assertEqual(self.found('старый'), [post.pk])
+
+    def test_author_posts_reindexed_only_on_rename(self):
+        self.publish('Пост автора')
+        author = User.objects.get(pk=self.author.pk)
+        with mock.patch.object(search, 'reindex_posts') as reindex, self.committed():
+            author.set_password('other')
+            author.save()
+            author.first_name = 'Имя'
+            author.save()
+            User.objects.get(pk=author.pk).save(update_fields=['last_login'])
+        reindex.assert_not_called()
+
+        author.username = 'renamed'
+        with self.committed():
+            author.save()
+        self.assertEqual(self.found('renamed'), [Post.objects.get().pk])
+        with mock.patch.object(search, 'reindex_posts') as reindex, self.committed():
+            author.save()
+        reindex.assert_not_called()
+
+
+class ExplainHotQueriesTests(TestCase):
+    # Индекс, который должен быть в плане каждого горячего запроса
+    EXPECTED = {
+        'post_list': 'post_feed_idx',
+        'post_detail: комментарии': 'comment_post_approved_idx',
+        'category_posts': 'post_category_feed_idx',
+        'user_profile': 'post_author_feed_idx',
+        'my_posts': 'post_author_created_idx',
+    }
+
+    def test_hot_queries_use_indexes(self):
+        author = User.objects.create_user('planner', password='secret')
+        Post.objects.create(title='План', content='текст', author=author, is_published=True,
+                            category=Category.objects.first())
+        out = StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        sections = dict(
+            section.split('\n', 1) for section in out.getvalue().split('\n== ')[1:]
+        )
+        self.assertEqual(set(sections), set(self.EXPECTED) | {'post_detail'})
+        for name, index in self.EXPECTED.items():
+            self.assertIn(index, sections[name], name)
+        self.assertRegex(sections['post_detail'], r'USING INDEX \S*slug|sqlite_autoindex_blog_post')
+
+
+class SlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('slugger', password='secret')
+
+    def post(self, title):
+        return Post.objects.create(title=title, content='текст', author=self.author)
+
+    def test_collision_suffix_ignores_numbers_in_titles(self):
+        self.assertEqual(self.post('Привет мир 2024').slug, 'privet-mir-2024')
+        self.assertEqual(self.post('Привет мир').slug, 'privet-mir')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post('Привет мир').slug, 'privet-mir-1')
+        # Диапазон по уникальному индексу, а не LIKE
+        lookup = next(q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT'))
+        self.assertIn('>=', lookup)
+        self.assertNotIn('LIKE', lookup)
+        self.assertEqual(self.post('Привет мир').slug, 'privet-mir-2')
+        Post.objects.filter(slug='privet-mir-1').delete()
+        self.assertEqual(self.post('Привет мир').slug, 'privet-mir-1')
+
+    def test_lookup_skips_longer_slugs_with_the_same_prefix(self):
+        for slug in ('post', 'post-1', 'postgres', 'postgres-tips', 'post-x'):
+            Post.objects.create(title=slug, slug=slug, content='текст', author=self.author)
+        self.assertEqual(slugs.taken_slugs(Post.objects.all(), 'post'), {'post', 'post-1', 'post-x'})
+        pool = slugs.SlugPool(Post.objects.all())
+        with self.assertNumQueries(1):
+            self.assertEqual([pool.allocate('post'), pool.allocate('post-1')], ['post-2', 'post-1-1'])
+        self.assertNotIn('postgres', pool.taken)
+
+    def test_transliteration_and_fallback(self):
+        self.assertEqual(base_slug('Щука и ёж: Эссе', 'post'), 'shchuka-i-yozh-esse')
+        self.assertEqual(Category.objects.create(name='Жёлтая Пресса').slug, 'zhyoltaya-pressa')
+        self.assertEqual(self.post('!!! ???').slug, 'post')
+        self.assertEqual(self.post('中文').slug, 'post-1')
+        self.assertEqual(Tag.objects.create(name='¿?').slug, 'tag')
+        self.assertLessEqual(len(self.post('очень ' * 30).slug), 50)
+
+    def test_integrity_error_retry(self):
+        self.post('Гонка')
+        real = slugs.allocate_slug
+        calls = []
+
+        def racing(queryset, base):
+            calls.append(base)
+            # Первая попытка видит БД до вставки параллельного процесса
+            return base if len(calls) == 1 else real(queryset, base)
+
+        with mock.patch.object(slugs, 'allocate_slug', side_effect=racing):
+            self.assertEqual(self.post('Гонка').slug, 'gonka-1')
+        self.assertEqual(len(calls), 2)
+
+        with mock.patch.object(slugs, 'allocate_slug', return_value='gonka'):
+            with self.assertRaises(IntegrityError):
+                self.post('Гонка')
+
+
+class FixAllSlugsTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('fixer', password='secret')
+        Post.objects.create(title='Дубль', content='текст', author=author)
+        self.broken = [Post.objects.create(title=title, content='текст', author=author) for title in ('Дубль', 'Дубль', '')]
+        for post, slug in zip(self.broken, ('', ' ', '  ')):
+            Post.objects.filter(pk=post.pk).update(slug=slug)
+
+    def run_command(self, *args):
+        call_command('fix_all_slugs', '--summary', '--batch-size=2', *args, stdout=StringIO())
+        return {post.pk: (post.title, post.slug) for post in Post.objects.filter(pk__in=[p.pk for p in self.broken])}
+
+    def test_fixes_duplicates_and_blanks_and_resumes(self):
+        progress = os.path.join(tempfile.mkdtemp(), 'progress')
+        self.addCleanup(shutil.rmtree, os.path.dirname(progress))
+        first, second, untitled = self.broken
+        with open(progress, 'w') as f:
+            f.write(str(first.pk))
+        generation = get_generations(['global'])
+
+        fixed = self.run_command(f'--progress-file={progress}')
+        # Продолжение: пост до сохраненного id не тронут
+        self.assertEqual(fixed[first.pk], ('Дубль', ''))
+        self.assertEqual(fixed[second.pk], ('Дубль', 'dubl-1'))
+        self.assertEqual(fixed[untitled.pk], (f'Пост {untitled.pk}', f'post-{untitled.pk}'))
+        self.assertFalse(os.path.exists(progress))
+        self.assertNotEqual(get_generations(['global']), generation)
+
+        fixed = self.run_command(f'--progress-file={progress}')
+        self.assertEqual(fixed[first.pk], ('Дубль', 'dubl-2'))
+        self.assertFalse(Post.objects.filter(slug__regex=r'^\s*$').exists())
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        pagecache.flush_fragment_stats()
+        cache.clear()
+        self.author = User.objects.create_user('fragments', password='secret')
+
+    def test_key_follows_updated_date_and_generation(self):
+        post = Post.objects.create(title='A', content='текст', author=self.author, is_published=True)
+        template = Template('{% load blog_cache %}{% cachefragment card post.pk post.updated_date %}'
+                            '{{ post.title }}{% endcachefragment %}')
+        render = lambda: template.render(Context({'post': post}))
+        self.assertEqual(render(), 'A')
+        post.title = 'B'
+        self.assertEqual(render(), 'A')
+        post.updated_date += timedelta(seconds=1)
+        self.assertEqual(render(), 'B')
+        post.title = 'C'
+        self.assertEqual(render(), 'B')
+        pagecache.bump(pagecache.GLOBAL)
+        self.assertEqual(render(), 'C')
+        self.assertIn(('card', 2, 3, 40), pagecache.fragment_stats())
+
+    def test_edited_post_rerenders_with_batched_stats(self):
+        posts = [Post.objects.create(title=f'Карточка {n}', content='текст', author=self.author, is_published=True)
+                 for n in range(3)]
+        url = reverse('post_list')
+        self.client.get(url)
+        with mock.patch.object(cache, 'incr', wraps=cache.incr) as incr:
+            self.assertContains(self.client.get(url), 'Карточка 2')
+        # Одно увеличение на фрагмент, а не на каждую карточку
+        self.assertEqual(incr.call_count, 2)
+        stats = {name: (hits, misses) for name, hits, misses, _ in pagecache.fragment_stats()}
+        self.assertEqual(stats['post_card'], (3, 3))
+
+        posts[2].title = 'Исправленная карточка'
+        posts[2].save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Исправленная карточка')
+        self.assertNotContains(response, 'Карточка 2')
+
+
+
+class BenchmarkDatabaseTests(TestCase):
+    def test_measurements_use_a_throwaway_database_and_cache(self):
+        configured = dict(connection.settings_dict)
+
+        def create_test_db(**kwargs):
+            connection.settings_dict['NAME'] = connection.settings_dict['TEST']['NAME']
+            return connection.settings_dict['NAME']
+
+        creation = type(connection.creation)
+        with mock.patch.object(creation, 'create_test_db', side_effect=create_test_db) as create, \
+                mock.patch.object(creation, 'destroy_test_db') as destroy:
+            with benchmarks.benchmark_database() as name:
+                self.assertNotEqual(name, configured['NAME'])
+                self.assertTrue(name.endswith('benchmark.sqlite3'))
+                self.assertIsInstance(caches['default'], LocMemCache)
+        create.assert_called_once()
+        destroy.assert_called_once_with(configured['NAME'], verbosity=0)
+        self.assertEqual(connection.settings_dict, configured)
+        self.assertNotIsInstance(caches['default'], LocMemCache)
@@ -0,0 +1,387 @@
+# blog/transfer.py
+"""Перенос постов между блогами: потоковые экспорт и импорт пачками.
+
+Формат записи (одна строка JSON Lines или front matter файла Markdown):
+
+    {"title": "...", "slug": "...", "content": "...", "author": "username",
+     "category": "Имя или slug", "tags": ["django", "python"],
+     "is_published": true, "published_date": "2024-01-02T03:04:05+00:00",
+     "created_date": "...", "comments": [{"author": "...", "text": "...",
+     "created_date": "...", "approved": true}]}
+
+Обязательны только title и content (у Markdown content - тело файла).
+Экспорт пишет те же поля (плюс image и updated_date), поэтому его вывод
+загружается обратно командой import_posts.
+"""
+import json
+import os
+from datetime import datetime, time as datetime_time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .counters import recount
+from .models import Category, Comment, Post, Tag
+from .pagecache import GLOBAL, bump
+from .search import reindex_posts
+from .slugs import SlugPool, base_slug
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+# Чтение источников
+
+def read_jsonl(stream):
+    """Записи из потока JSON Lines: (номер строки, словарь)"""
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, InvalidRecord(f'неверный JSON: {exc}')
+            continue
+        yield number, record
+
+
+def parse_scalar(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    lowered = value.lower()
+    if lowered in ('true', 'yes', 'on'):
+        return True
+    if lowered in ('false', 'no', 'off'):
+        return False
+    if lowered in ('', 'null', '~'):
+        return None
+    if value.startswith('[') and value.endswith(']'):
+        return [parse_scalar(item) for item in value[1:-1].split(',') if item.strip()]
+    return value
+
+
+def parse_front_matter(text):
+    """Разбирает Markdown с front matter между строками "---".
+
+    Поддерживается подмножество YAML, которого хватает для блогов:
+    "ключ: значение", списки [a, b] и списки из строк "- значение".
+    Возвращает словарь полей, content - тело документа.
+    """
+    lines = text.splitlines()
+    if not lines or lines[0].strip() != '---':
+        return {'content': text}
+    try:
+        end = next(i for i in range(1, len(lines)) if lines[i].strip() in ('---', '...'))
+    except StopIteration:
+        raise InvalidRecord('не закрыт блок front matter')
+    record = {}
+    current = None
+    for line in lines[1:end]:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        stripped = line.strip()
+        if stripped.startswith('- ') and current is not None:
+            if not isinstance(record[current], list):
+                record[current] = []
+            record[current].append(parse_scalar(stripped[2:]))
+            continue
+        key, separator, value = line.partition(':')
+        if not separator:
+            raise InvalidRecord(f'непонятная строка front matter: {line!r}')
+        current = key.strip()
+        record[current] = parse_scalar(value)
+    record['content'] = '\n'.join(lines[end + 1:]).strip('\n')
+    return record
+
+
+def read_markdown_dir(path):
+    """Записи из файлов *.md каталога (рекурсивно, без загрузки списка в память)"""
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.endswith(('.md', '.markdown')):
+                    with open(entry.path, encoding='utf-8') as source:
+                        try:
+                            yield entry.path, parse_front_matter(source.read())
+                        except InvalidRecord as exc:
+                            yield entry.path, exc
+
+
+# Экспорт
+
+def export_record(post):
+    """Запись в формате импорта для поста с загруженными тегами и комментариями"""
+    return {
+        'title': post.title,
+        'slug': post.slug,
+        'content': post.content,
+        'author': post.author.username,
+        'category': post.category.name if post.category_id else None,
+        'tags': [tag.name for tag in post.tags.all()],
+        'is_published': post.is_published,
+        'published_date': post.published_date.isoformat() if post.published_date else None,
+        'created_date': post.created_date.isoformat(),
+        'updated_date': post.updated_date.isoformat(),
+        'image': post.image.name or None,
+        'comments': [
+            {
+                'author': comment.author,
+                'text': comment.text,
+                'created_date': comment.created_date.isoformat(),
+                'approved': comment.approved_comment,
+            }
+            for comment in post.comments.all()
+        ],
+    }
+
+
+def export_posts(since=None, chunk_size=1000):
+    """Записи всех постов (или измененных после since) по возрастанию pk.
+
+    Посты читаются порциями по chunk_size с условием pk > последнего
+    прочитанного: каждая порция - отдельный короткий запрос, и к ней одним
+    запросом на связь подгружаются теги и одобренные комментарии.
+    Удаленные посты инкрементальный экспорт не отражает.
+    """
+    queryset = (
+        Post.objects.select_related('author', 'category').order_by('pk')
+        .prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.only('name').order_by('name')),
+            Prefetch('comments', queryset=Comment.objects.filter(approved_comment=True).order_by('created_date', 'pk')),
+        )
+    )
+    if since is not None:
+        # updated_date меняется и при новых одобренных комментариях (blog/counters.py)
+        queryset = queryset.filter(updated_date__gt=since)
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        for post in chunk:
+            yield export_record(post)
+        last_pk = chunk[-1].pk
+
+
+# Импорт
+
+def to_datetime(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = parse_datetime(str(value))
+        if parsed is None:
+            day = parse_date(str(value))
+            if day is None:
+                raise InvalidRecord(f'неверная дата: {value!r}')
+            parsed = datetime.combine(day, datetime_time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+    return parsed
+
+
+def to_list(value):
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return [str(item) for item in value]
+
+
+MAX_ERRORS = 100
+
+
+class PostImporter:
+    """Вставляет посты пачками через bulk_create.
+
+    Авторы, категории и теги ищутся в словарях, загруженных один раз.
+    Slug пачки проверяются по БД при ее записи (SlugPool на пачку): в памяти
+    держится только текущая пачка и справочники.
+    """
+
+    def __init__(self, batch_size=1000, default_author=None, create_missing=False,
+                 skip_existing=False, publish=False, dry_run=False):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.skip_existing = skip_existing
+        self.publish = publish
+        self.dry_run = dry_run
+
+        self.authors = dict(User.objects.values_list('username', 'id').iterator())
+        self.default_author_id = None
+        if default_author:
+            if default_author not in self.authors:
+                raise InvalidRecord(f'автор по умолчанию {default_author!r} не найден')
+            self.default_author_id = self.authors[default_author]
+        self.categories = self.taxonomy_map(Category)
+        self.tags = self.taxonomy_map(Tag)
+
+        self.pending = []
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []  # первые MAX_ERRORS сообщений
+
+    @staticmethod
+    def taxonomy_map(model):
+        # Ищем и по имени, и по slug, без учета регистра имени
+        lookup = {}
+        for pk, name, slug in model.objects.values_list('pk', 'name', 'slug').iterator():
+            lookup.setdefault(name.lower(), pk)
+            lookup.setdefault(slug, pk)
+        return lookup
+
+    def resolve_author(self, username):
+        if username in self.authors:
+            return self.authors[username]
+        if username and self.create_missing:
+            if self.dry_run:
+                return 0
+            user = User.objects.create(username=username, password=make_password(None))
+            self.authors[username] = user.pk
+            return user.pk
+        if self.default_author_id is not None:
+            return self.default_author_id
+        raise InvalidRecord(f'неизвестный автор {username!r}')
+
+    def resolve_taxonomy(self, model, lookup, name):
+        key = str(name).strip()
+        pk = lookup.get(key.lower()) or lookup.get(key)
+        if pk is not None:
+            return pk
+        if not self.create_missing:
+            raise InvalidRecord(f'неизвестный {model._meta.verbose_name} {name!r}')
+        if self.dry_run:
+            return 0
+        # Новые категории и теги редки: обычное сохранение с генерацией slug
+        obj = model(name=key)
+        obj.save()
+        lookup[key.lower()] = lookup[obj.slug] = obj.pk
+        return obj.pk
+
+    def build(self, record):
+        """Post (без сохранения), id тегов и комментарии из записи"""
+        if not isinstance(record, dict):
+            raise InvalidRecord('запись должна быть объектом')
+        title = str(record.get('title') or '').strip()
+        if not title:
+            raise InvalidRecord('нет заголовка')
+        author_id = self.resolve_author(record.get('author'))
+
+        category = record.get('category')
+        published = record.get('is_published', record.get('published', self.publish))
+        post = Post(
+            title=title[:200],
+            # Пустой slug строится из заголовка при записи пачки (assign_slugs)
+            slug=str(record.get('slug') or '').strip(),
+            content=str(record.get('content') or ''),
+            author_id=author_id,
+            category_id=self.resolve_taxonomy(Category, self.categories, category) if category else None,
+            is_published=bool(published),
+            published_date=to_datetime(record.get('published_date')),
+            image=str(record.get('image') or ''),
+        )
+        created = to_datetime(record.get('created_date') or record.get('date'))
+        if created:
+            post.created_date = created
+        if post.is_published and not post.published_date:
+            post.published_date = post.created_date
+        tag_ids = {self.resolve_taxonomy(Tag, self.tags, name) for name in to_list(record.get('tags'))}
+        comments = [
+            Comment(
+                author=str(comment.get('author') or '')[:100],
+                text=str(comment.get('text') or ''),
+                created_date=to_datetime(comment.get('created_date')) or timezone.now(),
+                approved_comment=bool(comment.get('approved', comment.get('approved_comment', False))),
+            )
+            for comment in record.get('comments') or []
+        ]
+        return post, tag_ids, comments
+
+    def error(self, source, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'{source}: {message}')
+
+    def add(self, source, record):
+        """Добавляет запись в пачку; возвращает True, если пачка записана"""
+        if isinstance(record, Exception):
+            self.error(source, record)
+            return False
+        try:
+            built = self.build(record)
+        except InvalidRecord as exc:
+            self.error(source, exc)
+            return False
+        self.pending.append(built)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+            return True
+        return False
+
+    def assign_slugs(self, batch):
+        """Выделяет slug пачки; возвращает пачку без пропущенных записей"""
+        slugs = SlugPool(Post.objects.all())
+        kept = []
+        for built in batch:
+            post = built[0]
+            if not post.slug:
+                post.slug = slugs.allocate(base_slug(post.title, 'post'))
+            elif post.slug not in slugs:
+                slugs.reserve(post.slug)
+            elif self.skip_existing:
+                self.skipped += 1
+                continue
+            else:
+                post.slug = slugs.allocate(post.slug)
+            kept.append(built)
+        return kept
+
+    def flush(self):
+        batch, self.pending = self.pending, []
+        batch = self.assign_slugs(batch)
+        if not batch:
+            return
+        if self.dry_run:
+            self.imported += len(batch)
+            return
+        with transaction.atomic():
+            posts = Post.objects.bulk_create([post for post, _, _ in batch])
+            if posts[0].pk is None:
+                # БД без RETURNING (MySQL): id находим по уникальным slug
+                ids = dict(Post.objects.filter(slug__in=[post.slug for post in posts]).values_list('slug', 'pk'))
+                for post in posts:
+                    post.pk = ids[post.slug]
+            PostTag = Post.tags.through
+            PostTag.objects.bulk_create([
+                PostTag(post_id=post.pk, tag_id=tag_id)
+                for post, (_, tag_ids, _) in zip(posts, batch) for tag_id in tag_ids
+            ], ignore_conflicts=True)
+            comments = []
+            for post, (_, _, post_comments) in zip(posts, batch):
+                for comment in post_comments:
+                    comment.post_id = post.pk
+                    comments.append(comment)
+            Comment.objects.bulk_create(comments)
+            # bulk_create не вызывает сигналы: индекс поиска обновляем для пачки
+            reindex_posts(Post.objects.filter(pk__in=[post.pk for post in posts]))
+        self.imported += len(batch)
+
+    def finish(self):
+        self.flush()
+        if self.imported and not self.dry_run:
+            # Счетчики и кэши страниц - один раз на весь импорт
+            recount()
+            bump(GLOBAL)
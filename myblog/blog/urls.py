@@ -1,13 +1,17 @@
 # blog/urls.py
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import async_views, feeds, views
+
+# Под ASGI страницы только для чтения обслуживают асинхронные версии
+read_views = async_views if settings.BLOG_ASYNC_VIEWS else views
 
 urlpatterns = [
     # Основные страницы
-    path('', views.post_list, name='post_list'),
-    path('post/<slug:slug>/', views.post_detail, name='post_detail'),
-    path('category/<slug:slug>/', views.category_posts, name='category_posts'),
+    path('', read_views.post_list, name='post_list'),
+    path('post/<slug:slug>/', read_views.post_detail, name='post_detail'),
+    path('category/<slug:slug>/', read_views.category_posts, name='category_posts'),
     
     # Аутентификация
     path('register/', views.register, name='register'),
@@ -18,12 +22,19 @@ urlpatterns = [
     path('create/', views.create_post, name='create_post'),
     path('my-posts/', views.my_posts, name='my_posts'),
     # blog/urls.py (добавьте в urlpatterns)
-    path('search/', views.search, name='search'),
-    path('users/', views.user_search, name='user_search'),
+    path('search/', read_views.search, name='search'),
+    path('users/', read_views.user_search, name='user_search'),
     
     # Профили пользователей
     path('profile/', views.profile, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('profile/change-password/', views.change_password, name='change_password'),
-    path('user/<str:username>/', views.user_profile, name='user_profile'),
+    path('user/<str:username>/', read_views.user_profile, name='user_profile'),
+
+    # Ленты RSS/Atom (feed_format: rss или atom) и карта сайта
+    path('feed/<str:feed_format>/', feeds.latest_feed, name='latest_feed'),
+    path('category/<slug:slug>/feed/<str:feed_format>/', feeds.category_feed, name='category_feed'),
+    path('user/<str:username>/feed/<str:feed_format>/', feeds.author_feed, name='author_feed'),
+    path('sitemap.xml', feeds.sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:page>.xml', feeds.sitemap_page, name='sitemap_page'),
 ]
\ No newline at end of file
@@ -6,48 +6,54 @@ from django.contrib.auth import login, authenticate, update_session_auth_hash, l
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.models import User
 from django.contrib import messages
-from .models import Post, Comment, Category, Tag, UserProfile
+from .models import Post, Category
 from .forms import CommentForm, PostForm, CustomUserCreationForm, UserProfileForm, UserProfileExtraForm
+from .search import SearchResults
+from .taxonomy import registry as taxonomy
+from .pagecache import cache_public_page, conditional_page
+from .pagination import CursorPaginator
 from django.core.paginator import Paginator
-import uuid
-from django.template.defaultfilters import slugify
-from django.db.models import Q
-
-def create_default_categories_and_tags():
-    """Создает категории и теги по умолчанию если их нет"""
-    categories = ['Программирование', 'Дизайн', 'Маркетинг', 'Путешествия', 'Кулинария']
-    for cat_name in categories:
-        category, created = Category.objects.get_or_create(name=cat_name)
-        if created and not category.slug:
-            category.slug = slugify(cat_name) + '-' + uuid.uuid4().hex[:6]
-            category.save()
-    
-    tags = ['django', 'python', 'web', 'development', 'design', 'cooking', 'travel']
-    for tag_name in tags:
-        tag, created = Tag.objects.get_or_create(name=tag_name)
-        if created and not tag.slug:
-            tag.slug = slugify(tag_name) + '-' + uuid.uuid4().hex[:6]
-            tag.save()
+from django.db import transaction
+from django.db.models import Max, Q
+
+def with_profiles(users):
+    """Профиль со счетчиком постов для карточек пользователей одним запросом"""
+    return users.select_related('userprofile')
+
+# Время последнего изменения для условных запросов: updated_date поста
+# меняется и при одобрении комментариев (blog/counters.py)
+
+def post_modified(slug):
+    return Post.objects.filter(slug=slug).values_list('updated_date', flat=True).first()
 
+def category_modified(slug):
+    return Post.objects.published().filter(category__slug=slug).aggregate(Max('updated_date'))['updated_date__max']
+
+def author_modified(username):
+    return Post.objects.published().filter(author__username=username).aggregate(Max('updated_date'))['updated_date__max']
+
+@cache_public_page('feed')
 def post_list(request):
-    # Создаем категории по умолчанию для главной страницы
-    create_default_categories_and_tags()
-    
-    posts_list = Post.objects.filter(is_published=True).order_by('-published_date')
-    categories = Category.objects.all()
+    posts_list = Post.objects.published().for_listing().order_by('-published_date')
     
-    paginator = Paginator(posts_list, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts_list, 5)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
+    # Боковая панель кэшируется фрагментом, поэтому передаем методы реестра:
+    # шаблон вызовет их только при промахе кэша
     return render(request, 'blog/post_list.html', {
         'page_obj': page_obj,
-        'categories': categories
+        'categories': taxonomy.categories,
+        'tags': taxonomy.tags,
+        # Счетчики постов в панели меняют версию реестра
+        'taxonomy_version': taxonomy.version,
     })
 
+@conditional_page('post:{slug}', last_modified=post_modified)
+@cache_public_page('post:{slug}')
 def post_detail(request, slug):
-    post = get_object_or_404(Post, slug=slug)
-    comments = post.comments.filter(approved_comment=True)
+    post = get_object_or_404(Post.objects.for_detail(), slug=slug)
+    comments = post.comments.filter(approved_comment=True).order_by('created_date')
 
     if request.method == "POST":
         form = CommentForm(request.POST)
@@ -66,12 +72,15 @@ def post_detail(request, slug):
         'form': form
     })
 
+@conditional_page('category:{slug}', last_modified=category_modified)
+@cache_public_page('category:{slug}')
 def category_posts(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    posts = Post.objects.filter(category=category, is_published=True).order_by('-published_date')
+    posts = Post.objects.published().for_listing().filter(category=category)
+    page_obj = CursorPaginator(posts, 10).get_page(request.GET.get('cursor'))
     return render(request, 'blog/category_posts.html', {
         'category': category,
-        'posts': posts
+        'page_obj': page_obj
     })
 
 def register(request):
@@ -108,41 +117,28 @@ def user_logout(request):
 
 @login_required
 def create_post(request):
-    # Создаем категории и теги по умолчанию перед отображением формы
-    create_default_categories_and_tags()
-    
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                post = form.save(commit=False)
-                post.author = request.user
-                
-                # Убедимся, что заголовок не пустой
-                if not post.title or post.title.strip() == "":
-                    post.title = f"Пост от {timezone.now().strftime('%Y-%m-%d %H:%M')}"
-                
-                # Сохраняем сначала чтобы получить ID
-                post.save()
-                form.save_m2m()  # Для сохранения ManyToMany полей (тегов)
-                
-                # Принудительно вызываем save() модели чтобы сгенерировать slug
-                # если он все еще пустой после первого сохранения
-                if not post.slug or post.slug.strip() == "":
-                    post.save()
-                
-                if post.is_published and not post.published_date:
-                    post.published_date = timezone.now()
+                # Пост и его теги сохраняются вместе; slug и дату публикации
+                # заполняет Post.save(), индекс поиска обновит фоновая задача
+                with transaction.atomic():
+                    post = form.save(commit=False)
+                    post.author = request.user
+
+                    # Убедимся, что заголовок не пустой
+                    if not post.title or post.title.strip() == "":
+                        post.title = f"Пост от {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+
                     post.save()
-                
+                    form.save_m2m()  # Для сохранения ManyToMany полей (тегов)
+
                 messages.success(request, 'Пост успешно создан!')
                 return redirect('post_detail', slug=post.slug)
-                
+
             except Exception as e:
                 messages.error(request, f'Ошибка при создании поста: {str(e)}')
-                # Если есть пост, удалим его чтобы не оставался в базе с ошибкой
-                if 'post' in locals():
-                    post.delete()
                 return redirect('create_post')
     else:
         form = PostForm()
@@ -150,12 +146,13 @@ def create_post(request):
 
 @login_required
 def my_posts(request):
-    posts = Post.objects.filter(author=request.user).order_by('-created_date')
+    posts = Post.objects.for_listing().filter(author=request.user).order_by('-created_date')
     return render(request, 'blog/my_posts.html', {'posts': posts})
 
 @login_required
 def profile(request):
-    return render(request, 'blog/profile.html')
+    recent_posts = Post.objects.filter(author=request.user).order_by('-created_date')[:5]
+    return render(request, 'blog/profile.html', {'recent_posts': recent_posts})
 
 @login_required
 def edit_profile(request):
@@ -192,13 +189,16 @@ def change_password(request):
         form = PasswordChangeForm(request.user)
     return render(request, 'blog/change_password.html', {'form': form})
 
+@conditional_page('author:{username}', last_modified=author_modified)
+@cache_public_page('author:{username}')
 def user_profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=user, is_published=True).order_by('-published_date')
+    user = get_object_or_404(User.objects.select_related('userprofile'), username=username)
+    posts = Post.objects.published().for_listing().filter(author=user)
+    page_obj = CursorPaginator(posts, 10).get_page(request.GET.get('cursor'))
     
     return render(request, 'blog/user_profile.html', {
         'profile_user': user,
-        'posts': posts
+        'page_obj': page_obj
     })
 
 def search(request):
@@ -206,25 +206,19 @@ def search(request):
     results = []
     
     if query:
-        # Поиск по постам
-        post_results = Post.objects.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query) |
-            Q(author__username__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(tags__name__icontains=query),
-            is_published=True
-        ).distinct().order_by('-published_date')
+        # Поиск по постам через полнотекстовый индекс, по релевантности
+        paginator = Paginator(SearchResults(query), 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
         
         # Поиск по пользователям
-        user_results = User.objects.filter(
+        user_results = with_profiles(User.objects.filter(
             Q(username__icontains=query) |
             Q(first_name__icontains=query) |
             Q(last_name__icontains=query)
-        ).distinct()
+        ))
         
         results = {
-            'posts': post_results,
+            'page_obj': page_obj,
             'users': user_results,
             'query': query
         }
@@ -240,7 +234,8 @@ def user_search(request):
             Q(username__icontains=query) |
             Q(first_name__icontains=query) |
             Q(last_name__icontains=query)
-        ).distinct()
+        )
+    users = with_profiles(users)
     
     return render(request, 'blog/user_search.html', {
         'users': users,
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myblog.settings')
+# Страницы только для чтения работают через асинхронный ORM без переключения потоков
+os.environ.setdefault('BLOG_ASYNC_VIEWS', '1')
+# Асинхронный ORM открывает соединения в разных потоках: постоянные соединения не переиспользуются
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'blog.staticfiles.static_files_middleware',
+    'blog.routers.read_your_writes_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,13 +76,118 @@ WSGI_APPLICATION = 'myblog.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite для нескольких процессов (gunicorn, воркер очереди). Значения
+# переопределяются переменными окружения BLOG_SQLITE_*.
+# journal_mode=WAL - читатели не ждут писателя, а запись не делает fsync
+# журнала отката; synchronous=NORMAL в режиме WAL сохраняет целостность
+# (при сбое питания можно потерять лишь последние транзакции).
+# cache_size отрицательный - в КиБ на соединение; mmap_size - в байтах.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('BLOG_SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('BLOG_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('BLOG_SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('BLOG_SQLITE_CACHE_SIZE', -20000)),
+    'temp_store': 'MEMORY',
+}
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    # Транзакция сразу берет блокировку записи: вместо ошибки "database is locked"
+    # при повышении блокировки чтения до записи процесс ждет своей очереди
+    'transaction_mode': os.environ.get('BLOG_SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+    # Сколько секунд ждать блокировку (busy timeout)
+    'timeout': float(os.environ.get('BLOG_SQLITE_TIMEOUT', 20)),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        # Постоянные соединения: PRAGMA выполняются один раз на соединение.
+        # Под ASGI asgi.py выставляет 0 (соединения там живут в разных потоках)
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплики только для чтения (blog/routers.py). Для проверки на одной машине:
+# BLOG_DB_REPLICAS=/tmp/replica.sqlite3 - копии основной БД, которые
+# обновляет manage.py sync_replicas. Реплики Postgres добавьте в DATABASES
+# с псевдонимами replica1, replica2... и 'TEST': {'MIRROR': 'default'}.
+for number, path in enumerate(filter(None, os.environ.get('BLOG_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': SQLITE_OPTIONS,
+        # В тестах реплика - та же тестовая БД
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи посетитель читает из основной БД
+BLOG_DB_PIN_SECONDS = 5
+
+
+# Cache
+# Кэш должен быть общим для всех процессов (воркеров gunicorn, run_worker):
+# в нем лежат поколения кэша страниц и версия справочников категорий и тегов,
+# и сброс в одном процессе должен быть виден остальным. По умолчанию - файлы
+# в var/cache; для нескольких серверов задайте, например,
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache.
+# Кэш в памяти процесса (LocMemCache) годится только для одного процесса:
+# проверка blog.W002 предупреждает о нем при DEBUG=False
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', str(BASE_DIR / 'var' / 'cache')),
+        'OPTIONS': {
+            # FileBasedCache по умолчанию держит всего 300 записей
+            'MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', 20000)),
+        },
+    }
+}
+
+# Кэш страниц для анонимных читателей (blog/pagecache.py)
+BLOG_PAGE_CACHE = True
+BLOG_PAGE_CACHE_TIMEOUT = 600
+
+# Фоновые задачи (blog/jobs.py) выполняет manage.py run_worker.
+# BLOG_JOBS_EAGER=1 - выполнять их сразу при постановке, без воркера
+BLOG_JOBS_EAGER = os.environ.get('BLOG_JOBS_EAGER') == '1'
+
+# Замеры SQL и времени запросов (blog/instrumentation.py): заголовок
+# Server-Timing, журнал медленных запросов и N+1, статистика manage.py view_stats
+BLOG_INSTRUMENTATION = os.environ.get('BLOG_INSTRUMENTATION') == '1'
+BLOG_SLOW_REQUEST_MS = int(os.environ.get('BLOG_SLOW_REQUEST_MS', 500))
+# Кэш, в котором процессы копят статистику для view_stats: должен быть общим
+BLOG_INSTRUMENTATION_CACHE = os.environ.get('BLOG_INSTRUMENTATION_CACHE', 'default')
+if BLOG_INSTRUMENTATION:
+    # Сразу после SecurityMiddleware: учитываются запросы сессий и аутентификации
+    MIDDLEWARE.insert(1, 'blog.instrumentation.instrumentation_middleware')
+
+# Профилирование запросов сотрудниками: ?_profile=cprofile|sample (blog/profiling.py).
+# По умолчанию включено только при DEBUG
+BLOG_PROFILING = os.environ.get('BLOG_PROFILING', '1' if DEBUG else '0') == '1'
+BLOG_PROFILE_DIR = BASE_DIR / 'var' / 'profiles'
+BLOG_PROFILE_KEEP = 50
+if BLOG_PROFILING:
+    # После AuthenticationMiddleware: нужен request.user
+    MIDDLEWARE.append('blog.profiling.profiling_middleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'blog': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Асинхронные представления для чтения (blog/async_views.py); asgi.py включает их сам
+BLOG_ASYNC_VIEWS = os.environ.get('BLOG_ASYNC_VIEWS') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,9 +232,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# collectstatic кладет сюда файлы с хэшем в имени и их копии .gz/.br,
+# отдает их blog.staticfiles.static_files_middleware (новую сборку видит без перезапуска)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'blog.staticfiles.CompressedManifestStaticFilesStorage'},
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Отдачу файлов можно передать фронт-серверу (blog/media.py):
+# BLOG_MEDIA_SENDFILE=x-accel-redirect (nginx) или x-sendfile (Apache)
+BLOG_MEDIA_SENDFILE = os.environ.get('BLOG_MEDIA_SENDFILE') or None
+BLOG_MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 # Login/Logout URLs
 LOGIN_REDIRECT_URL = 'post_list'
@@ -1,12 +1,25 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from blog import media, moderation, profiling
 
 urlpatterns = [
+    # Профили запросов (blog/profiling.py) и очередь модерации - до admin.site.urls, чтобы адреса не перехватила админка
+    path('admin/profiles/', admin.site.admin_view(profiling.admin_profiles), name='admin_profiles'),
+    path('admin/profiles/<str:name>/', admin.site.admin_view(profiling.admin_profile_detail),
+         name='admin_profile_detail'),
+    path('admin/profiles/<str:name>/download/', admin.site.admin_view(profiling.admin_profile_download),
+         name='admin_profile_download'),
+    path('admin/moderation/', admin.site.admin_view(moderation.admin_moderation), name='admin_moderation'),
     path('admin/', admin.site.urls),
     path('', include('blog.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Загруженные файлы: Range, условные запросы, X-Accel-Redirect/X-Sendfile (blog/media.py).
+# Если MEDIA_URL указывает на другой домен (CDN), файлы отдает он
+if getattr(settings, 'BLOG_SERVE_MEDIA', True) and settings.MEDIA_URL.startswith('/'):
+    urlpatterns.append(
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), media.serve_media, name='media'),
+    )